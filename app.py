@@ -22,16 +22,19 @@ import os
 import time
 from datetime import datetime
 from pathlib import Path
-from persistent_storage import rag_system
+from persistent_storage import PersistentRAGSystem, get_query_embedding_cache, rag_system
 from query_expander import SweetnessQueryExpander, DualProteinQueryExpander, ProteoglycanQueryExpander
 from evidence_ranker import EvidenceRanker
 import logging
 from functools import wraps
 import traceback
 import threading
-from config import config
+from config import config, dual_rag_config, proteoglycan_rag_config
 from logger import setup_logger
+from services.chat_service import ChatService
 from services.dependencies import build_services
+from services.rag_runtime import RAGRuntimeCoordinator
+from services.retrieval_cache import retrieval_cache_stats
 from knowledge_paths import get_domain_paths, get_runtime_metadata_path
 
 # NOTE: 文件中的函数多数通过 Flask 的 @app.route 装饰器在运行时被调用。
@@ -201,8 +204,6 @@ if DOCKING_ENABLED:
     app.register_blueprint(create_docking_blueprint())
 
 # 双蛋白 RAG 系统（独立实例）
-from persistent_storage import PersistentRAGSystem
-from services.chat_service import ChatService
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 DUAL_PROTEIN_PATHS = get_domain_paths("dual_protein")
 DUAL_PROTEIN_METADATA_PATH = str(get_runtime_metadata_path("dual_protein"))
@@ -210,6 +211,7 @@ dual_protein_rag = PersistentRAGSystem(
     data_dir=str(DUAL_PROTEIN_PATHS.papers),
     persist_dir=str(DUAL_PROTEIN_PATHS.index),
     metadata_path=DUAL_PROTEIN_METADATA_PATH,
+    rag_config=dual_rag_config,
 )
 dual_protein_chat_service = ChatService(
     rag_system=dual_protein_rag,
@@ -269,6 +271,7 @@ proteoglycan_rag = PersistentRAGSystem(
     persist_dir=PROTEOGLYCAN_PERSIST_DIR,
     metadata_path=PROTEOGLYCAN_METADATA_PATH,
     allow_auto_build=False,
+    rag_config=proteoglycan_rag_config,
 )
 proteoglycan_chat_service = ChatService(
     rag_system=proteoglycan_rag,
@@ -455,8 +458,6 @@ def _index_exists(rag) -> bool:
     return all(os.path.isfile(os.path.join(rag.persist_dir, name)) for name in required)
 
 
-from services.rag_runtime import RAGRuntimeCoordinator
-
 rag_runtime = RAGRuntimeCoordinator()
 rag_runtime.register("sweetness", rag_system, initialize_rag_system, lambda: _index_exists(rag_system))
 rag_runtime.register(
@@ -785,17 +786,27 @@ def api_encapsulation_ask_stream():
     threshold, max_results = _parse_retrieval_params(data, float(os.getenv('EMBEDDING_RAG_SIMILARITY_THRESHOLD', '0.18')), int(os.getenv('EMBEDDING_RAG_MAX_RESULTS', '120')))
     return Response(stream_with_context(encapsulation_chat_service.ask_stream(question, threshold, max_results)), mimetype='text/event-stream')
 
+def _document_row(path, meta):
+    return {'id': path, 'filename': meta.get('filename', os.path.basename(path)), 'title': meta.get('title', ''),
+            'authors': meta.get('authors', []), 'journal': meta.get('journal', ''), 'year': meta.get('year', 'N/A'),
+            'doi': meta.get('doi', ''), 'status': 'indexed', 'path': path}
+
+def _document_records(domain_chat_service, query):
+    """文献列表的 ``q`` 子串过滤走共享的元数据倒排索引，只核验候选记录。"""
+    index = domain_chat_service.metadata_service.search_index()
+    query = (query or '').lower().strip()
+    if not query:
+        return index.records
+    def text_of(path, meta):
+        row = _document_row(path, meta)
+        return ' '.join([row['filename'], row['title'], row['journal'], str(row['year'])]).lower()
+    return [index.records[record_id] for record_id in index.search([query], text_of)]
+
 @app.route('/api/encapsulation/documents', methods=['GET'])
 @app.route('/api/embedding/documents', methods=['GET'])
 @handle_api_errors
 def api_encapsulation_documents():
-    rows = []
-    for path, meta in encapsulation_rag.metadata_storage.get_all_metadata().items():
-        rows.append({'id': path, 'filename': meta.get('filename', os.path.basename(path)), 'title': meta.get('title', ''),
-                     'authors': meta.get('authors', []), 'journal': meta.get('journal', ''), 'year': meta.get('year', 'N/A'),
-                     'doi': meta.get('doi', ''), 'status': 'indexed', 'path': path})
-    query = request.args.get('q', '').lower().strip()
-    if query: rows = [r for r in rows if query in ' '.join([r['filename'], r['title'], r['journal'], str(r['year'])]).lower()]
+    rows = [_document_row(path, meta) for path, meta in _document_records(encapsulation_chat_service, request.args.get('q', ''))]
     return jsonify({'success': True, 'documents': rows, 'total': len(rows), 'system_ready': encapsulation_system_ready})
 
 @app.route('/api/encapsulation/documents/upload', methods=['POST'])
@@ -862,24 +873,7 @@ def api_proteoglycan_ask_stream():
 @app.route('/api/proteoglycan/documents', methods=['GET'])
 @handle_api_errors
 def api_proteoglycan_documents():
-    rows = []
-    for path, meta in proteoglycan_rag.metadata_storage.get_all_metadata().items():
-        rows.append({
-            'id': path,
-            'filename': meta.get('filename', os.path.basename(path)),
-            'title': meta.get('title', ''),
-            'authors': meta.get('authors', []),
-            'journal': meta.get('journal', ''),
-            'year': meta.get('year', 'N/A'),
-            'doi': meta.get('doi', ''),
-            'status': 'indexed',
-            'path': path,
-        })
-    query = request.args.get('q', '').lower().strip()
-    if query:
-        rows = [row for row in rows if query in ' '.join([
-            row['filename'], row['title'], row['journal'], str(row['year'])
-        ]).lower()]
+    rows = [_document_row(path, meta) for path, meta in _document_records(proteoglycan_chat_service, request.args.get('q', ''))]
     return jsonify({
         'success': True,
         'documents': rows,
@@ -895,105 +889,80 @@ def api_proteoglycan_upload():
         'error': '网页上传已禁用。请将 PDF 放入 SweetSeek_paper_database/proteoglycan/papers 后运行离线索引维护脚本。',
     }), 403
 
+def _search_chat_services():
+    return {
+        'sweetness': chat_service,
+        'dual_protein': dual_protein_chat_service,
+        'encapsulation': encapsulation_chat_service,
+        'proteoglycan': proteoglycan_chat_service,
+    }
+
 @app.route('/api/search', methods=['POST'])
 @handle_api_errors
 @monitor_performance
 def api_search():
-    """文献元数据搜索（支持中英文互查）"""
-    global system_ready
-    
-    if not system_ready:
+    """文献元数据搜索（支持中英文互查、四个领域、游标分页）"""
+    data = _get_json_dict()
+    query = str(data.get('query', '')).strip()
+    domain = str(data.get('domain') or 'sweetness').strip()
+    domain_service = _search_chat_services().get(domain)
+
+    app_logger.info(f"收到搜索请求[{domain}]: {query}")
+
+    if domain_service is None:
+        return jsonify({'success': False, 'error': f'未知领域: {domain}'}), 400
+    if domain == 'sweetness' and not system_ready:
         app_logger.warning("搜索请求失败：系统未初始化")
         return jsonify({
             'success': False,
             'error': '系统未初始化'
         }), 400
-    
-    data = _get_json_dict()
-    query = data.get('query', '').strip()
-    
-    app_logger.info(f"收到搜索请求: {query}")
-    
     if not query:
         app_logger.warning("搜索关键词为空")
         return jsonify({
             'success': False,
             'error': '搜索关键词不能为空'
         }), 400
-    
+
     try:
         # 使用查询扩展器获取同义词和相关术语
-        query_expansion = query_expander.expand_query(query)
-        
-        # 构建搜索关键词列表（原始查询 + 扩展术语）
-        search_terms = [query.lower()]
-        if query_expansion['expanded_terms']:
-            search_terms.extend([term.lower() for term in query_expansion['expanded_terms']])
-        
-        print(f"[搜索] 原始查询: {query}")
-        if query_expansion['matched_concepts']:
-            print(f"[搜索] 匹配概念: {query_expansion['matched_concepts']}")
-            print(f"[搜索] 扩展术语: {len(query_expansion['expanded_terms'])} 个")
-        
-        # 获取所有元数据
-        all_metadata = rag_system.metadata_storage.get_all_metadata()
-        
-        # 搜索匹配的文献
-        results = []
-        seen_files = set()  # 避免重复
-        
-        for file_path, metadata in all_metadata.items():
-            if file_path in seen_files:
-                continue
-                
-            # 搜索字段：标题、作者、期刊、DOI、文件名
-            searchable_text = ' '.join([
-                metadata.get('title', ''),
-                metadata.get('journal', ''),
-                metadata.get('doi', ''),
-                metadata.get('filename', ''),
-                ' '.join(metadata.get('authors', []))
-            ]).lower()
-            
-            # 检查是否匹配任何搜索词
-            matched = False
-            for term in search_terms:
-                if term in searchable_text:
-                    matched = True
-                    break
-            
-            if matched:
-                seen_files.add(file_path)
-                results.append({
-                    'title': metadata.get('title', 'Unknown Title'),
-                    'authors': metadata.get('authors', []),
-                    'journal': metadata.get('journal', 'Unknown Journal'),
-                    'year': metadata.get('year', 'N/A'),
-                    'doi': metadata.get('doi', 'Not Available'),
-                    'filename': metadata.get('filename', ''),
-                    'file_path': file_path
-                })
-        
-        # 按年份排序（新的在前）
-        results.sort(key=lambda x: x['year'], reverse=True)
-        
-        print(f"[搜索] 找到 {len(results)} 篇文献")
-        
-        return jsonify({
-            'success': True,
-            'results': results,
-            'count': len(results),
-            'expanded_terms': query_expansion['expanded_terms'][:5] if query_expansion['expanded_terms'] else []
-        })
-        
+        query_expansion = domain_service.query_expander.expand_query(query)
+        search_terms = [query] + list(query_expansion.get('expanded_terms') or [])
+        page = domain_service.metadata_service.literature_search().search(
+            search_terms,
+            sort=str(data.get('sort') or 'year'),
+            limit=int(data.get('limit') or 20),
+            cursor=data.get('cursor') or None,
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        app_logger.error(f"搜索失败: {e}", exc_info=True)
         return jsonify({
             'success': False,
             'error': f'搜索失败: {str(e)}'
         }), 500
 
+    results = [{
+        'title': metadata.get('title', 'Unknown Title'),
+        'authors': metadata.get('authors', []),
+        'journal': metadata.get('journal', 'Unknown Journal'),
+        'year': metadata.get('year', 'N/A'),
+        'doi': metadata.get('doi', 'Not Available'),
+        'filename': metadata.get('filename', ''),
+        'file_path': file_path
+    } for file_path, metadata in page['records']]
+    app_logger.info(f"[搜索] 找到 {page['total']} 篇文献，本页 {len(results)} 篇")
+
+    return jsonify({
+        'success': True,
+        'domain': domain,
+        'results': results,
+        'count': page['total'],
+        'next_cursor': page['next_cursor'],
+        'expanded_terms': (query_expansion.get('expanded_terms') or [])[:5]
+    })
+
 @app.route('/api/stats', methods=['GET'])
 @handle_api_errors
 def api_stats():
@@ -1103,6 +1072,7 @@ def api_health():
             'status': embed_status,
             'mode': embed_mode,
             'dimension': embed_dim,
+            'query_cache': get_query_embedding_cache().stats(),
         }
     except Exception as e:
         health_status['components']['embedding_model'] = {
@@ -1163,6 +1133,7 @@ def api_health():
         domain: rag_runtime.snapshot(domain)
         for domain in ("sweetness", "dual_protein", "encapsulation", "proteoglycan")
     }
+    health_status["retrieval_cache"] = retrieval_cache_stats()
     if not all(item.get("ready") for item in health_status["domains"].values()):
         health_status['status'] = 'degraded'
     status_code = 200 if health_status['status'] == 'healthy' else 503
@@ -1,9 +1,10 @@
 import os
+import warnings
 from dataclasses import dataclass, field
 from pathlib import Path
 
 from dotenv import load_dotenv
-from knowledge_paths import get_domain_paths, get_runtime_metadata_path
+from knowledge_paths import PAPER_DATABASE_ROOT, get_domain_paths, get_runtime_metadata_path
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +17,28 @@ def _normalize_openai_base_url(url: str) -> str:
     return cleaned if cleaned.endswith("/v1") else f"{cleaned}/v1"
 
 
+# 旧版 RAG_CONTEXT_WINDOW 按字符计；原默认 9000/18000 字符对应现在的 2400/4800 token
+_CHARS_PER_CONTEXT_TOKEN = 3.75
+
+
+def _context_tokens(prefix: str, default: int) -> int:
+    """读取 RAG_CONTEXT_TOKENS；仅设置了已弃用的 RAG_CONTEXT_WINDOW（字符数）时按比例换算并告警。"""
+    tokens = os.getenv(f"{prefix}_RAG_CONTEXT_TOKENS", os.getenv("RAG_CONTEXT_TOKENS"))
+    if tokens is not None:
+        return int(tokens)
+    window = os.getenv(f"{prefix}_RAG_CONTEXT_WINDOW", os.getenv("RAG_CONTEXT_WINDOW"))
+    if window is None:
+        return default
+    estimate = max(1, round(int(window) / _CHARS_PER_CONTEXT_TOKEN))
+    warnings.warn(
+        f"RAG_CONTEXT_WINDOW is deprecated and counts characters; using {estimate} tokens. "
+        f"Set {prefix}_RAG_CONTEXT_TOKENS or RAG_CONTEXT_TOKENS instead.",
+        FutureWarning,
+        stacklevel=3,
+    )
+    return estimate
+
+
 @dataclass
 class RAGConfig:
     """甜味模式 RAG 参数（默认值偏快、偏精）"""
@@ -27,11 +50,15 @@ class RAGConfig:
     max_top_k: int = 120
     hard_top_k: int = 200
     max_chunks_per_paper: int = 2
-    context_window: int = 9000
+    # 上下文 token 预算（本地分词估算，中英文混排按 token 而非字符计）
+    context_tokens: int = 2400
     qa_max_tokens: int = 900
     show_reasoning: bool = False
     disable_reasoning_hard: bool = True
     allow_weak_supplement: bool = True
+    # 近似索引运行时参数覆盖（0 表示沿用 release 构建时写入的 nprobe/efSearch）
+    ann_nprobe: int = 0
+    ann_ef_search: int = 0
 
     @classmethod
     def from_env(cls, prefix: str = "SWEET") -> "RAGConfig":
@@ -52,11 +79,13 @@ class RAGConfig:
             max_top_k=_int("RETRIEVAL_TOPK_CAP", cls.max_top_k),
             hard_top_k=_int("RETRIEVAL_HARD_TOPK", cls.hard_top_k),
             max_chunks_per_paper=_int("RETRIEVAL_MAX_CHUNKS_PER_PAPER", cls.max_chunks_per_paper),
-            context_window=_int("RAG_CONTEXT_WINDOW", cls.context_window),
+            context_tokens=_context_tokens(prefix, cls.context_tokens),
             qa_max_tokens=_int("QA_MAX_TOKENS", cls.qa_max_tokens),
             show_reasoning=_bool("QA_SHOW_REASONING", cls.show_reasoning),
             disable_reasoning_hard=_bool("QA_DISABLE_REASONING_HARD", cls.disable_reasoning_hard),
             allow_weak_supplement=_bool("RETRIEVAL_ALLOW_WEAK_SUPPLEMENT", cls.allow_weak_supplement),
+            ann_nprobe=_int("ANN_NPROBE", cls.ann_nprobe),
+            ann_ef_search=_int("ANN_EF_SEARCH", cls.ann_ef_search),
         )
 
 
@@ -70,7 +99,7 @@ class DualRAGConfig(RAGConfig):
     threshold_step: float = 0.02
     max_top_k: int = 260
     hard_top_k: int = 400
-    context_window: int = 18000
+    context_tokens: int = 4800
     qa_max_tokens: int = 1800
     allow_weak_supplement: bool = False
 
@@ -93,11 +122,13 @@ class DualRAGConfig(RAGConfig):
             max_top_k=_int("RETRIEVAL_TOPK_CAP", cls.max_top_k),
             hard_top_k=_int("RETRIEVAL_HARD_TOPK", cls.hard_top_k),
             max_chunks_per_paper=_int("RETRIEVAL_MAX_CHUNKS_PER_PAPER", cls.max_chunks_per_paper),
-            context_window=_int("RAG_CONTEXT_WINDOW", cls.context_window),
+            context_tokens=_context_tokens("DUAL", cls.context_tokens),
             qa_max_tokens=_int("QA_MAX_TOKENS", cls.qa_max_tokens),
             show_reasoning=_bool("QA_SHOW_REASONING", cls.show_reasoning),
             disable_reasoning_hard=_bool("QA_DISABLE_REASONING_HARD", cls.disable_reasoning_hard),
             allow_weak_supplement=_bool("RETRIEVAL_ALLOW_WEAK_SUPPLEMENT", cls.allow_weak_supplement),
+            ann_nprobe=_int("ANN_NPROBE", cls.ann_nprobe),
+            ann_ef_search=_int("ANN_EF_SEARCH", cls.ann_ef_search),
         )
 
 
@@ -135,6 +166,15 @@ class Config:
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
     DEEPSEEK_BASE_URL = _normalize_openai_base_url(os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1'))
     DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-reasoner')
+    # LLM 客户端：openai（同步 SDK）或 httpx（异步连接池 + 并发上限 + 请求截止时间）
+    LLM_CLIENT_BACKEND = os.getenv('LLM_CLIENT_BACKEND', 'openai').strip().lower()
+    LLM_MAX_CONNECTIONS = max(1, int(os.getenv('LLM_MAX_CONNECTIONS', '20')))
+    LLM_MAX_KEEPALIVE = max(0, int(os.getenv('LLM_MAX_KEEPALIVE', '10')))
+    LLM_KEEPALIVE_EXPIRY_SECONDS = max(0.0, float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '30')))
+    # 同时进行的补全请求上限（超出的请求排队，排队时间计入截止时间）
+    LLM_MAX_INFLIGHT = max(1, int(os.getenv('LLM_MAX_INFLIGHT', '16')))
+    LLM_REQUEST_DEADLINE_SECONDS = max(1.0, float(os.getenv('LLM_REQUEST_DEADLINE_SECONDS', '180')))
+    LLM_CONNECT_TIMEOUT_SECONDS = max(0.1, float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '10')))
 
     # GLM API (推荐使用: 免费且速度更快的9B模型)
     USE_GLM = os.getenv('USE_GLM', 'false').lower() in ('true', '1', 'yes')
@@ -147,6 +187,17 @@ class Config:
     PERSIST_DIR = str(_SWEETNESS_PATHS.index)
     # 索引构建批次大小（降低内存峰值）
     INDEX_BUILD_BATCH_SIZE = int(os.getenv('INDEX_BUILD_BATCH_SIZE', 5))
+    # 离线紧凑 release 构建（scripts/maintenance/build_compact_release.py）：
+    # 文本抽取进程数、每批嵌入的文本块数、阶段间队列长度（按文件计）
+    RELEASE_BUILD_WORKERS = max(1, int(os.getenv('RELEASE_BUILD_WORKERS', min(4, os.cpu_count() or 1))))
+    RELEASE_EMBED_BATCH_SIZE = max(1, int(os.getenv('RELEASE_EMBED_BATCH_SIZE', 256)))
+    RELEASE_BUILD_QUEUE_SIZE = max(1, int(os.getenv('RELEASE_BUILD_QUEUE_SIZE', 8)))
+    # PDF 元数据提取进程数；1 表示在当前进程内串行提取
+    METADATA_EXTRACT_WORKERS = max(1, int(os.getenv('METADATA_EXTRACT_WORKERS', min(4, os.cpu_count() or 1))))
+    # 按文件内容 SHA-256 缓存的提取结果（四个知识域共用）
+    METADATA_EXTRACT_CACHE_PATH = Path(os.getenv(
+        'METADATA_EXTRACT_CACHE_PATH', str(PAPER_DATABASE_ROOT / 'pdf_metadata_cache.sqlite')
+    )).expanduser()
 
     EMBED_MODEL_TYPE = os.getenv("EMBED_MODEL_TYPE", "modelscope").lower()
     # Path to local model snapshot or HuggingFace ID
@@ -163,6 +214,26 @@ class Config:
     EMBED_DISABLE_TORCH_DYNAMO = os.getenv("EMBED_DISABLE_TORCH_DYNAMO", "false").lower() in (
         "true", "1", "yes"
     )
+    # 查询向量缓存（四个知识域共享）：条目上限 × 向量维度即为内存上限；0 表示关闭。
+    QUERY_EMBED_CACHE_SIZE = max(0, int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048")))
+    QUERY_EMBED_CACHE_TTL_SECONDS = max(0.0, float(os.getenv("QUERY_EMBED_CACHE_TTL_SECONDS", "3600")))
+    # 文档块嵌入的持久化缓存（sha256(文本) + 模型指纹 → float16 向量），重建时只嵌入新文本；留空关闭。
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(PAPER_DATABASE_ROOT / "embedding_cache.sqlite")).strip()
+    # 答案缓存：按 (领域, 索引版本, Prompt 模板版本, 归一化问题) 复用已生成的回答；路径留空关闭。
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", str(PAPER_DATABASE_ROOT / "answer_cache.sqlite")).strip()
+    ANSWER_CACHE_MAX_ENTRIES = max(1, int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000")))
+    ANSWER_CACHE_TTL_SECONDS = max(0.0, float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")))
+    # 近似问题匹配的问题向量余弦阈值；0 表示只做精确匹配。
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+    # 流式回放：每个 answer 事件的字符数与事件间隔（毫秒）
+    ANSWER_CACHE_REPLAY_CHUNK_CHARS = max(1, int(os.getenv("ANSWER_CACHE_REPLAY_CHUNK_CHARS", "24")))
+    ANSWER_CACHE_REPLAY_DELAY_MS = max(0.0, float(os.getenv("ANSWER_CACHE_REPLAY_DELAY_MS", "15")))
+    # 检索结果 LRU 缓存（每个知识域的条目数，索引版本变化时清空）；0 表示关闭。
+    RETRIEVAL_CACHE_SIZE = max(0, int(os.getenv("RETRIEVAL_CACHE_SIZE", "256")))
+    # 检索结果缓存每个知识域的内存上限（MB，按 pickle 字节计）；0 表示只限条数。
+    RETRIEVAL_CACHE_MAX_MB = max(0, int(os.getenv("RETRIEVAL_CACHE_MAX_MB", "64")))
+    # 紧凑索引并发检索合并窗口（毫秒）；0 表示各请求直接并行检索。
+    COMPACT_SEARCH_BATCH_WINDOW_MS = max(0.0, float(os.getenv("COMPACT_SEARCH_BATCH_WINDOW_MS", "0")))
     
     COLLECTION_NAME = "sweetseek_papers"
 
@@ -180,8 +251,13 @@ class Config:
     RAG_FORCE_MIN_DOCS = int(os.getenv('RAG_FORCE_MIN_DOCS', 10))
     # 最大召回数量：从向量库初筛多少个片段 (100 -> 200)
     RAG_MAX_RESULTS = int(os.getenv('RAG_MAX_RESULTS', 200))
-    # 上下文窗口限制：喂给 LLM 的最大字符数
-    RAG_CONTEXT_WINDOW = int(os.getenv('RAG_CONTEXT_WINDOW', 12000))
+    # 词法（FTS5）检索：每个查询变体的召回数，与向量结果以 RRF（k=RAG_RRF_K）融合
+    RAG_LEXICAL_TOP_K = int(os.getenv('RAG_LEXICAL_TOP_K', 20))
+    RAG_RRF_K = int(os.getenv('RAG_RRF_K', 60))
+    # 词法名次 ≤ 该值的命中可不受向量相似度阈值限制；更靠后的词法命中仍需达到阈值
+    RAG_LEXICAL_BYPASS_RANK = int(os.getenv('RAG_LEXICAL_BYPASS_RANK', 5))
+    # 查询分析（扩展、信号、变体、参考文献窗口）按规范化问题文本缓存的条数，0 关闭
+    QUERY_ANALYSIS_CACHE_SIZE = int(os.getenv('QUERY_ANALYSIS_CACHE_SIZE', 256))
     
     # Evidence Ranker Settings
     TOP_JOURNALS = [
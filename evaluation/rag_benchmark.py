@@ -20,10 +20,11 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from config import config, sweet_rag_config
-from evaluation.gold import annotation_summary, load_gold_set
-from evaluation.judge import JUDGE_VERSION, judge_answer
-from evaluation.rag_metrics import (
+# 以下项目内导入依赖上面插入的 sys.path（脚本可直接运行），因此不能移到文件顶部。
+from config import config, sweet_rag_config  # noqa: E402
+from evaluation.gold import annotation_summary, load_gold_set  # noqa: E402
+from evaluation.judge import JUDGE_VERSION, judge_answer  # noqa: E402
+from evaluation.rag_metrics import (  # noqa: E402
     aggregate,
     answer_point_coverage,
     citation_precision,
@@ -34,8 +35,9 @@ from evaluation.rag_metrics import (
     percentile,
     reciprocal_rank,
 )
-from evaluation.scoring import evaluate_release_gates, trend_score
-from knowledge_paths import get_domain_paths
+from evaluation.scoring import evaluate_release_gates, trend_score  # noqa: E402
+from knowledge_paths import get_domain_paths  # noqa: E402
+from services.retrieval_cache import retrieval_cache_stats  # noqa: E402
 
 
 DEFAULT_GOLD = ROOT / "evaluation" / "questions" / "sweet_gold_v1.json"
@@ -74,6 +76,7 @@ def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
         "annotation": annotation_summary(questions),
         "summary": summary,
         "trend_score": trend_score(summary),
+        "retrieval_cache": retrieval_cache_stats(),
         "details": details,
     }
     if args.baseline:
@@ -226,7 +229,7 @@ def run_metadata(service, repetitions: int) -> Dict[str, Any]:
             "target_max": sweet_rag_config.target_max,
             "max_top_k": sweet_rag_config.max_top_k,
             "hard_top_k": sweet_rag_config.hard_top_k,
-            "context_window": sweet_rag_config.context_window,
+            "context_tokens": sweet_rag_config.context_tokens,
             "qa_max_tokens": sweet_rag_config.qa_max_tokens,
         },
     }
@@ -2,7 +2,7 @@
 """证据分级系统 — 多维度评分"""
 import re
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 
 class EvidenceRanker:
@@ -53,27 +53,32 @@ class EvidenceRanker:
         ranked.sort(key=lambda x: (-x['total_score'],))
         return ranked
 
+    def static_features(self, title: str, journal: str, year, content: str) -> Dict:
+        """与语义无关的文献级特征；紧凑索引构建时预先算好存入 documents 表。"""
+        evidence_type, evidence_type_score = self._classify_evidence_type(content)
+        return {
+            'publication_year': self._publication_year(year),
+            'study_type_score': self._detect_study_type_score(title, content),
+            'evidence_type': evidence_type,
+            'evidence_type_score': evidence_type_score,
+            'journal_score': self._assess_journal_score(journal),
+        }
+
     def _rank_single(self, paper: Dict) -> Dict:
-        title = paper.get('title', '')
-        journal = paper.get('journal', '')
-        year = paper.get('year', '')
-        content = paper.get('content', '')
         similarity_score = float(paper.get('score', 0) or 0)
 
         # 1. 语义相关度 (0.35) — 直接用向量检索分数
         semantic = min(5.0, similarity_score * 10)
 
-        # 2. 研究类型 (0.20)
-        study_score = self._detect_study_type_score(title, content)
-
-        # 3. 证据强度分类 (0.20)
-        evidence_type, evidence_type_score = self._classify_evidence_type(content)
-
-        # 4. 期刊质量 (0.10)
-        journal_score = self._assess_journal_score(journal)
-
-        # 5. 时效性 (0.10)
-        recency_score = self._calculate_recency_score(year)
+        # 2-5. 研究类型 (0.20) / 证据强度 (0.20) / 期刊质量 (0.10) / 时效性 (0.10)
+        features = paper.get('static_features') or self.static_features(
+            paper.get('title', ''), paper.get('journal', ''), paper.get('year', ''), paper.get('content', '')
+        )
+        study_score = features['study_type_score']
+        evidence_type = features['evidence_type']
+        evidence_type_score = features['evidence_type_score']
+        journal_score = features['journal_score']
+        recency_score = self._recency_from_year(features['publication_year'])
 
         total_score = (
             semantic * 0.35 +
@@ -137,10 +142,18 @@ class EvidenceRanker:
         return 2.0
 
     def _calculate_recency_score(self, year_str: str) -> float:
+        return self._recency_from_year(self._publication_year(year_str))
+
+    @staticmethod
+    def _publication_year(year_str) -> Optional[int]:
         match = re.search(r'(19|20)\d{2}', str(year_str))
-        if not match:
+        return int(match.group(0)) if match else None
+
+    @staticmethod
+    def _recency_from_year(year: Optional[int]) -> float:
+        if year is None:
             return 3.0
-        age = datetime.now().year - int(match.group(0))
+        age = datetime.now().year - int(year)
         if age <= 2:
             return 5.0
         if age <= 5:
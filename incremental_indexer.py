@@ -3,15 +3,23 @@
 
 import json
 import os
-from typing import List, Set
+import uuid
+from typing import Dict, List, Set
 
 from llama_index.core import SimpleDirectoryReader
 
 from config import config
 from metadata_storage import MetadataStorage
 from path_utils import normalize_for_storage
-from pdf_metadata_extractor import PDFMetadataExtractor
 from persistent_storage import rag_system
+from services.compact_index import resolve_current_release
+from services.compact_segments import SegmentChunk, write_delta_segment
+from services.document_features import storage_lookup
+from services.metadata_extraction import ExtractionCache, extract_metadata_batch, update_build_status
+from services.release_builder import default_splitter
+
+# 元数据按批写入存储，每批一个事务
+METADATA_SAVE_BATCH = 32
 
 
 class IncrementalIndexer:
@@ -19,11 +27,12 @@ class IncrementalIndexer:
     
     def __init__(self, 
                  data_dir: str = config.DATA_DIR,
-                 tracking_file: str = os.path.join(config.PERSIST_DIR, "indexed_files.json")):
+                 tracking_file: str = os.path.join(config.PERSIST_DIR, "indexed_files.json"),
+                 index_root: str = config.PERSIST_DIR):
         self.data_dir = data_dir
+        self.index_root = index_root
         self.tracking_file = tracking_file
         self.indexed_files = self._load_tracking()
-        self.metadata_extractor = PDFMetadataExtractor()
         self.metadata_storage = MetadataStorage(storage_path=str(config.METADATA_PATH))
     
     def _load_tracking(self) -> Set[str]:
@@ -68,19 +77,36 @@ class IncrementalIndexer:
         return new_files
     
     def extract_metadata_for_new_files(self, new_files: List[str]):
-        """为新PDF文件提取元数据"""
+        """为新PDF文件提取元数据（进程池并行，按内容哈希复用已解析结果）"""
+        pending = [
+            file_path for file_path in new_files
+            if file_path.lower().endswith('.pdf') and not self.metadata_storage.has_metadata(file_path)
+        ]
+        if not pending:
+            return
+        print(f"提取元数据: {len(pending)} 个PDF（{config.METADATA_EXTRACT_WORKERS} 个进程）")
+
+        def report(done: int, total: int, cached: int) -> None:
+            update_build_status(self.index_root, state="extracting_metadata", metadata_total=total,
+                                metadata_extracted=done, metadata_cached=cached)
+
+        cache = ExtractionCache(str(config.METADATA_EXTRACT_CACHE_PATH))
+        try:
+            extracted = extract_metadata_batch(pending, config.METADATA_EXTRACT_WORKERS, cache, report)
+        except Exception as e:
+            print(f"元数据提取失败: {e}")
+            update_build_status(self.index_root, state="failed", error=f"{type(e).__name__}: {e}")
+            return
+        finally:
+            cache.close()
+
+        items = list(extracted.items())
         pdf_count = 0
-        for file_path in new_files:
-            if file_path.lower().endswith('.pdf'):
-                try:
-                    if not self.metadata_storage.has_metadata(file_path):
-                        print(f"提取元数据: {os.path.basename(file_path)}")
-                        metadata = self.metadata_extractor.extract_metadata(file_path)
-                        self.metadata_storage.save_metadata(file_path, metadata)
-                        pdf_count += 1
-                except Exception as e:
-                    print(f"元数据提取失败 {file_path}: {e}")
-        
+        for start in range(0, len(items), METADATA_SAVE_BATCH):
+            pdf_count += self.metadata_storage.save_many(items[start:start + METADATA_SAVE_BATCH])
+        update_build_status(self.index_root, state="metadata_extracted", metadata_total=len(pending),
+                            metadata_extracted=len(extracted))
+
         if pdf_count > 0:
             print(f"成功提取 {pdf_count} 个PDF文件的元数据")
     
@@ -128,12 +154,57 @@ class IncrementalIndexer:
             self._save_tracking()
             print("\n✅ 增量索引更新成功！")
             print(f"📊 当前已索引文件数: {len(self.indexed_files)}")
+            # 紧凑索引尚未接入线上检索，只同步一份增量段，由后台压缩任务合入 base release
+            if resolve_current_release(self.index_root) is not None:
+                self._add_compact_delta(new_docs)
         else:
             print("\n❌ 增量索引更新失败")
         
         print("=" * 60)
         return success
     
+    def _add_compact_delta(self, documents) -> bool:
+        """切分、嵌入新文献并写入紧凑索引的增量段；失败不影响已更新的线上索引"""
+        print("\n📖 切分新文档（紧凑索引增量段）...")
+        splitter = default_splitter()
+        nodes = [node for node in splitter.get_nodes_from_documents(documents) if node.get_content().strip()]
+        if not nodes:
+            print("⚠️  新文档没有可索引的文本")
+            return False
+
+        print(f"\n🔄 嵌入 {len(nodes)} 个文本块并写入增量段...")
+        chunks = []
+        positions: Dict[str, int] = {}
+        try:
+            vectors = rag_system.embed_texts([node.get_content() for node in nodes])
+            for node, vector in zip(nodes, vectors):
+                metadata = dict(node.metadata or {})
+                file_path = str(metadata.get("file_path") or metadata.get("file_name") or "")
+                try:
+                    page = int(metadata.get("page_label"))
+                except (TypeError, ValueError):
+                    page = None
+                # 与 release_builder.split_file 相同：路径 + 文件内序号决定 chunk_id，重复导入时保持不变
+                position = positions.get(file_path, 0)
+                positions[file_path] = position + 1
+                chunks.append(SegmentChunk(
+                    chunk_id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{file_path}#{position}")),
+                    document_id=str(node.ref_doc_id or ""),
+                    file_path=file_path,
+                    filename=str(metadata.get("file_name") or os.path.basename(file_path)),
+                    page=page,
+                    text=node.get_content(),
+                    metadata=metadata,
+                    vector=vector,
+                ))
+            segment = write_delta_segment(self.index_root, chunks, metadata_lookup=storage_lookup(self.metadata_storage))
+        except Exception as e:
+            print(f"\n⚠️  紧凑索引增量段写入失败（线上索引已更新，重建 release 时会包含这些文献）: {e}")
+            return False
+
+        print(f"\n✅ 已写入增量段 {os.path.basename(segment)}")
+        return True
+
     def rebuild_tracking(self):
         """重建跟踪文件（基于当前所有文件）"""
         all_files = self.get_all_files()
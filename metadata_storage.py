@@ -7,31 +7,248 @@
 import json
 import logging
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, Mapping, Optional, Tuple, Union
 
-from knowledge_paths import get_domain_paths
+from knowledge_paths import CITATION_CATALOG_ROOT, get_domain_paths
 from path_utils import normalize_for_storage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+METADATA_BACKENDS = ("sqlite", "json")
+# 访问目录时最多每隔这么久检查一次磁盘上的版本（JSON mtime / SQLite data_version）。
+CATALOG_RECHECK_SECONDS = 2.0
+# UPSERT 保留已有行的 rowid，加载顺序与 JSON 字典的插入顺序一致。
+_UPSERT = (
+    "INSERT INTO metadata(file_path, metadata_json) VALUES (?, ?) "
+    "ON CONFLICT(file_path) DO UPDATE SET metadata_json = excluded.metadata_json"
+)
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    file_path TEXT PRIMARY KEY,
+    metadata_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_info (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _file_signature(path: Path) -> Optional[str]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+_SHARED_STORAGES: Dict[tuple, "MetadataStorage"] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_metadata_storage(storage_path: Optional[str] = None, backend: Optional[str] = None) -> "MetadataStorage":
+    """同一进程内按路径共享一个目录实例，多个 RAG 系统不再各自解析同一份元数据。"""
+    resolved = Path(storage_path or get_domain_paths("sweetness").metadata).resolve()
+    key = (str(resolved), backend or os.getenv("METADATA_STORAGE_BACKEND") or "")
+    with _SHARED_LOCK:
+        storage = _SHARED_STORAGES.get(key)
+        if storage is None:
+            storage = _SHARED_STORAGES[key] = MetadataStorage(str(resolved), backend=backend)
+        return storage
+
+
+def load_metadata_file(json_path: Union[str, Path]) -> Dict:
+    """读取某个领域的全部元数据：优先同目录的 SQLite 库，没有则读 JSON。"""
+    json_path = Path(json_path)
+    database_path = json_path.with_suffix(".sqlite")
+    if database_path.is_file():
+        storage = MetadataStorage(str(json_path), backend="sqlite")
+        try:
+            return storage.get_all_metadata()
+        finally:
+            storage.close()
+    return json.loads(json_path.read_text(encoding="utf-8"))
+
 
 class MetadataStorage:
     """元数据存储管理器"""
     
-    def __init__(self, storage_path: Optional[str] = None):
+    def __init__(self, storage_path: Optional[str] = None, backend: Optional[str] = None):
         """
         初始化存储管理器
         
         Args:
-            storage_path: 元数据JSON文件路径
+            storage_path: 元数据JSON文件路径（SQLite 后端的库文件与之同名，后缀为 .sqlite）
+            backend: "sqlite" 或 "json"；未指定时读 METADATA_STORAGE_BACKEND，
+                引用目录用 JSON，其余默认 SQLite
         """
         resolved_path = storage_path or str(get_domain_paths("sweetness").metadata)
         self.storage_path = Path(resolved_path)
-        self._ensure_storage_dir()
-        self._metadata_cache = self._load_metadata()
+        self.backend = (backend or os.getenv("METADATA_STORAGE_BACKEND") or self._default_backend()).strip().lower()
+        if self.storage_path.suffix in (".sqlite", ".db"):
+            self.backend = "sqlite"
+        if self.backend not in METADATA_BACKENDS:
+            raise ValueError(f"未知的元数据存储后端: {self.backend}")
+        self.database_path = self.storage_path.with_suffix(".sqlite") if self.storage_path.suffix == ".json" \
+            else self.storage_path
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        # 目录在第一次访问时才加载；version 每次加载或写入递增，供派生索引判断是否过期。
+        self._cache: Optional[Dict] = None
+        self._filename_index: Dict[str, str] = {}
+        self._path_aliases: Dict[str, str] = {}
+        self._disk_version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self.version = 0
+        if self.backend == "sqlite":
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        else:
+            self._ensure_storage_dir()
+
+    @property
+    def _metadata_cache(self) -> Dict:
+        with self._lock:
+            if self._cache is None or self._changed_on_disk():
+                self._reload()
+            return self._cache
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = self._open_database()
+        return self._connection
+
+    def _current_disk_version(self) -> tuple:
+        if self.backend == "sqlite":
+            data_version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+            return data_version, _file_signature(self.storage_path)
+        return (_file_signature(self.storage_path),)
+
+    def _changed_on_disk(self) -> bool:
+        """其他进程写库或 JSON 被外部重新生成后重新加载；同一实例自己的写入不算。"""
+        now = time.monotonic()
+        if now - self._checked_at < CATALOG_RECHECK_SECONDS:
+            return False
+        self._checked_at = now
+        return self._current_disk_version() != self._disk_version
+
+    def _reload(self) -> None:
+        if self.backend == "sqlite":
+            self._connect()
+            if self.database_path != self.storage_path:
+                self.migrate_from_json()
+            data = self._load_from_database()
+        else:
+            data = self._load_metadata()
+        self._replace_cache(data)
+        self._disk_version = self._current_disk_version()
+        self._checked_at = time.monotonic()
+
+    def _replace_cache(self, data: Dict) -> None:
+        self._cache = data
+        self._rebuild_filename_index()
+        self.version += 1
+
+    def _default_backend(self) -> str:
+        """生成的引用目录是随代码发布的只读 JSON，不在旁边建库。"""
+        try:
+            self.storage_path.resolve().relative_to(CITATION_CATALOG_ROOT.resolve())
+        except ValueError:
+            return "sqlite"
+        return "json"
+
+    def _open_database(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.database_path), check_same_thread=False, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SQLITE_SCHEMA)
+        return connection
+
+    def _load_from_database(self) -> Dict:
+        with self._lock:
+            rows = self._connect().execute("SELECT file_path, metadata_json FROM metadata ORDER BY rowid").fetchall()
+        data = {file_path: json.loads(raw) for file_path, raw in rows}
+        logger.info(f"加载了 {len(data)} 个文件的元数据")
+        return data
+
+    def migrate_from_json(self, json_path: Optional[str] = None) -> int:
+        """
+        把 JSON 元数据（或其 .bak 备份）导入 SQLite 库；同一版本的 JSON 只导入一次。
+
+        JSON 被外部重新生成（如引用目录重建）后签名变化，会再次按路径覆盖导入，
+        库中独有的条目保留。
+
+        Returns:
+            本次导入的条目数
+        """
+        if self.backend != "sqlite":
+            return 0
+        source = Path(json_path) if json_path else self.storage_path
+        signature = _file_signature(source) or _file_signature(source.with_suffix('.json.bak'))
+        if signature is None:
+            return 0
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM storage_info WHERE key = ?", (f"json_source:{source}",)
+            ).fetchone()
+            if row is not None and row[0] == signature:
+                return 0
+        data = self._load_metadata(source)
+        with self._lock, self._connection:
+            self._connection.executemany(
+                _UPSERT,
+                ((key, json.dumps(meta, ensure_ascii=False)) for key, meta in data.items()),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO storage_info(key, value) VALUES (?, ?)",
+                (f"json_source:{source}", signature),
+            )
+        logger.info(f"从 {source} 导入了 {len(data)} 个文件的元数据到 {self.database_path}")
+        return len(data)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            with self._lock:
+                self._connection.close()
+                self._connection = None
+
+    def _rebuild_filename_index(self) -> None:
+        """路径别名与文件名 → 存储键，替代按路径/文件名回退时的全量遍历。"""
+        self._filename_index = {}
+        self._path_aliases = {}
+        for stored_path in self._cache:
+            self._index_entry(stored_path)
+
+    def _index_entry(self, stored_path: str) -> None:
+        alias = normalize_for_storage(stored_path)
+        if alias != stored_path:
+            self._path_aliases.setdefault(alias, stored_path)
+        self._filename_index.setdefault(Path(stored_path).name, stored_path)
+        filename = str(self._cache[stored_path].get("filename") or "").strip()
+        if filename:
+            self._filename_index.setdefault(filename, stored_path)
+
+    def _persist(self, changed: Mapping[str, Dict] = None, deleted: Iterable[str] = ()) -> None:
+        """SQLite 后端只写变动的行；JSON 后端仍整体重写文件。"""
+        self.version += 1
+        if self.backend != "sqlite":
+            self._save_to_disk(self._metadata_cache)
+            self._disk_version = self._current_disk_version()
+            return
+        with self._lock, self._connect():
+            if changed:
+                self._connection.executemany(
+                    _UPSERT,
+                    ((key, json.dumps(meta, ensure_ascii=False)) for key, meta in changed.items()),
+                )
+            deleted = list(deleted)
+            if deleted:
+                self._connection.executemany("DELETE FROM metadata WHERE file_path = ?", ((key,) for key in deleted))
     
     def _ensure_storage_dir(self):
         """确保存储目录存在"""
@@ -51,18 +268,19 @@ class MetadataStorage:
                 self._save_to_disk({})
                 logger.info(f"创建元数据存储文件: {self.storage_path}")
     
-    def _load_metadata(self) -> Dict:
+    def _load_metadata(self, source: Optional[Path] = None) -> Dict:
         """从磁盘加载元数据"""
+        source = source or self.storage_path
         try:
-            if self.storage_path.exists():
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
+            if source.exists():
+                with open(source, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     logger.info(f"加载了 {len(data)} 个文件的元数据")
                     return data
         except Exception as e:
             logger.error(f"加载元数据失败: {str(e)}")
 
-        backup_path = self.storage_path.with_suffix('.json.bak')
+        backup_path = source.with_suffix('.json.bak')
         try:
             if backup_path.exists():
                 with open(backup_path, 'r', encoding='utf-8') as f:
@@ -115,15 +333,35 @@ class MetadataStorage:
             file_path: 文件路径（作为键）
             metadata: 元数据字典
         """
-        normalized_path = normalize_for_storage(file_path)
+        self.save_many([(file_path, metadata)])
+        logger.info(f"保存元数据: {metadata.get('title', 'Unknown')[:50]}...")
 
-        metadata['last_modified'] = datetime.now().isoformat()
-        metadata['file_path'] = normalized_path
+    def save_many(self, items: Union[Mapping[str, Dict], Iterable[Tuple[str, Dict]]]) -> int:
+        """
+        批量保存元数据，一次事务（JSON 后端为一次文件写入）
 
-        self._metadata_cache[normalized_path] = metadata
-        self._save_to_disk(self._metadata_cache)
+        Args:
+            items: {文件路径: 元数据} 或 (文件路径, 元数据) 序列
 
-        logger.info(f"保存元数据: {metadata.get('title', 'Unknown')[:50]}...")
+        Returns:
+            保存的条目数
+        """
+        pairs = items.items() if isinstance(items, Mapping) else items
+        changed: Dict[str, Dict] = {}
+        now = datetime.now().isoformat()
+        for file_path, metadata in pairs:
+            normalized_path = normalize_for_storage(file_path)
+            metadata['last_modified'] = now
+            metadata['file_path'] = normalized_path
+            changed[normalized_path] = metadata
+        if not changed:
+            return 0
+        with self._lock:
+            self._metadata_cache.update(changed)
+            for normalized_path in changed:
+                self._index_entry(normalized_path)
+            self._persist(changed)
+        return len(changed)
     
     def _parse_filename_metadata(self, filename: str) -> Optional[Dict]:
         """
@@ -156,6 +394,18 @@ class MetadataStorage:
             }
         return None
 
+    def find_metadata(self, file_path: str) -> Optional[Dict]:
+        """按归一化路径、原始 POSIX 路径、文件名依次查找已存储的元数据（不解析文件名）。"""
+        cache = self._metadata_cache
+        for key in (normalize_for_storage(file_path), str(Path(file_path).as_posix())):
+            if key in cache:
+                return cache[key]
+            alias = self._path_aliases.get(key)
+            if alias is not None:
+                return cache[alias]
+        stored_path = self._filename_index.get(Path(file_path).name)
+        return cache[stored_path] if stored_path is not None else None
+
     def get_metadata(self, file_path: str) -> Optional[Dict]:
         """
         获取文件的元数据
@@ -167,23 +417,12 @@ class MetadataStorage:
         Returns:
             元数据字典，如果不存在返回None
         """
-        # 1. 尝试归一化相对路径匹配
-        rel_key = normalize_for_storage(file_path)
-        if rel_key in self._metadata_cache:
-            return self._metadata_cache[rel_key]
+        # 1-3. 归一化相对路径 → 原始 POSIX 路径（兼容迁移前数据）→ 文件名
+        metadata = self.find_metadata(file_path)
+        if metadata is not None:
+            return metadata
 
-        # 2. 尝试原始 POSIX 路径（向后兼容迁移前数据）
-        raw_posix = str(Path(file_path).as_posix())
-        if raw_posix in self._metadata_cache:
-            return self._metadata_cache[raw_posix]
-
-        # 3. 尝试通过文件名匹配（忽略路径差异）
         target_filename = Path(file_path).name
-        for stored_path, meta in self._metadata_cache.items():
-            if Path(stored_path).name == target_filename:
-                logger.debug(f"通过文件名匹配找到元数据: {target_filename}")
-                return meta
-
         # 4. 尝试从文件名解析（最后的回退策略）
         parsed_meta = self._parse_filename_metadata(target_filename)
         if parsed_meta:
@@ -224,8 +463,10 @@ class MetadataStorage:
         normalized_path = normalize_for_storage(file_path)
 
         if normalized_path in self._metadata_cache:
-            del self._metadata_cache[normalized_path]
-            self._save_to_disk(self._metadata_cache)
+            with self._lock:
+                del self._metadata_cache[normalized_path]
+                self._rebuild_filename_index()
+                self._persist(deleted=[normalized_path])
             logger.info(f"删除元数据: {file_path}")
             return True
 
@@ -245,11 +486,7 @@ class MetadataStorage:
         if normalized_path in self._metadata_cache:
             return True
         # Fallback: filename match
-        target_filename = Path(file_path).name
-        for stored_path in self._metadata_cache:
-            if Path(stored_path).name == target_filename:
-                return True
-        return False
+        return Path(file_path).name in self._filename_index
 
     def migrate_to_relative_paths(self) -> int:
         """One-time migration: convert absolute-path keys to relative paths."""
@@ -264,8 +501,10 @@ class MetadataStorage:
                 new_cache[new_key] = meta
 
         if migrated > 0:
-            self._metadata_cache = new_cache
-            self._save_to_disk(self._metadata_cache)
+            with self._lock:
+                stale = [key for key in self._metadata_cache if key not in new_cache]
+                self._replace_cache(new_cache)
+                self._persist(new_cache, deleted=stale)
             logger.info(f"Migrated {migrated} metadata keys from absolute to relative paths")
         return migrated
     
@@ -276,8 +515,10 @@ class MetadataStorage:
         Returns:
             统计信息字典
         """
+        active_path = self.database_path if self.backend == "sqlite" else self.storage_path
         return {
             'total_files': len(self._metadata_cache),
-            'storage_path': str(self.storage_path),
-            'storage_size': self.storage_path.stat().st_size if self.storage_path.exists() else 0
+            'backend': self.backend,
+            'storage_path': str(active_path),
+            'storage_size': active_path.stat().st_size if active_path.exists() else 0
         }
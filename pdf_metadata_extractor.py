@@ -7,7 +7,7 @@
 import logging
 import re
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 try:
     import fitz  # PyMuPDF
@@ -96,25 +96,34 @@ class PDFMetadataExtractor:
             包含元数据的字典
         """
         logger.info(f"开始提取元数据: {pdf_path}")
-        
-        # 初始化默认值
+        metadata = self.apply_filename_fallbacks(self.extract_document_metadata(pdf_path), pdf_path)
+        logger.info(f"元数据提取完成: {metadata['title'][:50]}...")
+        return metadata
+
+    def extract_document_metadata(self, pdf_path: str) -> Dict[str, any]:
+        """
+        只依赖文件内容的元数据（不含文件名及由文件名推断的期刊），可按内容哈希缓存
+
+        PDF 只打开一次，文档信息字段与第一页文本一并读出。
+        """
         metadata = {
             'journal': 'Unknown Journal',
             'year': 'N/A',
             'title': 'Unknown Title',
             'authors': [],
             'doi': 'Not Available',
-            'filename': Path(pdf_path).name
         }
         
         try:
+            info, first_page_text = self.read_pdf(pdf_path)
+
             # 尝试从PDF元数据提取
-            pdf_metadata = self.extract_from_pdf_metadata(pdf_path)
+            pdf_metadata = self._metadata_from_info(info)
             metadata.update({k: v for k, v in pdf_metadata.items() if v})
             
             # 如果元数据不完整，从第一页提取
             if metadata['title'] == 'Unknown Title' or metadata['doi'] == 'Not Available':
-                first_page_data = self.extract_from_first_page(pdf_path)
+                first_page_data = self._metadata_from_text(first_page_text)
                 # 只更新缺失的字段
                 for key, value in first_page_data.items():
                     if value and (not metadata.get(key) or metadata[key] in ['Unknown Journal', 'Unknown Title', 'Not Available', 'N/A']):
@@ -126,107 +135,103 @@ class PDFMetadataExtractor:
                 if journal_from_doi:
                     metadata['journal'] = journal_from_doi
             
-            # 尝试从文件名推断期刊（最后的备选）
-            if metadata['journal'] == 'Unknown Journal':
-                metadata['journal'] = self._extract_journal_from_filename(pdf_path)
-            
-            logger.info(f"元数据提取完成: {metadata['title'][:50]}...")
-            
         except Exception as e:
             logger.error(f"提取元数据失败 {pdf_path}: {str(e)}")
         
         return metadata
+
+    def apply_filename_fallbacks(self, metadata: Dict[str, any], pdf_path: str) -> Dict[str, any]:
+        """补上文件名，并在期刊仍未知时从文件名推断（最后的备选）"""
+        metadata['filename'] = Path(pdf_path).name
+        if metadata.get('journal', 'Unknown Journal') == 'Unknown Journal':
+            metadata['journal'] = self._extract_journal_from_filename(pdf_path)
+        return metadata
+
+    def read_pdf(self, pdf_path: str) -> Tuple[Dict[str, any], str]:
+        """打开一次 PDF，返回 (文档信息字段, 第一页文本)"""
+        info: Dict[str, any] = {}
+        text = ""
+        if fitz:
+            doc = fitz.open(pdf_path)
+            try:
+                pdf_info = doc.metadata or {}
+                info = {key: pdf_info.get(key) for key in ('title', 'author', 'subject', 'keywords')}
+                # PyMuPDF returns creationDate like "D:20201027..."
+                match = re.search(r'D:(\d{4})', pdf_info.get('creationDate') or '')
+                if match:
+                    info['year'] = int(match.group(1))
+                try:
+                    if len(doc) > 0:
+                        text = doc[0].get_text()
+                except Exception as e:
+                    logger.warning(f"从第一页提取信息失败: {str(e)}")
+            finally:
+                doc.close()
+        else:
+            reader = PdfReader(pdf_path)
+            pdf_info = reader.metadata
+            if pdf_info:
+                info = {'title': pdf_info.title, 'author': pdf_info.author, 'subject': pdf_info.subject}
+                try:
+                    info['year'] = pdf_info.creation_date.year
+                except Exception:
+                    pass
+            try:
+                if len(reader.pages) > 0:
+                    text = reader.pages[0].extract_text() or ""
+            except Exception as e:
+                logger.warning(f"从第一页提取信息失败: {str(e)}")
+        return info, text
     
     def extract_from_pdf_metadata(self, pdf_path: str) -> Dict[str, any]:
         """从PDF元数据字段提取信息"""
-        metadata = {}
-        
         try:
-            if fitz:
-                doc = fitz.open(pdf_path)
-                pdf_info = doc.metadata
-                
-                if pdf_info:
-                    # 提取标题
-                    if pdf_info.get('title'):
-                        title = pdf_info['title'].strip()
-                        if '.pdf' not in title.lower() and len(title) > 15:
-                            metadata['title'] = title
-                    
-                    # 提取作者
-                    if pdf_info.get('author'):
-                        metadata['authors'] = self._parse_authors(pdf_info['author'].strip())
-                    
-                    # 提取年份 (creationDate format: D:YYYYMMDD...)
-                    if pdf_info.get('creationDate'):
-                        cdate = pdf_info['creationDate']
-                        # PyMuPDF returns string like "D:20201027..."
-                        match = re.search(r'D:(\d{4})', cdate)
-                        if match:
-                            year = int(match.group(1))
-                            if 1900 <= year <= 2099:
-                                metadata['year'] = str(year)
-                    
-                    # 提取DOI from subject or keywords if available
-                    if pdf_info.get('subject'):
-                        doi_match = self.DOI_PATTERN.search(pdf_info['subject'])
-                        if doi_match:
-                            metadata['doi'] = doi_match.group(0)
-                    
-                    if pdf_info.get('keywords'):
-                        doi_match = self.DOI_PATTERN.search(pdf_info['keywords'])
-                        if doi_match:
-                            metadata['doi'] = doi_match.group(0)
-                            
-                doc.close()
-            else:
-                # Fallback to pypdf
-                reader = PdfReader(pdf_path)
-                pdf_info = reader.metadata
-                
-                if pdf_info:
-                    if pdf_info.title:
-                        title = pdf_info.title.strip()
-                        if '.pdf' not in title.lower() and len(title) > 15:
-                            metadata['title'] = title
-                    
-                    if pdf_info.author:
-                        metadata['authors'] = self._parse_authors(pdf_info.author.strip())
-                    
-                    if pdf_info.creation_date:
-                        try:
-                            year = pdf_info.creation_date.year
-                            if 1900 <= year <= 2099:
-                                metadata['year'] = str(year)
-                        except Exception:
-                            pass
-                    
-                    if pdf_info.subject:
-                        doi_match = self.DOI_PATTERN.search(pdf_info.subject)
-                        if doi_match:
-                            metadata['doi'] = doi_match.group(0)
-                
+            info, _ = self.read_pdf(pdf_path)
         except Exception as e:
             logger.warning(f"读取PDF元数据失败: {str(e)}")
+            return {}
+        return self._metadata_from_info(info)
+
+    def _metadata_from_info(self, pdf_info: Dict[str, any]) -> Dict[str, any]:
+        metadata = {}
+        
+        # 提取标题
+        if pdf_info.get('title'):
+            title = pdf_info['title'].strip()
+            if '.pdf' not in title.lower() and len(title) > 15:
+                metadata['title'] = title
+        
+        # 提取作者
+        if pdf_info.get('author'):
+            metadata['authors'] = self._parse_authors(pdf_info['author'].strip())
+        
+        # 提取年份
+        year = pdf_info.get('year')
+        if isinstance(year, int) and 1900 <= year <= 2099:
+            metadata['year'] = str(year)
+        
+        # 提取DOI from subject or keywords if available
+        for field in ('subject', 'keywords'):
+            if pdf_info.get(field):
+                doi_match = self.DOI_PATTERN.search(pdf_info[field])
+                if doi_match:
+                    metadata['doi'] = doi_match.group(0)
         
         return metadata
     
     def extract_from_first_page(self, pdf_path: str) -> Dict[str, any]:
         """从PDF第一页文本提取信息"""
+        try:
+            _, text = self.read_pdf(pdf_path)
+        except Exception as e:
+            logger.warning(f"从第一页提取信息失败: {str(e)}")
+            return {}
+        return self._metadata_from_text(text)
+
+    def _metadata_from_text(self, text: str) -> Dict[str, any]:
         metadata = {}
         
         try:
-            text = ""
-            if fitz:
-                doc = fitz.open(pdf_path)
-                if len(doc) > 0:
-                    text = doc[0].get_text()
-                doc.close()
-            else:
-                reader = PdfReader(pdf_path)
-                if len(reader.pages) > 0:
-                    text = reader.pages[0].extract_text()
-            
             if not text:
                 return metadata
             
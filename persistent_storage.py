@@ -11,18 +11,24 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import os
 import shutil
 import sys
 import threading
+import time
 import types
+from collections import OrderedDict
 from pathlib import Path
 import re
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
-from metadata_storage import MetadataStorage
+import numpy as np
+
+from metadata_storage import shared_metadata_storage
+from services.embedding_cache import model_fingerprint, shared_embedding_cache
 
 try:
     from llama_index.core import (
@@ -32,6 +38,7 @@ try:
         StorageContext,
         load_index_from_storage,
     )
+    from llama_index.core.schema import MetadataMode
 except Exception:
     # 兼容不同版本的导入路径
     from llama_index import (
@@ -41,6 +48,7 @@ except Exception:
         StorageContext,
         load_index_from_storage,
     )
+    from llama_index.schema import MetadataMode
 
 try:
     import faiss
@@ -58,6 +66,130 @@ _SHARED_EMBEDDINGS: Dict[Tuple[str, str], Tuple[Any, int]] = {}
 _PROJECT_ROOT = Path(__file__).resolve().parent
 
 
+class QueryEmbeddingCache:
+    """进程内查询向量 LRU+TTL 缓存，四个知识域共享同一嵌入模型时共用。
+
+    键为 (模型指纹, 归一化查询文本)；向量以 float32 存储，
+    内存上限约为 ``max_entries × dimension × 4`` 字节。
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(str(text or "").split())
+
+    def get(self, fingerprint: str, text: str) -> Optional[np.ndarray]:
+        key = (fingerprint, self.normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, fingerprint: str, text: str, vector: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        key = (fingerprint, self.normalize(text))
+        value = np.asarray(vector, dtype=np.float32).reshape(-1)
+        value.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries)
+            dimension = len(next(iter(self._entries.values()))[1]) if entries else 0
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "dimension": dimension,
+                "bytes": entries * dimension * 4,
+                "max_bytes": self.max_entries * dimension * 4,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _build_query_embedding_cache() -> QueryEmbeddingCache:
+    try:
+        from config import config as _cfg
+        return QueryEmbeddingCache(
+            max_entries=int(getattr(_cfg, "QUERY_EMBED_CACHE_SIZE", 2048)),
+            ttl_seconds=float(getattr(_cfg, "QUERY_EMBED_CACHE_TTL_SECONDS", 3600)),
+        )
+    except Exception:
+        return QueryEmbeddingCache()
+
+
+_QUERY_EMBEDDING_CACHE = _build_query_embedding_cache()
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    return _QUERY_EMBEDDING_CACHE
+
+
+def _embedding_fingerprint(embed_model: Any) -> Optional[str]:
+    """仅对进程内共享的真实模型返回指纹；未知模型不缓存，避免不同模型串用向量。"""
+    for model_key, (model, dimension) in list(_SHARED_EMBEDDINGS.items()):
+        if model is embed_model:
+            return "|".join([*model_key, str(dimension)])
+    return None
+
+
+def embed_query_batch(embed_model: Any, queries: List[str]) -> List[Any]:
+    """批量生成查询向量；命中缓存的变体不再编码，模型不支持批量接口时逐条回退。"""
+    if not queries:
+        return []
+    fingerprint = _embedding_fingerprint(embed_model)
+    cache = _QUERY_EMBEDDING_CACHE
+    vectors: List[Any] = [None] * len(queries)
+    pending: List[int] = []
+    for position, query in enumerate(queries):
+        cached = cache.get(fingerprint, query) if fingerprint else None
+        if cached is None:
+            pending.append(position)
+        else:
+            vectors[position] = cached
+    if pending:
+        missing = [queries[position] for position in pending]
+        batch = getattr(embed_model, "get_query_embeddings", None)
+        if callable(batch):
+            computed = batch(missing)
+        else:
+            computed = [embed_model.get_query_embedding(query) for query in missing]
+        for position, vector in zip(pending, computed):
+            vectors[position] = vector
+            if fingerprint:
+                cache.put(fingerprint, queries[position], vector)
+    return vectors
+
+
 def _project_path(value: str) -> str:
     path = Path(value).expanduser()
     if not path.is_absolute():
@@ -72,6 +204,7 @@ class PersistentRAGSystem:
         persist_dir: str = "./storage",
         metadata_path: Optional[str] = None,
         allow_auto_build: Optional[bool] = None,
+        rag_config: Optional[Any] = None,
     ):
         if metadata_path is None:
             from knowledge_paths import get_runtime_metadata_path
@@ -79,10 +212,12 @@ class PersistentRAGSystem:
             metadata_path = str(get_runtime_metadata_path("sweetness"))
         self.data_dir = _project_path(data_dir)
         self.persist_dir = _project_path(persist_dir)
-        self.metadata_storage = MetadataStorage(storage_path=_project_path(metadata_path))
+        self.metadata_storage = shared_metadata_storage(_project_path(metadata_path))
         if allow_auto_build is None:
             allow_auto_build = os.getenv("RAG_ALLOW_AUTO_BUILD", "").strip().lower() in {"1", "true", "yes"}
         self.allow_auto_build = allow_auto_build
+        # 域级 RAGConfig（ANN nprobe/efSearch 覆盖）；None 时用甜味默认配置
+        self.rag_config = rag_config
         self.index: Optional[VectorStoreIndex] = None
         self.query_engine = None
         self.models_configured = False
@@ -109,7 +244,16 @@ class PersistentRAGSystem:
         from llama_index.core import Settings
         from sweetseek.hybrid_adapter import HybridIndexAdapter
 
-        self.index = HybridIndexAdapter(hybrid_dir, Settings.embed_model)
+        rag_config = self.rag_config
+        if rag_config is None:
+            from config import sweet_rag_config as rag_config
+
+        self.index = HybridIndexAdapter(
+            hybrid_dir,
+            Settings.embed_model,
+            nprobe=rag_config.ann_nprobe,
+            ef_search=rag_config.ann_ef_search,
+        )
         if self.embedding_dim and self.index.embedding_dim != self.embedding_dim:
             raise ValueError(
                 f"混合索引维度 {self.index.embedding_dim} 与模型维度 {self.embedding_dim} 不一致"
@@ -360,6 +504,10 @@ class PersistentRAGSystem:
                             rows = vectors.tolist() if hasattr(vectors, 'tolist') else vectors
                             return [[float(x) for x in row] for row in rows]
 
+                        def get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+                            # 多查询变体一次前向推理，避免逐条 encode 的重复开销。
+                            return self._get_text_embeddings(list(queries))
+
                         async def _aget_query_embedding(self, text: str) -> List[float]:
                             return self._get_query_embedding(text)
 
@@ -528,9 +676,8 @@ class PersistentRAGSystem:
                 total_docs += len(documents)
 
                 if self.index is None:
-                    self.index = VectorStoreIndex.from_documents(documents)
-                else:
-                    self._insert_document_batch(documents)
+                    self.index = VectorStoreIndex(nodes=[])
+                self._insert_document_batch(documents)
 
             if self.index is None:
                 msg = "文档读取完成但未生成有效索引"
@@ -568,10 +715,39 @@ class PersistentRAGSystem:
             self.index._transformations,
             show_progress=False,
         )
+        pending = [node for node in nodes if node.embedding is None]
+        if pending:
+            # 与 LlamaIndex 相同的嵌入文本（含元数据）；预先填好向量，insert_nodes 不再重复嵌入
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in pending]
+            for node, vector in zip(pending, self.embed_texts(texts)):
+                node.embedding = list(vector)
         self.index.insert_nodes(nodes)
         for document in documents:
             self.index.docstore.set_document_hash(document.id_, document.hash)
 
+    def index_version(self) -> Optional[str]:
+        """已加载索引的版本标识（混合索引取 manifest，旧版取向量文件的修改时间）；未加载时为 None。"""
+        if self.index is None:
+            return None
+        hybrid_dir = self._hybrid_index_dir() if self.index_format == "faiss_sqlite" else None
+        try:
+            if hybrid_dir is not None and (hybrid_dir / "manifest.json").is_file():
+                manifest = json.loads((hybrid_dir / "manifest.json").read_text(encoding="utf-8"))
+                return f"{manifest.get('created_at')}:{manifest.get('chunk_count')}"
+            stat = os.stat(os.path.join(self.persist_dir, "default__vector_store.json"))
+        except (OSError, ValueError):
+            return None
+        return f"legacy:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """批量嵌入文档文本；真实模型下只为持久化嵌入缓存中没有的文本调用模型。"""
+        self._configure_models()
+        embed = Settings.embed_model.get_text_embedding_batch
+        cache = shared_embedding_cache() if self.embedding_mode == "real" else None
+        if cache is None:
+            return embed(texts)
+        return cache.embed(model_fingerprint(self.embedding_dim), texts, embed)
+
     def load_existing_index(self) -> bool:
         """仅加载已有索引；不存在时返回 False。"""
         self.last_error = None
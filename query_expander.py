@@ -1,12 +1,129 @@
 #!/usr/bin/env python3
 """
 查询扩展模块 - 甜味领域同义词和相关术语扩展
+
+词表编译为 Aho-Corasick 自动机（未安装 pyahocorasick 时退化为按首字符分桶的哈希扫描），
+对查询做单遍最左最长匹配，扩展耗时与词表规模无关。
 """
 
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_SWEETNESS_VOCABULARY = PROJECT_ROOT / "data" / "compounds_sweet.xlsx"
+# 词表文件中的同义词列（分隔符 ; | ， ； 、）
+_SYNONYM_COLUMNS = ("synonyms", "aliases", "chinese name", "中文名", "同义词")
+_SYNONYM_SPLIT = re.compile(r"[;|；、]|,\s")
+_WORD_CHAR = re.compile(r"[0-9a-z]")
+
+
+def load_vocabulary(path) -> Dict[str, List[str]]:
+    """读取 {标准术语: [同义词]} 词表：.json，.csv/.tsv（首列为标准术语），或 .xlsx（Compound Name 列）。"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return {str(k).strip(): [str(v).strip() for v in (vs or []) if str(v).strip()] for k, vs in data.items()}
+    if suffix in (".csv", ".tsv"):
+        import csv
+
+        vocabulary: Dict[str, List[str]] = {}
+        with path.open(encoding="utf-8", newline="") as handle:
+            for row in csv.reader(handle, delimiter="\t" if suffix == ".tsv" else ","):
+                cells = [cell.strip() for cell in row if cell and cell.strip()]
+                if cells and not cells[0].startswith("#"):
+                    vocabulary.setdefault(cells[0], []).extend(cells[1:])
+        return vocabulary
+    if suffix == ".xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(cell or "").strip().lower() for cell in next(rows, ())]
+            name_column = header.index("compound name") if "compound name" in header else 0
+            synonym_columns = [i for i, name in enumerate(header) if name in _SYNONYM_COLUMNS]
+            vocabulary = {}
+            for row in rows:
+                name = str(row[name_column] or "").strip() if name_column < len(row) else ""
+                if not name:
+                    continue
+                synonyms = vocabulary.setdefault(name, [])
+                for column in synonym_columns:
+                    if column < len(row) and row[column]:
+                        synonyms.extend(x.strip() for x in _SYNONYM_SPLIT.split(str(row[column])) if x.strip())
+            return vocabulary
+        finally:
+            workbook.close()
+    raise ValueError(f"unsupported vocabulary format: {path.suffix}")
+
+
+class TermMatcher:
+    """小写术语 -> 标准术语 的自动机，单遍最左最长、互不重叠匹配。
+
+    拉丁字母术语要求起始处为词边界（避免 "sc" 命中 "science"），
+    不超过 3 个字符的缩写还要求结尾为词边界；结尾不设限以兼容复数等词形。
+    """
+
+    def __init__(self, reverse_index: Dict[str, Any]):
+        self._terms = {term: standard for term, standard in reverse_index.items() if term}
+        self._automaton = None
+        self._lengths: Dict[str, List[int]] = {}
+        if ahocorasick is not None and self._terms:
+            self._automaton = ahocorasick.Automaton()
+            for term, standard in self._terms.items():
+                self._automaton.add_word(term, (term, standard))
+            self._automaton.make_automaton()
+        else:
+            for term in self._terms:
+                self._lengths.setdefault(term[0], []).append(len(term))
+            for first, lengths in self._lengths.items():
+                self._lengths[first] = sorted(set(lengths), reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, Tuple[str, Any]]]:
+        if self._automaton is not None:
+            yield from self._automaton.iter_long(text)
+            return
+        position = 0
+        while position < len(text):
+            for length in self._lengths.get(text[position], ()):
+                term = text[position:position + length]
+                if len(term) == length and term in self._terms:
+                    yield position + length - 1, (term, self._terms[term])
+                    position += length
+                    break
+            else:
+                position += 1
+
+    def match(self, text: str) -> List[Any]:
+        """返回命中的标准术语（按出现顺序、去重）。"""
+        found: Dict[Any, None] = {}
+        for end, (term, standard) in self._scan(text):
+            start = end - len(term) + 1
+            if _WORD_CHAR.match(term[0]) and start > 0 and _WORD_CHAR.match(text[start - 1]):
+                continue
+            if (len(term) <= 3 and _WORD_CHAR.match(term[-1])
+                    and end + 1 < len(text) and _WORD_CHAR.match(text[end + 1])):
+                continue
+            found[standard] = None
+        return list(found)
+
+
 class SweetnessQueryExpander:
     """甜味领域查询扩展器"""
     
-    def __init__(self):
+    def __init__(self, vocabulary_path: Optional[str] = None):
         # 甜味剂同义词词典
         self.sweetener_synonyms = {
             # 天然甜味剂
@@ -53,12 +170,24 @@ class SweetnessQueryExpander:
             "乳制品": ["dairy", "奶制品", "milk products"],
         }
         
+        # 外部词表（化合物名等），不覆盖内置词典中已有的映射
+        if vocabulary_path is None:
+            vocabulary_path = os.getenv("SWEETNESS_VOCABULARY_PATH") or (
+                DEFAULT_SWEETNESS_VOCABULARY if DEFAULT_SWEETNESS_VOCABULARY.is_file() else ""
+            )
+        self.vocabulary: Dict[str, List[str]] = load_vocabulary(vocabulary_path) if vocabulary_path else {}
+
         # 反向索引（用于快速查找）
         self.reverse_index = self._build_reverse_index()
+        self.term_matcher = TermMatcher(self.reverse_index)
     
     def _build_reverse_index(self):
         """构建反向索引：任何术语 -> 标准术语"""
         reverse = {}
+        for standard_term, synonyms in self.vocabulary.items():
+            reverse[standard_term.lower()] = standard_term
+            for syn in synonyms:
+                reverse[syn.lower()] = standard_term
         
         # 处理甜味剂同义词
         for standard_term, synonyms in self.sweetener_synonyms.items():
@@ -87,18 +216,17 @@ class SweetnessQueryExpander:
         """
         query_lower = query.lower()
         expanded_terms = set()
-        matched_concepts = set()
         
-        # 查找匹配的术语
-        for term, standard in self.reverse_index.items():
-            if term in query_lower:
-                matched_concepts.add(standard)
+        # 单遍最长匹配查找术语
+        matched_concepts = set(self.term_matcher.match(query_lower))
         
         # 为每个匹配的概念添加同义词
         for concept in matched_concepts:
             # 添加甜味剂同义词
             if concept in self.sweetener_synonyms:
                 expanded_terms.update(self.sweetener_synonyms[concept])
+            elif concept in self.vocabulary:
+                expanded_terms.update(self.vocabulary[concept])
             
             # 添加概念扩展
             if concept in self.concept_expansion:
@@ -166,6 +294,7 @@ class DualProteinQueryExpander:
             "pH效应": ["pH", "acidic", "alkaline", "isoelectric point", "pI"],
         }
         self.reverse_index = self._build_reverse_index()
+        self.term_matcher = TermMatcher(self.reverse_index)
 
     def _build_reverse_index(self):
         reverse = {}
@@ -182,10 +311,7 @@ class DualProteinQueryExpander:
     def expand_query(self, query: str) -> dict:
         query_lower = query.lower()
         expanded_terms = set()
-        matched_concepts = set()
-        for term, standard in self.reverse_index.items():
-            if term in query_lower:
-                matched_concepts.add(standard)
+        matched_concepts = set(self.term_matcher.match(query_lower))
         for concept in matched_concepts:
             if concept in self.term_synonyms:
                 expanded_terms.update(self.term_synonyms[concept])
@@ -236,6 +362,7 @@ class ProteoglycanQueryExpander(DualProteinQueryExpander):
             "pH": ["pH", "isoelectric point", "pI", "acidification"],
         }
         self.reverse_index = self._build_reverse_index()
+        self.term_matcher = TermMatcher(self.reverse_index)
 
 
 # 使用示例
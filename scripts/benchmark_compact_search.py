@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Benchmark concurrent FAISS search latency for compact releases (p50/p99 per client count)."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import faiss
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from services.compact_index import SearchBatcher, read_release_index  # noqa: E402
+
+CLIENT_COUNTS = (1, 2, 4, 8, 16, 32)
+
+
+def load_index(args: argparse.Namespace) -> faiss.Index:
+    if args.release:
+        return read_release_index(Path(args.release) / "vectors.faiss")
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((args.vectors, args.dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(args.dimension))
+    index.add_with_ids(vectors, np.arange(args.vectors, dtype="int64"))
+    return index
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return float(np.percentile(np.asarray(samples), q)) if samples else 0.0
+
+
+def run_clients(search: Callable[[np.ndarray], object], queries: np.ndarray, clients: int, per_client: int) -> Dict:
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(slot: int) -> None:
+        barrier.wait()
+        for step in range(per_client):
+            row = queries[(slot * per_client + step) % len(queries)][None, :]
+            started = time.perf_counter()
+            search(row)
+            latencies[slot].append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    samples = [value for values in latencies for value in values]
+    return {
+        "clients": clients,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "qps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--release", help="compact release 目录；缺省时使用随机合成索引")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dimension", type=int, default=512)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50, help="每个客户端的请求数")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="合并批处理窗口")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    index = load_index(args)
+    rng = np.random.default_rng(11)
+    queries = rng.standard_normal((1024, index.d)).astype("float32")
+    faiss.normalize_L2(queries)
+
+    lock = threading.Lock()
+
+    def locked(row: np.ndarray):
+        with lock:
+            return index.search(row, args.top_k)
+
+    batcher = SearchBatcher(index, args.window_ms)
+    modes = {
+        "global_lock": locked,
+        "parallel": lambda row: index.search(row, args.top_k),
+        "batched": lambda row: batcher.search(row, args.top_k),
+    }
+    report = {"ntotal": int(index.ntotal), "dimension": int(index.d), "top_k": args.top_k, "modes": {}}
+    try:
+        for name, search in modes.items():
+            search(queries[:1])
+            report["modes"][name] = [
+                run_clients(search, queries, clients, args.requests) for clients in CLIENT_COUNTS
+            ]
+    finally:
+        batcher.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"ntotal={report['ntotal']} dim={report['dimension']} top_k={args.top_k}")
+    print(f"{'mode':<12} {'clients':>7} {'p50_ms':>9} {'p99_ms':>9} {'qps':>9}")
+    for name, rows in report["modes"].items():
+        for row in rows:
+            print(f"{name:<12} {row['clients']:>7} {row['p50_ms']:>9} {row['p99_ms']:>9} {row['qps']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
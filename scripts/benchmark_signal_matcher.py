@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-term substring scans vs the compiled SignalMatcher for query-signal scoring."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from services import signal_matcher  # noqa: E402
+from services.query_processor import QueryProcessor  # noqa: E402
+from services.signal_matcher import SignalMatcher  # noqa: E402
+
+VOCABULARY = (
+    "soy protein isolate spi quinoa chenopodium pectin chitosan gum arabic alginate carrageenan emulsion gel "
+    "complex coacervation electrostatic interaction ph ionic strength stability digestion delivery encapsulation "
+    "polysaccharide whey casein zein hydrophobic hydrogen bond rheology viscosity particle size zeta potential "
+    "大豆蛋白 藜麦蛋白 多糖 复合凝聚 乳液 凝胶 界面 稳定性 消化 递送 静电 相互作用 结构 热处理"
+).split()
+
+
+def synthetic_signals(term_count: int, concept_count: int, rng: random.Random) -> Dict:
+    terms = sorted({" ".join(rng.sample(VOCABULARY, rng.choice((1, 1, 2)))) for _ in range(term_count * 2)})[:term_count]
+    aliases = {terms[i]: sorted(rng.sample(terms, 3) + [terms[i]]) for i in range(min(concept_count, len(terms)))}
+    return {"terms": terms, "concept_aliases": aliases}
+
+
+def synthetic_texts(count: int, words: int, rng: random.Random) -> List[str]:
+    filler = "the of and was were samples measured results significantly observed".split()
+    return [" ".join(rng.choice(VOCABULARY + filler * 3) for _ in range(words)).lower() for _ in range(count)]
+
+
+def timed(score: Callable[[str], object], texts: List[str], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for text in texts:
+            score(text)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, default=60)
+    parser.add_argument("--concepts", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    processor = QueryProcessor(query_expander=None)
+    signals = synthetic_signals(args.terms, args.concepts, rng)
+    started = time.perf_counter()
+    compiled = {**signals, "matcher": SignalMatcher(signals["terms"], signals["concept_aliases"])}
+    build_ms = (time.perf_counter() - started) * 1000
+
+    workloads = {
+        "chunks_400": synthetic_texts(400, 180, rng),
+        "metadata_5000": synthetic_texts(5000, 24, rng),
+    }
+    report = {"backend": "aho-corasick" if signal_matcher.ahocorasick is not None else "trie-regex",
+              "terms": len(signals["terms"]), "concepts": len(signals["concept_aliases"]),
+              "matcher_build_ms": round(build_ms, 3)}
+    for name, texts in workloads.items():
+        legacy = [processor.reference_overlap_score(text, signals) for text in texts]
+        assert legacy == [processor.reference_overlap_score(text, compiled) for text in texts]
+        substring_ms = timed(lambda text: processor.reference_overlap_score(text, signals), texts, args.repeats)
+        matcher_ms = timed(lambda text: processor.reference_overlap_score(text, compiled), texts, args.repeats)
+        report[name] = {
+            "substring_ms": round(substring_ms, 3),
+            "matcher_ms": round(matcher_ms, 3),
+            "speedup": round(substring_ms / matcher_ms, 2) if matcher_ms else None,
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -17,6 +17,7 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from metadata_storage import load_metadata_file  # noqa: E402
 from services.citation_catalog import (  # noqa: E402
     build_catalog,
     compact_crossref_message,
@@ -87,8 +88,7 @@ def main() -> int:
     args = parser.parse_args()
     raw_catalogs = {}
     for domain in DOMAINS:
-        source = args.source_root / domain / "metadata.json"
-        raw_catalogs[domain] = json.loads(source.read_text(encoding="utf-8"))
+        raw_catalogs[domain] = load_metadata_file(args.source_root / domain / "metadata.json")
     cache = load_crossref_cache(args.crossref_cache)
     if args.enrich_crossref:
         cache = enrich_cache(
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Build a compact FAISS + SQLite release straight from a paper directory.
+
+Extraction, splitting and embedding run as a streaming pipeline (services/release_builder.py);
+rerun with the same ``--version`` to resume an interrupted build.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import config  # noqa: E402
+from scripts.maintenance.convert_proteoglycan_compact import add_release_arguments, finish_release  # noqa: E402
+from services.embedding_cache import model_fingerprint  # noqa: E402
+from services.metadata_extraction import update_build_status  # noqa: E402
+from services.release_builder import ReleaseBuilder  # noqa: E402
+
+
+def _embedder(data_dir: Path, index_root: Path, use_cache: bool):
+    from llama_index.core import Settings
+
+    from persistent_storage import PersistentRAGSystem
+
+    system = PersistentRAGSystem(data_dir=str(data_dir), persist_dir=str(index_root), allow_auto_build=False)
+    system._configure_models()
+    embed_fn = system.embed_texts if use_cache else Settings.embed_model.get_text_embedding_batch
+    return system, embed_fn, model_fingerprint(system.embedding_dim)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", type=Path, required=True, help="Paper directory to index")
+    parser.add_argument("--index-root", type=Path, default=ROOT / "storage_proteoglycan")
+    parser.add_argument("--version", default=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+                        help="Release name; reuse it to resume an interrupted build")
+    parser.add_argument("--workers", type=int, default=config.RELEASE_BUILD_WORKERS)
+    parser.add_argument("--embed-batch-size", type=int, default=config.RELEASE_EMBED_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=config.RELEASE_BUILD_QUEUE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=2000, help="Row batch for the lexical index")
+    add_release_arguments(parser)
+    args = parser.parse_args()
+
+    data_dir = args.data_dir.resolve()
+    index_root = args.index_root.resolve()
+    if not data_dir.is_dir():
+        parser.error(f"data directory does not exist: {data_dir}")
+    compact_root = index_root / "compact"
+    release = compact_root / "releases" / args.version
+    if (release / "manifest.json").is_file():
+        parser.error(f"release already finished: {release}")
+
+    system, embed_fn, signature = _embedder(data_dir, index_root, args.embedding_cache)
+    files = system._iter_supported_files()
+    builder = ReleaseBuilder(
+        release,
+        embed_fn,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        queue_size=args.queue_size,
+        embed_signature=signature,
+    )
+
+    def progress(stats):
+        print(f"[build] files={stats['files_done']}/{stats['files_total']} chunks={stats['chunks']}", flush=True)
+        update_build_status(str(index_root), phase="release_build", release=release.name, **stats)
+
+    stats = builder.run(files, progress)
+    if stats["skipped_files"]:
+        print(f"[build] skipped {len(stats['skipped_files'])} unreadable files", flush=True)
+    vector_count, dimension = builder.write_flat_index()
+    verified = finish_release(compact_root, release, args, {
+        "dimension": dimension,
+        "vector_count": vector_count,
+        "vectors_seen": vector_count,
+        "orphan_vector_count": 0,
+        "chunk_count": stats["chunks"],
+        "source": str(data_dir),
+        "skipped_files_count": len(stats["skipped_files"]),
+    })
+    builder.discard_staging()
+    update_build_status(str(index_root), phase="release_ready", release=release.name,
+                        vector_count=verified["vector_count"], documents_count=verified["documents_count"])
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Fold compact delta segments into a new base release (one-shot or as a background loop)."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services.compact_index import active_deltas, resolve_current_release  # noqa: E402
+from services.compact_segments import compact_segments  # noqa: E402
+
+
+def pending_deltas(index_root: Path) -> int:
+    release = resolve_current_release(index_root)
+    if release is None:
+        return 0
+    manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+    return len(active_deltas(index_root, manifest))
+
+
+def run_once(index_root: Path, min_deltas: int, activate: bool) -> int:
+    pending = pending_deltas(index_root)
+    if pending < max(1, min_deltas):
+        print(f"[compact] pending deltas={pending}, nothing to do", flush=True)
+        return 0
+    release = compact_segments(index_root, activate=activate)
+    if release is not None:
+        print(f"[compact] folded {pending} deltas into releases/{release.name}", flush=True)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--index-root", type=Path, default=ROOT / "storage_proteoglycan")
+    parser.add_argument("--min-deltas", type=int, default=1, help="Compact only once this many deltas exist")
+    parser.add_argument("--interval", type=float, default=0, help="Seconds between checks; 0 = run once")
+    parser.add_argument("--no-activate", action="store_true")
+    args = parser.parse_args()
+
+    index_root = args.index_root.resolve()
+    if args.interval <= 0:
+        return run_once(index_root, args.min_deltas, not args.no_activate)
+    while True:
+        try:
+            run_once(index_root, args.min_deltas, not args.no_activate)
+        except Exception as exc:
+            print(f"[compact] failed: {type(exc).__name__}: {exc}", flush=True)
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
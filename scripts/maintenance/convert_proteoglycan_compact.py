@@ -4,9 +4,7 @@
 from __future__ import annotations
 
 import argparse
-import hashlib
 import json
-import os
 import sqlite3
 import sys
 from datetime import datetime, timezone
@@ -17,33 +15,38 @@ import faiss
 import ijson
 import numpy as np
 
-
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from services.compact_index import INDEX_FORMAT, verify_release  # noqa: E402
-
-
-SCHEMA = """
-CREATE TABLE IF NOT EXISTS chunks (
-    vector_id INTEGER UNIQUE,
-    chunk_id TEXT PRIMARY KEY,
-    document_id TEXT,
-    file_path TEXT NOT NULL,
-    filename TEXT NOT NULL,
-    page INTEGER,
-    text TEXT NOT NULL,
-    metadata_json TEXT NOT NULL
-);
-CREATE INDEX IF NOT EXISTS idx_chunks_vector_id ON chunks(vector_id);
-CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id);
-CREATE INDEX IF NOT EXISTS idx_chunks_file_path ON chunks(file_path);
-CREATE TABLE IF NOT EXISTS build_state (
-    key TEXT PRIMARY KEY,
-    value TEXT NOT NULL
-);
-"""
+from knowledge_paths import get_runtime_metadata_path  # noqa: E402
+from metadata_storage import MetadataStorage  # noqa: E402
+from services.compact_index import (  # noqa: E402
+    CHUNKS_SCHEMA,
+    INDEX_FORMAT,
+    activate_release,
+    verify_release,
+    write_checksums,
+)
+from services.document_features import (  # noqa: E402
+    DOCUMENT_FEATURES_VERSION,
+    build_document_features,
+    storage_lookup,
+)
+from services.embedding_cache import model_fingerprint, seed_from_legacy_store, shared_embedding_cache  # noqa: E402
+from services.lexical_index import LEXICAL_INDEX_VERSION, build_lexical_index  # noqa: E402
+from sweetseek.ann_index import (  # noqa: E402
+    DEFAULT_EF_SEARCH,
+    DEFAULT_HNSW_M,
+    DEFAULT_NPROBE,
+    DEFAULT_RERANK_FACTOR,
+    INDEX_TYPES,
+    QUANTIZERS,
+    approximate_from_flat,
+    load_recall_questions,
+)
+
+SCHEMA = CHUNKS_SCHEMA
 
 
 def _unwrap(value: Any) -> Dict[str, Any]:
@@ -195,20 +198,120 @@ def import_vectors(
     return int(index.ntotal), int(index.d), seen, missing
 
 
-def write_checksums(release: Path) -> None:
-    lines = []
-    for filename in ("vectors.faiss", "chunks.sqlite", "manifest.json"):
-        digest = hashlib.sha256((release / filename).read_bytes()).hexdigest()
-        lines.append(f"{digest}  {filename}")
-    (release / "checksums.sha256").write_text("\n".join(lines) + "\n", encoding="utf-8")
+def recall_query_vectors(path: Path | None) -> np.ndarray | None:
+    """Embed real evaluation questions for the recall report (None = held-out index vectors)."""
+    if path is None:
+        return None
+    from llama_index.core import Settings
+
+    from persistent_storage import PersistentRAGSystem, embed_query_batch
+
+    PersistentRAGSystem()._configure_models()
+    return np.asarray(embed_query_batch(Settings.embed_model, load_recall_questions(path)), dtype="float32")
+
+
+def build_approximate_index(faiss_path: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """Replace the exact flat index with a trained ANN/quantized index and report recall@k against it.
+
+    Quantized indexes keep the float32 vectors beside them as .npy files so that
+    candidates can be re-ranked exactly through a memmap at query time.
+    """
+    if args.index_type == "flat" and args.quantizer == "none":
+        return {"index_type": "flat"}
+    params = approximate_from_flat(
+        faiss_path,
+        args.index_type,
+        quantizer=args.quantizer,
+        rerank_factor=args.rerank_factor,
+        recall_k=args.recall_k,
+        recall_queries=args.recall_queries,
+        query_vectors=recall_query_vectors(args.recall_questions),
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        hnsw_m=args.hnsw_m,
+        ef_search=args.ef_search,
+        pq_m=args.pq_m,
+    )
+    report = params["recall_report"]
+    print(
+        f"[ann] {params['index_type']}/{params.get('quantizer', 'none')} recall@{report['k']}={report['recall']:.4f} "
+        f"over {report['queries']} {report['query_source']} queries",
+        flush=True,
+    )
+    return params
 
 
-def activate_release(compact_root: Path, release: Path) -> None:
-    current = compact_root / "current"
-    temporary = compact_root / ".current.next"
-    temporary.unlink(missing_ok=True)
-    temporary.symlink_to(Path("releases") / release.name)
-    os.replace(temporary, current)
+def finish_release(
+    compact_root: Path,
+    release: Path,
+    args: argparse.Namespace,
+    manifest_fields: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Build lexical/document tables and the ANN index, then write manifest + checksums and verify."""
+    database_path = release / "chunks.sqlite"
+    connection = sqlite3.connect(database_path)
+    try:
+        documents_count = int(
+            connection.execute("SELECT COUNT(DISTINCT file_path) FROM chunks").fetchone()[0]
+        )
+        if args.lexical:
+            lexical_rows = build_lexical_index(connection, max(1, args.batch_size))
+            print(f"[lexical] indexed={lexical_rows}", flush=True)
+        metadata_lookup = storage_lookup(MetadataStorage(str(args.metadata))) if args.metadata.is_file() else None
+        feature_rows = build_document_features(connection, metadata_lookup)
+        print(f"[documents] features={feature_rows}", flush=True)
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+    for sidecar in (database_path.with_name(database_path.name + "-wal"), database_path.with_name(database_path.name + "-shm")):
+        sidecar.unlink(missing_ok=True)
+    index_params = build_approximate_index(release / "vectors.faiss", args)
+
+    manifest = {
+        "index_format": INDEX_FORMAT,
+        "version": release.name,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **manifest_fields,
+        "documents_count": documents_count,
+        **({"lexical_index": LEXICAL_INDEX_VERSION} if args.lexical else {}),
+        "document_features": DOCUMENT_FEATURES_VERSION,
+        **index_params,
+    }
+    (release / "manifest.json").write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+    write_checksums(release)
+    verified = verify_release(release)
+    print(json.dumps(verified, ensure_ascii=False, indent=2), flush=True)
+    if args.activate:
+        activate_release(compact_root, release)
+        print(f"activated: {compact_root / 'current'} -> releases/{release.name}")
+    return verified
+
+
+def add_release_arguments(parser: argparse.ArgumentParser) -> None:
+    """Release options shared with build_compact_release.py (ANN/quantizer, lexical, features)."""
+    parser.add_argument("--activate", action="store_true")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--quantizer", choices=QUANTIZERS, default="none",
+                        help="Encode vectors as SQ8/PQ and re-rank candidates from float32 side files")
+    parser.add_argument("--rerank-factor", type=int, default=DEFAULT_RERANK_FACTOR)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF clusters; 0 = 4*sqrt(N)")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument("--pq-m", type=int, default=0, help="IVFPQ sub-quantizers; 0 = auto")
+    parser.add_argument("--no-lexical", dest="lexical", action="store_false",
+                        help="Skip the FTS5 lexical index (chunks_fts)")
+    parser.add_argument("--metadata", type=Path, default=get_runtime_metadata_path("proteoglycan"),
+                        help="Paper metadata used for the per-document features table")
+    parser.add_argument("--recall-k", type=int, default=10)
+    parser.add_argument("--recall-queries", type=int, default=1000,
+                        help="Held-out index vectors sampled for recall@k when --recall-questions is not given")
+    parser.add_argument("--recall-questions", type=Path, default=None,
+                        help="Real questions (text, one per line, or evaluation/questions JSON) embedded for recall@k")
+    parser.add_argument("--no-embedding-cache", dest="embedding_cache", action="store_false",
+                        help="Neither read nor seed the persistent chunk embedding cache (EMBED_CACHE_PATH)")
 
 
 def main() -> int:
@@ -217,7 +320,7 @@ def main() -> int:
     parser.add_argument("--index-root", type=Path, default=ROOT / "storage_proteoglycan")
     parser.add_argument("--version", default=datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
     parser.add_argument("--batch-size", type=int, default=2000)
-    parser.add_argument("--activate", action="store_true")
+    add_release_arguments(parser)
     args = parser.parse_args()
 
     source = args.source.resolve()
@@ -238,36 +341,21 @@ def main() -> int:
         vector_count, dimension, vectors_seen, orphan_vector_count = import_vectors(
             connection, vector_path, release / "vectors.faiss", max(1, args.batch_size)
         )
-        documents_count = int(
-            connection.execute("SELECT COUNT(DISTINCT file_path) FROM chunks").fetchone()[0]
-        )
-        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     finally:
         connection.close()
-    for sidecar in (database_path.with_name(database_path.name + "-wal"), database_path.with_name(database_path.name + "-shm")):
-        sidecar.unlink(missing_ok=True)
-
-    manifest = {
-        "index_format": INDEX_FORMAT,
-        "version": args.version,
-        "created_at": datetime.now(timezone.utc).isoformat(),
+    cache = shared_embedding_cache() if args.embedding_cache else None
+    if cache is not None:
+        seeded = seed_from_legacy_store(cache, docstore_path, vector_path, model_fingerprint(dimension),
+                                        max(1, args.batch_size))
+        print(f"[embedding-cache] seeded={seeded}", flush=True)
+    finish_release(compact_root, release, args, {
         "dimension": dimension,
         "vector_count": vector_count,
         "vectors_seen": vectors_seen,
         "orphan_vector_count": orphan_vector_count,
         "chunk_count": chunk_count,
-        "documents_count": documents_count,
         "source": str(source),
-    }
-    (release / "manifest.json").write_text(
-        json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
-    )
-    write_checksums(release)
-    verified = verify_release(release)
-    print(json.dumps(verified, ensure_ascii=False, indent=2), flush=True)
-    if args.activate:
-        activate_release(compact_root, release)
-        print(f"activated: {compact_root / 'current'} -> releases/{release.name}")
+    })
     return 0
 
 
@@ -5,9 +5,7 @@ from __future__ import annotations
 
 import argparse
 import json
-import os
 import sys
-import tempfile
 import time
 from pathlib import Path
 from typing import Any, Dict
@@ -19,6 +17,7 @@ sys.path.insert(0, str(ROOT))
 
 from path_utils import normalize_for_storage  # noqa: E402
 from knowledge_paths import get_domain_paths  # noqa: E402
+from metadata_storage import MetadataStorage  # noqa: E402
 from pdf_metadata_extractor import PDFMetadataExtractor  # noqa: E402
 from services.encapsulation_metadata import fetch_crossref_metadata, merge_metadata  # noqa: E402
 
@@ -40,21 +39,6 @@ def merge_local(existing: Dict[str, Any], extracted: Dict[str, Any], filename: s
     return merged
 
 
-def atomic_write(path: Path, data: Dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    fd, temp_path = tempfile.mkstemp(prefix=path.name, dir=path.parent)
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as handle:
-            json.dump(data, handle, ensure_ascii=False, indent=2)
-            handle.flush()
-            os.fsync(handle.fileno())
-        os.replace(temp_path, path)
-    except Exception:
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
-        raise
-
-
 def main() -> int:
     paths = get_domain_paths("encapsulation")
     parser = argparse.ArgumentParser()
@@ -68,7 +52,8 @@ def main() -> int:
 
     papers_dir = Path(args.papers).resolve()
     metadata_path = Path(args.metadata).resolve()
-    current = json.loads(metadata_path.read_text(encoding="utf-8")) if metadata_path.exists() else {}
+    storage = MetadataStorage(str(metadata_path))
+    current = storage.get_all_metadata()
     pdfs = sorted(papers_dir.rglob("*.pdf"))
     if args.only_missing_crossref:
         pdfs = [
@@ -80,7 +65,7 @@ def main() -> int:
 
     extractor = PDFMetadataExtractor()
     session = requests.Session()
-    enriched: Dict[str, Any] = dict(current)
+    enriched: Dict[str, Any] = {}
     crossref_hits = 0
     failures = 0
 
@@ -107,10 +92,9 @@ def main() -> int:
             print(f"[{index}/{len(pdfs)}] FAILED {pdf_path.name}: {exc}")
 
     if not args.dry_run:
-        backup_path = metadata_path.with_suffix(".json.pre-v2.bak")
-        if metadata_path.exists() and not backup_path.exists():
-            backup_path.write_bytes(metadata_path.read_bytes())
-        atomic_write(metadata_path, enriched)
+        # 只写本次处理过的条目，一次事务；其余元数据保持不变
+        storage.save_many(enriched)
+    storage.close()
 
     print(json.dumps({
         "processed": len(pdfs),
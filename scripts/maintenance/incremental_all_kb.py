@@ -18,8 +18,8 @@ from llama_index.core import SimpleDirectoryReader
 
 from config import config
 from metadata_storage import MetadataStorage
-from pdf_metadata_extractor import PDFMetadataExtractor
 from persistent_storage import PersistentRAGSystem, rag_system
+from services.metadata_extraction import ExtractionCache, extract_metadata_batch, update_build_status
 from knowledge_paths import get_domain_paths
 from path_utils import normalize_for_storage
 
@@ -55,22 +55,24 @@ def _save_tracking(path: str, values: Set[str]) -> None:
         json.dump(sorted(values), f, ensure_ascii=False, indent=2)
 
 
-def _extract_pdf_metadata_for_files(files: List[str], storage: MetadataStorage) -> int:
-    extractor = PDFMetadataExtractor()
-    count = 0
-    for file_path in files:
-        if not file_path.lower().endswith(".pdf"):
-            continue
-        try:
-            if storage.has_metadata(file_path):
-                continue
-            meta = extractor.extract_metadata(file_path)
-            storage.save_metadata(file_path, meta)
-            count += 1
-        except Exception:
-            # Keep incremental process resilient.
-            continue
-    return count
+def _extract_pdf_metadata_for_files(files: List[str], storage: MetadataStorage, index_dir: str) -> int:
+    pending = [path for path in files if path.lower().endswith(".pdf") and not storage.has_metadata(path)]
+    if not pending:
+        return 0
+
+    def report(done: int, total: int, cached: int) -> None:
+        update_build_status(index_dir, state="extracting_metadata", metadata_total=total,
+                            metadata_extracted=done, metadata_cached=cached)
+
+    cache = ExtractionCache(str(config.METADATA_EXTRACT_CACHE_PATH))
+    try:
+        extracted = extract_metadata_batch(pending, config.METADATA_EXTRACT_WORKERS, cache, report)
+    except Exception:
+        # Keep incremental process resilient.
+        return 0
+    finally:
+        cache.close()
+    return storage.save_many(extracted)
 
 
 def run_sweetness_incremental() -> Dict[str, int]:
@@ -89,7 +91,7 @@ def run_sweetness_incremental() -> Dict[str, int]:
             raise RuntimeError(f"Sweetness index is not ready: {rag_system.last_error}")
 
     metadata_storage = MetadataStorage(storage_path=str(config.METADATA_PATH))
-    new_meta = _extract_pdf_metadata_for_files(new_files, metadata_storage)
+    new_meta = _extract_pdf_metadata_for_files(new_files, metadata_storage, str(config.PERSIST_DIR))
 
     docs = SimpleDirectoryReader(input_files=new_files).load_data()
     ok = rag_system.add_documents(docs)
@@ -117,7 +119,7 @@ def run_dual_incremental() -> Dict[str, int]:
             raise RuntimeError(f"Dual-protein index is not ready: {dual_rag.last_error}")
 
     metadata_storage = MetadataStorage(storage_path=str(paths.metadata))
-    new_meta = _extract_pdf_metadata_for_files(new_files, metadata_storage) if new_files else 0
+    new_meta = _extract_pdf_metadata_for_files(new_files, metadata_storage, persist_dir) if new_files else 0
 
     new_docs = 0
     if new_files:
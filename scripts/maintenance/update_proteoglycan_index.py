@@ -19,6 +19,7 @@ from llama_index.core import SimpleDirectoryReader  # noqa: E402
 
 from persistent_storage import PersistentRAGSystem  # noqa: E402
 from knowledge_paths import get_domain_paths  # noqa: E402
+from metadata_storage import MetadataStorage  # noqa: E402
 from path_utils import normalize_for_storage, to_absolute  # noqa: E402
 from pdf_metadata_extractor import PDFMetadataExtractor  # noqa: E402
 
@@ -50,29 +51,33 @@ def write_json_atomic(path: Path, payload: object) -> None:
 
 
 def extract_missing_metadata(all_pdfs: list[str], metadata_path: Path) -> int:
+    storage = MetadataStorage(str(metadata_path))
     try:
-        metadata = json.loads(metadata_path.read_text(encoding="utf-8")) if metadata_path.is_file() else {}
-    except (OSError, json.JSONDecodeError):
-        metadata = {}
-    extractor = PDFMetadataExtractor()
-    created = 0
-    for position, relative_path in enumerate(all_pdfs, 1):
-        existing = metadata.get(relative_path, {})
-        if existing and existing.get("file_path"):
-            continue
-        absolute_path = Path(to_absolute(relative_path))
-        extracted = extractor.extract_metadata(str(absolute_path))
-        extracted["filename"] = absolute_path.name
-        extracted["file_path"] = relative_path
-        extracted["source"] = "proteoglycan_local_pdf"
-        metadata[relative_path] = extracted
-        created += 1
-        if position % 50 == 0:
-            write_json_atomic(metadata_path, metadata)
-            print(f"[{position}/{len(all_pdfs)}] metadata extracted")
-    write_json_atomic(metadata_path, metadata)
-    print(json.dumps({"metadata_entries": len(metadata), "metadata_created": created}, ensure_ascii=False))
-    return len(metadata)
+        metadata = storage.get_all_metadata()
+        extractor = PDFMetadataExtractor()
+        pending: list[tuple[str, dict]] = []
+        created = 0
+        for position, relative_path in enumerate(all_pdfs, 1):
+            existing = metadata.get(relative_path, {})
+            if existing and existing.get("file_path"):
+                continue
+            absolute_path = Path(to_absolute(relative_path))
+            extracted = extractor.extract_metadata(str(absolute_path))
+            extracted["filename"] = absolute_path.name
+            extracted["file_path"] = relative_path
+            extracted["source"] = "proteoglycan_local_pdf"
+            pending.append((relative_path, extracted))
+            created += 1
+            if position % 50 == 0:
+                storage.save_many(pending)
+                pending.clear()
+                print(f"[{position}/{len(all_pdfs)}] metadata extracted")
+        storage.save_many(pending)
+        entries = len(storage.get_all_metadata())
+    finally:
+        storage.close()
+    print(json.dumps({"metadata_entries": entries, "metadata_created": created}, ensure_ascii=False))
+    return entries
 
 
 def gunicorn_running(project_root: Path) -> bool:
@@ -5,7 +5,6 @@ from __future__ import annotations
 
 import argparse
 import fcntl
-import hashlib
 import json
 import os
 import platform
@@ -15,7 +14,7 @@ import sqlite3
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import faiss
 import ijson
@@ -25,6 +24,17 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from knowledge_paths import get_domain_paths  # noqa: E402
+from metadata_storage import load_metadata_file  # noqa: E402
+from services.embedding_cache import model_fingerprint, seed_from_legacy_store, shared_embedding_cache  # noqa: E402
+from sweetseek.ann_index import (  # noqa: E402
+    DEFAULT_EF_SEARCH,
+    DEFAULT_HNSW_M,
+    DEFAULT_NPROBE,
+    DEFAULT_RERANK_FACTOR,
+    INDEX_TYPES,
+    QUANTIZERS,
+    approximate_from_flat,
+)
 from sweetseek.metadata_db import MetadataDB  # noqa: E402
 
 
@@ -95,12 +105,6 @@ def iter_embeddings(vector_store: Path) -> Iterator[Tuple[str, List[float]]]:
         yield from ijson.kvitems(handle, "embedding_dict")
 
 
-def model_fingerprint(dimension: int) -> str:
-    value = ":".join((os.getenv("EMBED_MODEL_SOURCE", "modelscope"),
-                      os.getenv("EMBED_MODEL_NAME", "BAAI/bge-small-zh-v1.5"), str(dimension)))
-    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
-
-
 def _status_path(index_dir: Path) -> Path:
     return index_dir / "build_status.json"
 
@@ -162,7 +166,9 @@ def verify_domain(domain: str) -> Dict[str, Any]:
     return {"domain": domain, "index_format": "faiss_sqlite", **result}
 
 
-def migrate_json(domain: str, batch_size: int, resume: bool, max_rss_gb: float) -> Dict[str, Any]:
+def migrate_json(domain: str, batch_size: int, resume: bool, max_rss_gb: float,
+                 seed_cache: bool = True, ann: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """流式迁移 legacy JSON 索引；ann 为 approximate_from_flat 的参数，给定时把 flat 索引换成 ANN/量化索引。"""
     paths = get_domain_paths(domain)
     index_dir = paths.index
     vector_store = index_dir / "default__vector_store.json"
@@ -239,6 +245,18 @@ def migrate_json(domain: str, batch_size: int, resume: bool, max_rss_gb: float)
             faiss.write_index(faiss_index, str(faiss_path))
         if faiss_index is None:
             raise RuntimeError("源索引没有可迁移向量")
+        cache = shared_embedding_cache() if seed_cache else None
+        if cache is not None:
+            _save_status(index_dir, state="seeding_embedding_cache", completed_vectors=completed)
+            seeded = seed_from_legacy_store(cache, docstore, vector_store,
+                                            model_fingerprint(int(faiss_index.d)), max(1, batch_size) * 100)
+            _save_status(index_dir, embedding_cache_seeded=seeded)
+
+        ann_params: Dict[str, Any] = {"index_type": "flat"}
+        if ann and isinstance(faiss_index, faiss.IndexFlat):
+            _save_status(index_dir, state="building_ann", completed_vectors=completed)
+            # hybrid 索引按行号对应 index.ids.txt，ANN 索引同样不带 IDMap
+            ann_params = approximate_from_flat(faiss_path, keep_ids=False, **ann)
 
         manifest = {
             "schema_version": 1, "domain": domain, "index_format": "faiss_sqlite",
@@ -250,6 +268,7 @@ def migrate_json(domain: str, batch_size: int, resume: bool, max_rss_gb: float)
             }),
             "chunk_count": int(faiss_index.ntotal), "created_at": utc_now(),
             "source_format": "legacy_json",
+            **ann_params,
         }
         write_json(stage / "manifest.json", manifest)
         verify_paths(stage)
@@ -275,7 +294,8 @@ def diagnose_domain(domain: str) -> Dict[str, Any]:
     paths = get_domain_paths(domain)
     pdfs = list(paths.papers.rglob("*.pdf")) if paths.papers.exists() else []
     try:
-        metadata = json.loads(paths.metadata.read_text(encoding="utf-8")) if paths.metadata.is_file() else {}
+        has_catalog = paths.metadata.is_file() or paths.metadata.with_suffix(".sqlite").is_file()
+        metadata = load_metadata_file(paths.metadata) if has_catalog else {}
     except Exception as exc:
         metadata, metadata_error = {}, f"{type(exc).__name__}: {exc}"
     else:
@@ -296,6 +316,21 @@ def show_status(domain: str) -> Dict[str, Any]:
     return _read_status(paths.index) or {"domain": domain, "state": "idle", "index_format": index_format(paths.index)}
 
 
+def ann_options(args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    if args.index_type == "flat" and args.quantizer == "none":
+        return None
+    options: Dict[str, Any] = {
+        "index_type": args.index_type, "quantizer": args.quantizer, "rerank_factor": args.rerank_factor,
+        "nlist": args.nlist, "nprobe": args.nprobe, "ef_search": args.ef_search, "hnsw_m": args.hnsw_m,
+        "pq_m": args.pq_m, "recall_k": args.recall_k, "recall_queries": args.recall_queries,
+    }
+    if args.recall_questions is not None:
+        from scripts.maintenance.convert_proteoglycan_compact import recall_query_vectors
+
+        options["query_vectors"] = recall_query_vectors(args.recall_questions)
+    return options
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description=__doc__)
     sub = parser.add_subparsers(dest="command", required=True)
@@ -307,6 +342,22 @@ def main() -> int:
         command.add_argument("--domain", choices=(*DOMAINS, "all"), default="all")
         command.add_argument("--batch-size", type=int, default=5)
         command.add_argument("--max-rss-gb", type=float, default=DEFAULT_MAX_RSS_GB)
+        command.add_argument("--no-embedding-cache", dest="embedding_cache", action="store_false",
+                             help="迁移时不用源向量预热持久化嵌入缓存")
+        command.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+        command.add_argument("--quantizer", choices=QUANTIZERS, default="none",
+                             help="SQ8/PQ 编码向量，检索时从 float32 旁路文件精确重排")
+        command.add_argument("--rerank-factor", type=int, default=DEFAULT_RERANK_FACTOR)
+        command.add_argument("--nlist", type=int, default=0, help="IVF 簇数；0 = 4*sqrt(N)")
+        command.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+        command.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH)
+        command.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+        command.add_argument("--pq-m", type=int, default=0, help="IVFPQ 子量化器数；0 = 自动")
+        command.add_argument("--recall-k", type=int, default=10)
+        command.add_argument("--recall-queries", type=int, default=1000,
+                             help="未给 --recall-questions 时抽样的留一法查询数")
+        command.add_argument("--recall-questions", type=Path, default=None,
+                             help="真实问题（每行一个，或 evaluation/questions JSON），嵌入后评估 recall@k")
     args = parser.parse_args()
     domains = DEFAULT_ORDER if args.domain == "all" else (args.domain,)
     results = []
@@ -315,7 +366,8 @@ def main() -> int:
             if args.command == "diagnose": results.append(diagnose_domain(domain))
             elif args.command == "status": results.append(show_status(domain))
             elif args.command == "verify": results.append(verify_domain(domain))
-            else: results.append(migrate_json(domain, args.batch_size, args.command == "resume", args.max_rss_gb))
+            else: results.append(migrate_json(domain, args.batch_size, args.command == "resume", args.max_rss_gb,
+                                              args.embedding_cache, ann_options(args)))
     except Exception as exc:
         if "domain" in locals():
             _save_status(get_domain_paths(domain).index, domain=domain, state="failed",
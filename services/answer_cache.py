@@ -0,0 +1,181 @@
+"""重复/近似问题的答案缓存：SQLite 持久化，TTL + 条数上限（按最近使用淘汰）。
+
+键的作用域为 (领域, 调用方式, 索引版本, Prompt 模板版本, 检索参数)，索引重建或模板改动后
+旧答案自然失效；作用域内先按归一化问题精确匹配，开启相似度阈值时再用问题向量找近似问题。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from config import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    cache_key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers(scope);
+CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used);
+"""
+_TRAILING_PUNCTUATION = re.compile(r"[\s?？。.!！,，;；:：~～]+$")
+
+
+def normalize_question(question: str) -> str:
+    """全角转半角、小写、合并空白并去掉句末标点。"""
+    text = unicodedata.normalize("NFKC", str(question or "")).lower()
+    return _TRAILING_PUNCTUATION.sub("", " ".join(text.split()))
+
+
+def answer_scope(domain: str, kind: str, index_version: str, template_version: str, **params: Any) -> str:
+    raw = json.dumps([domain, kind, index_version, template_version, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_key(scope: str, question: str) -> str:
+    return hashlib.sha256(f"{scope}\n{question}".encode("utf-8")).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+class AnswerCache:
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 86400.0, similarity: float = 0.0):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.similarity = float(similarity)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else float("-inf")
+
+    def get(self, scope: str, question: str, embedding: Optional[Sequence[float]] = None) -> Optional[Dict[str, Any]]:
+        """命中时返回写入时的 payload；``embedding`` 仅在开启近似匹配时使用。"""
+        normalized = normalize_question(question)
+        expired_before = self._expired_before()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT cache_key, payload FROM answers WHERE cache_key = ? AND created_at >= ?",
+                (_cache_key(scope, normalized), expired_before),
+            ).fetchone()
+            near = False
+            if row is None and self.similarity > 0 and embedding is not None:
+                row = self._nearest(scope, embedding, expired_before)
+                near = row is not None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE cache_key = ?", (time.time(), row[0])
+            )
+            self._connection.commit()
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+        return json.loads(row[1])
+
+    def _nearest(self, scope: str, embedding: Sequence[float], expired_before: float) -> Optional[tuple]:
+        query = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = float(np.linalg.norm(query))
+        if not norm:
+            return None
+        best, best_score = None, self.similarity
+        for cache_key, blob, payload in self._connection.execute(
+            "SELECT cache_key, embedding, payload FROM answers "
+            "WHERE scope = ? AND embedding IS NOT NULL AND created_at >= ?",
+            (scope, expired_before),
+        ):
+            vector = np.frombuffer(blob, dtype="float32")
+            if vector.shape != query.shape:
+                continue
+            score = float(vector @ query) / ((float(np.linalg.norm(vector)) * norm) or 1.0)
+            if score >= best_score:
+                best, best_score = (cache_key, payload), score
+        return best
+
+    def put(
+        self,
+        scope: str,
+        question: str,
+        payload: Dict[str, Any],
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        normalized = normalize_question(question)
+        blob = np.asarray(embedding, dtype="float32").reshape(-1).tobytes() if embedding is not None else None
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO answers(cache_key, scope, question, embedding, payload, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _cache_key(scope, normalized), scope, normalized, blob,
+                    json.dumps(payload, ensure_ascii=False, default=_json_default), now, now,
+                ),
+            )
+            self._connection.execute("DELETE FROM answers WHERE created_at < ?", (self._expired_before(),))
+            self._connection.execute(
+                "DELETE FROM answers WHERE cache_key IN ("
+                "SELECT cache_key FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = int(self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0])
+        return {"entries": entries, "hits": self.hits, "near_hits": self.near_hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED: Dict[tuple, AnswerCache] = {}
+
+
+def shared_answer_cache() -> Optional[AnswerCache]:
+    """按当前配置取进程内共享的缓存；ANSWER_CACHE_PATH 为空时关闭（返回 None）。"""
+    path = config.ANSWER_CACHE_PATH
+    if not path:
+        return None
+    key = (
+        str(Path(path).expanduser().resolve()),
+        config.ANSWER_CACHE_MAX_ENTRIES,
+        config.ANSWER_CACHE_TTL_SECONDS,
+        config.ANSWER_CACHE_SIMILARITY,
+    )
+    with _SHARED_LOCK:
+        cache = _SHARED.get(key)
+        if cache is None:
+            cache = _SHARED[key] = AnswerCache(*key)
+        return cache
@@ -0,0 +1,392 @@
+"""基于 ``httpx.AsyncClient`` 的 OpenAI 兼容流式客户端（DeepSeek）。
+
+进程内一个事件循环线程 + 一个连接池：并发的流式回答复用少量 keep-alive 连接，
+全局信号量限制同时进行的补全数，每个请求有整体截止时间（含排队等待）。
+同步接口 ``stream_chat``/``chat``/``structured_chat`` 与 ``DeepSeekLLMClient`` 一致，
+在 gevent worker 中只挂起当前 greenlet，不阻塞其它请求。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+
+from config import config
+from services.llm_client import ChatDelta, LLMClientError
+
+_DONE = object()
+
+
+def _native_thread_class():
+    """gevent monkey patch 后 threading.Thread 变成 greenlet，事件循环需要真正的系统线程。"""
+    try:
+        from gevent import monkey
+
+        if monkey.is_module_patched("threading"):
+            return monkey.get_original("threading", "Thread")
+    except ImportError:
+        pass
+    return threading.Thread
+
+
+def _wait(future):
+    """等待跨线程 future；gevent 下用 async watcher 唤醒当前 greenlet。"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+    if monkey is None or not monkey.is_module_patched("threading") or future.done():
+        return future.result()
+
+    import gevent
+    from gevent.event import Event
+
+    hub = gevent.get_hub()
+    watcher = hub.loop.async_()
+    finished = Event()
+    watcher.start(finished.set)
+    try:
+        future.add_done_callback(lambda _future: watcher.send())
+        finished.wait()
+    finally:
+        watcher.stop()
+        watcher.close()
+    return future.result()
+
+
+class _LoopThread:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = _native_thread_class()(target=self.loop.run_forever, name="llm-client-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine):
+        return _wait(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+
+class _SyncStream:
+    """在后台事件循环上逐个读取 ``astream_chat`` 的阻塞迭代器。
+
+    ``close()`` 可由其它线程调用：取消正在等待的读取，异步生成器随之关闭响应、释放并发名额。
+    """
+
+    def __init__(self, loop: _LoopThread, stream: AsyncIterator[ChatDelta]):
+        self._loop = loop
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def _step(self) -> ChatDelta:
+        self._task = asyncio.current_task()
+        return await self._stream.__anext__()
+
+    def __iter__(self) -> Iterator[ChatDelta]:
+        return self
+
+    def __next__(self) -> ChatDelta:
+        with self._lock:
+            if self._closed:
+                raise StopIteration
+            future = asyncio.run_coroutine_threadsafe(self._step(), self._loop.loop)
+        try:
+            return _wait(future)
+        except StopAsyncIteration:
+            raise StopIteration from None
+        except FutureCancelledError:
+            if self._closed:
+                raise StopIteration from None
+            raise
+
+    async def _aclose(self) -> None:
+        task = self._task
+        # Python 3.12 之前，取消恰逢 wait_for 内层刚完成时会被吞掉，任务仍会继续等下一行；重复取消直到结束
+        while task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait([task], timeout=0.1)
+        await self._stream.aclose()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._loop.run(self._aclose())
+
+
+_LOOP_LOCK = threading.Lock()
+_LOOP: Optional[_LoopThread] = None
+
+
+def _background_loop() -> _LoopThread:
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = _LoopThread()
+        return _LOOP
+
+
+class AsyncDeepSeekLLMClient:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model: str,
+        *,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        max_inflight: int = 16,
+        deadline_seconds: float = 180.0,
+        connect_timeout: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._model = model
+        self._base_url = base_url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {api_key}", "Accept": "text/event-stream"}
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._connect_timeout = connect_timeout
+        self._transport = transport
+        self.max_inflight = max(1, int(max_inflight))
+        self.deadline_seconds = float(deadline_seconds)
+        self.inflight = 0
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # 连接池与信号量绑定到首次使用它们的事件循环
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self._base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=httpx.Timeout(None, connect=self._connect_timeout),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+        return self._http
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, deadline: Optional[float]):
+        """占用一个并发名额，产出 ``(client, remaining)``；``remaining()`` 为截止前剩余秒数，超时抛 TimeoutError。
+
+        Python 3.10 的 ``asyncio.wait_for`` 超时抛 ``asyncio.TimeoutError``（3.11 起才是内置 TimeoutError 的别名），
+        调用方需同时捕获两者。
+
+        截止时间逐次施加在每个 await 上（而不是 asyncio.timeout），因为同步桥接时
+        流的每一步运行在不同的 task 中。
+        """
+        client = self._client()
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + (self.deadline_seconds if deadline is None else float(deadline))
+
+        def remaining() -> float:
+            left = expires - loop.time()
+            if left <= 0:
+                raise TimeoutError
+            return left
+
+        await asyncio.wait_for(self._semaphore.acquire(), remaining())
+        self.inflight += 1
+        try:
+            yield client, remaining
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+    async def astream_chat(
+        self,
+        messages: List[dict],
+        *,
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[ChatDelta]:
+        """``deadline`` 为本次请求的总秒数（排队 + 首字 + 流式输出），默认取客户端配置。"""
+        payload = {
+            "model": self._model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        try:
+            async with self._slot(deadline) as (client, remaining):
+                request = client.build_request("POST", "/chat/completions", json=payload)
+                response = await asyncio.wait_for(client.send(request, stream=True), remaining())
+                try:
+                    if response.status_code != 200:
+                        body = (await asyncio.wait_for(response.aread(), remaining())).decode("utf-8", "replace")
+                        raise LLMClientError(f"HTTP {response.status_code}: {body[:500]}")
+                    # [DONE] 之后仍读到流结束，完整读完的连接才会放回 keep-alive 池
+                    lines = response.aiter_lines()
+                    done = False
+                    while True:
+                        try:
+                            line = await asyncio.wait_for(lines.__anext__(), remaining())
+                        except StopAsyncIteration:
+                            break
+                        delta = None if done else self._parse_event(line)
+                        if delta is _DONE:
+                            done = True
+                        elif delta is not None:
+                            yield delta
+                finally:
+                    await response.aclose()
+        except (TimeoutError, asyncio.TimeoutError) as exc:
+            raise LLMClientError("LLM request exceeded its deadline") from exc
+        except httpx.HTTPError as exc:
+            raise LLMClientError(str(exc)) from exc
+
+    @staticmethod
+    def _parse_event(line: str):
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return _DONE
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return None
+        choices = chunk.get("choices") or []
+        if not choices:
+            return None
+        delta = choices[0].get("delta") or {}
+        content = delta.get("content") or ""
+        reasoning = delta.get("reasoning_content") or ""
+        if content or reasoning:
+            return ChatDelta(content=content, reasoning_content=reasoning)
+        return None
+
+    async def acomplete(self, payload: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """非流式补全，返回解析后的响应 JSON。"""
+        try:
+            async with self._slot(deadline) as (client, remaining):
+                response = await asyncio.wait_for(
+                    client.post("/chat/completions", json={"model": self._model, **payload}), remaining()
+                )
+        except (TimeoutError, asyncio.TimeoutError) as exc:
+            raise LLMClientError("LLM request exceeded its deadline") from exc
+        except httpx.HTTPError as exc:
+            raise LLMClientError(str(exc)) from exc
+        if response.status_code != 200:
+            raise LLMClientError(f"HTTP {response.status_code}: {response.text[:500]}")
+        return response.json()
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            self._semaphore = None
+
+    # 同步接口：在共享的后台事件循环上运行，供 Flask/gevent 调用方使用。
+    def stream_chat(
+        self,
+        messages: List[dict],
+        *,
+        temperature: float,
+        max_tokens: int,
+        deadline: Optional[float] = None,
+    ) -> Iterator[ChatDelta]:
+        """返回的迭代器可在任意线程 ``close()``，取消进行中的请求。"""
+        stream = self.astream_chat(messages, temperature=temperature, max_tokens=max_tokens, deadline=deadline)
+        return _SyncStream(_background_loop(), stream)
+
+    def chat(self, messages: List[dict], *, temperature: float, max_tokens: int) -> tuple[str, Optional[str]]:
+        answer_chunks: list[str] = []
+        reasoning_chunks: list[str] = []
+        for delta in self.stream_chat(messages, temperature=temperature, max_tokens=max_tokens):
+            if delta.content:
+                answer_chunks.append(delta.content)
+            if delta.reasoning_content:
+                reasoning_chunks.append(delta.reasoning_content)
+        return "".join(answer_chunks), "".join(reasoning_chunks) if reasoning_chunks else None
+
+    def structured_chat(
+        self,
+        messages: List[dict],
+        *,
+        schema: dict,
+        function_name: str,
+        max_tokens: int = 900,
+    ) -> dict:
+        """Return schema-constrained JSON with a compatibility fallback."""
+        loop = _background_loop()
+        try:
+            response = loop.run(self.acomplete({
+                "messages": messages,
+                "temperature": 0,
+                "tools": [{
+                    "type": "function",
+                    "function": {
+                        "name": function_name,
+                        "description": "Return structured molecular-dynamics guidance",
+                        "parameters": schema,
+                    },
+                }],
+                "tool_choice": {"type": "function", "function": {"name": function_name}},
+                "max_tokens": max_tokens,
+                "stream": False,
+            }))
+            call = response["choices"][0]["message"]["tool_calls"][0]
+            return json.loads(call["function"]["arguments"])
+        except Exception:
+            fallback_messages = list(messages) + [{
+                "role": "system",
+                "content": f"Return one JSON object only. It must match this JSON Schema: {json.dumps(schema)}",
+            }]
+            response = loop.run(self.acomplete({
+                "messages": fallback_messages,
+                "temperature": 0,
+                "max_tokens": min(max_tokens, 800),
+                "response_format": {"type": "json_object"},
+                "stream": False,
+            }))
+            content = response["choices"][0]["message"].get("content") or "{}"
+            return json.loads(content)
+
+    def close(self) -> None:
+        _background_loop().run(self.aclose())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "max_connections": self._limits.max_connections,
+            "max_keepalive_connections": self._limits.max_keepalive_connections,
+        }
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED: Dict[tuple, AsyncDeepSeekLLMClient] = {}
+
+
+def shared_async_llm_client(api_key: str, base_url: str, model: str) -> AsyncDeepSeekLLMClient:
+    """按 (base_url, api_key, model) 共享客户端，连接池与并发上限在进程内全局生效。"""
+    key = (base_url, api_key, model)
+    with _SHARED_LOCK:
+        client = _SHARED.get(key)
+        if client is None:
+            client = _SHARED[key] = AsyncDeepSeekLLMClient(
+                api_key,
+                base_url,
+                model,
+                max_connections=config.LLM_MAX_CONNECTIONS,
+                max_keepalive=config.LLM_MAX_KEEPALIVE,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY_SECONDS,
+                max_inflight=config.LLM_MAX_INFLIGHT,
+                deadline_seconds=config.LLM_REQUEST_DEADLINE_SECONDS,
+                connect_timeout=config.LLM_CONNECT_TIMEOUT_SECONDS,
+            )
+        return client
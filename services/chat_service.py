@@ -13,18 +13,20 @@ from typing import Any, Dict, Generator, List, Optional, Tuple
 
 from config import RAGConfig, config, dual_rag_config, proteoglycan_rag_config, sweet_rag_config
 from path_utils import normalize_for_storage
+from services.answer_cache import answer_scope, normalize_question, shared_answer_cache
 from services.answer_generator import AnswerGenerator
 from services.citation_validator import CitationValidator
-from services.context_builder import ContextBuilder
+from services.context_builder import PROMPT_TEMPLATE_VERSION, ContextBuilder, estimate_tokens
 from services.encapsulation_references import serialize_encapsulation_references
-from services.llm_client import DeepSeekLLMClient
+from services.llm_client import DeepSeekLLMClient, PrefetchedStream
 from services.metadata_service import MetadataService
 from services.query_processor import QueryProcessor
 from services.rag_pipeline import RAGPipeline
-from services.rag_types import StageTrace, stable_chunk_id, stable_document_id
+from services.rag_types import RetrievalResult, StageTrace, stable_chunk_id, stable_document_id
 from services.ranking_service import RankingService
 from services.reference_selector import ReferenceSelector
 from services.response_serializer import ResponseSerializer
+from services.retrieval_cache import shared_retrieval_cache
 from services.retrieval_service import RetrievalService
 from services.supplement_service import SupplementService
 from services.sweetness_prediction_service import get_sweetness_prediction_service
@@ -58,7 +60,7 @@ class ChatService:
         self.retrieval_max_top_k = rc.max_top_k
         self.retrieval_hard_top_k = rc.hard_top_k
         self.max_chunks_per_paper = rc.max_chunks_per_paper
-        self.context_window = rc.context_window
+        self.context_tokens = rc.context_tokens
         self.show_reasoning = rc.show_reasoning
         self.disable_reasoning_hard = rc.disable_reasoning_hard
 
@@ -117,14 +119,18 @@ class ChatService:
             return {"success": False, "error": "知识库未初始化或数据缺失，请联系管理员或稍后重试。"}
 
         started = time.time()
-        expanded_query = self._expand_query(question)
-        retrieval = self.pipeline.retrieve(expanded_query, similarity_threshold, max_results, question)
+        cached, remember = self._answer_cache_lookup("ask", question, similarity_threshold, max_results)
+        if cached is not None:
+            return self._replay_answer(question, cached, started)
+        analysis = self._analyze(question)
+        expanded_query = analysis.expanded_query
+        retrieval = self._retrieve(analysis, similarity_threshold, max_results, question)
         if not retrieval.retrieved_chunks:
             return self._create_empty_response(question, started, time.time())
 
         context_started = time.perf_counter()
         context = self.context_builder.build_context(
-            retrieval.references, retrieval.unique_papers_dict, self.context_window
+            retrieval.references, retrieval.unique_papers_dict, self.context_tokens
         )
         prompt = self.context_builder.build_prompt(retrieval.references, context, question)
         traces = list(retrieval.traces)
@@ -132,18 +138,24 @@ class ChatService:
             StageTrace(
                 "context",
                 (time.perf_counter() - context_started) * 1000,
-                {"characters": len(context), "references": len(retrieval.references)},
+                {
+                    "characters": len(context),
+                    "tokens": estimate_tokens(context),
+                    "references": len(retrieval.references),
+                },
             )
         )
 
         citation_diagnostics: Dict[str, Any] = {}
         generation_started = time.perf_counter()
+        generated = False
         if self.llm_client:
             try:
                 self.answer_generator.llm_client = self.llm_client
                 answer, _reasoning, citation_diagnostics = self.answer_generator.generate(
                     prompt, retrieval.references
                 )
+                generated = bool(answer)
             except Exception as exc:
                 self.logger.error("LLM调用失败: %s", exc)
                 answer = (
@@ -185,7 +197,7 @@ class ChatService:
         self.last_run = self._evaluation_payload(
             question, expanded_query, retrieval, context, prompt, answer, traces, citation_diagnostics
         )
-        return self.response_serializer.success(
+        response = self.response_serializer.success(
             answer,
             retrieval.references,
             retrieval.stats,
@@ -193,6 +205,9 @@ class ChatService:
             ml_prediction,
             response_time,
         )
+        if generated and remember:
+            remember({"response": response, "references_raw": retrieval.references})
+        return response
 
     def ask_stream(
         self,
@@ -203,12 +218,18 @@ class ChatService:
         if not self.rag_system or not getattr(self.rag_system, "index", None):
             yield self._event("error", error="知识库未初始化或数据缺失，请联系管理员或稍后重试。")
             return
+        deltas = None
         try:
             yield self._event("start", message="开始检索文献...")
-            expanded_query = self._expand_query(question)
+            cached, remember = self._answer_cache_lookup("stream", question, similarity_threshold, max_results)
+            if cached is not None:
+                yield from self._replay_stream(cached)
+                return
+            analysis = self._analyze(question)
+            expanded_query = analysis.expanded_query
             yield self._event("status", message="正在检索相关文献...")
             retrieval_started = time.perf_counter()
-            retrieval = self.pipeline.retrieve(expanded_query, similarity_threshold, max_results, question)
+            retrieval = self._retrieve(analysis, similarity_threshold, max_results, question)
             self.logger.info(
                 "%s retrieval completed in %.2fs: %s chunks, %s references",
                 self.mode,
@@ -226,6 +247,18 @@ class ChatService:
                 yield self._event("done")
                 return
 
+            # 参考文献筛选完成后立即构建 Prompt 并发起补全请求，
+            # 参考文献序列化与 SSE 推送与模型首字等待并行进行。
+            context = self.context_builder.build_context(
+                retrieval.references, retrieval.unique_papers_dict, self.context_tokens
+            )
+            prompt = self.context_builder.build_prompt(retrieval.references, context, question)
+            if self.llm_client:
+                messages = self.answer_generator.messages(prompt, len(retrieval.references))
+                deltas = PrefetchedStream(
+                    lambda: self.llm_client.stream_chat(messages, temperature=0.6, max_tokens=self.qa_max_tokens)
+                )
+
             stats = retrieval.stats
             yield self._event("status", message=f"找到 {stats['after_threshold']} 个相关文本块")
             yield self._event("status", message=f"筛选出 {stats['final_references']} 篇核心文献")
@@ -237,22 +270,16 @@ class ChatService:
             )
             yield self._event("references", references=rich_references)
             yield self._event("retrieval_stats", stats=stats, warning=retrieval.warning)
-            yield self._event("status", message="正在生成答案...")
-
-            context = self.context_builder.build_context(
-                retrieval.references, retrieval.unique_papers_dict, self.context_window
-            )
-            prompt = self.context_builder.build_prompt(retrieval.references, context, question)
-            if not self.llm_client:
+            if deltas is None:
                 yield self._event("error", error="DeepSeek API 未配置，无法生成回答。")
                 return
+            yield self._event("status", message="正在生成答案...")
 
-            messages = self.answer_generator.messages(prompt, len(retrieval.references))
             reasoning_started = False
             answer_started = False
             buffer = ""
             answer_text = ""
-            for delta in self.llm_client.stream_chat(messages, temperature=0.6, max_tokens=self.qa_max_tokens):
+            for delta in deltas:
                 if not self.disable_reasoning_hard and delta.reasoning_content:
                     if not reasoning_started:
                         yield self._event("reasoning_start")
@@ -287,10 +314,87 @@ class ChatService:
                 retrieval.traces,
                 citation_diagnostics,
             )
+            if answer_text and remember:
+                remember({
+                    "references": rich_references,
+                    "stats": stats,
+                    "warning": retrieval.warning,
+                    "answer": answer_text + tail,
+                })
             yield self._event("done")
         except Exception as exc:
             traceback.print_exc()
             yield self._event("error", error=str(exc))
+        finally:
+            # 客户端提前断开或出错时停止后台读取，释放上游连接
+            if deltas is not None:
+                deltas.close()
+
+    def _answer_cache_lookup(self, kind: str, question: str, similarity_threshold: float, max_results: int):
+        """返回 (命中的缓存内容, 写回函数)；未启用缓存或索引版本未知时都为 None。"""
+        cache = shared_answer_cache()
+        version_of = getattr(self.rag_system, "index_version", None)
+        if cache is None or not callable(version_of):
+            return None, None
+        try:
+            version = version_of()
+            if not isinstance(version, str):
+                return None, None
+            scope = answer_scope(
+                self.mode, kind, version, PROMPT_TEMPLATE_VERSION,
+                threshold=round(float(similarity_threshold), 4), max_results=int(max_results),
+            )
+            embedding = self._question_embedding(question) if cache.similarity > 0 else None
+            cached = cache.get(scope, question, embedding)
+        except Exception as exc:
+            self.logger.warning("答案缓存不可用: %s", exc)
+            return None, None
+
+        def remember(payload: Dict[str, Any]) -> None:
+            try:
+                cache.put(scope, question, payload, embedding)
+            except Exception as exc:
+                self.logger.warning("答案缓存写入失败: %s", exc)
+
+        return cached, remember
+
+    def _question_embedding(self, question: str):
+        from llama_index.core import Settings
+
+        from persistent_storage import embed_query_batch
+
+        return embed_query_batch(Settings.embed_model, [normalize_question(question)])[0]
+
+    def _replay_answer(self, question: str, cached: Dict[str, Any], started: float) -> Dict[str, Any]:
+        response = dict(cached["response"], response_time=round(time.time() - started, 2), answer_cache="hit")
+        self.conversations.append({
+            "id": len(self.conversations) + 1,
+            "question": question,
+            "answer": response["answer"],
+            "references": response["references"],
+            "references_raw": cached.get("references_raw", []),
+            "retrieval_stats": response["retrieval_stats"],
+            "retrieval_warning": response["retrieval_warning"],
+            "ml_prediction": response["ml_prediction"],
+            "timestamp": datetime.now().isoformat(),
+            "response_time": response["response_time"],
+        })
+        return response
+
+    def _replay_stream(self, cached: Dict[str, Any]) -> Generator[str, None, None]:
+        """按原有 SSE 事件顺序回放缓存答案，answer 分片输出以保持逐字显示。"""
+        yield self._event("status", message="命中答案缓存")
+        yield self._event("references", references=cached["references"])
+        yield self._event("retrieval_stats", stats=dict(cached["stats"], answer_cache="hit"), warning=cached["warning"])
+        yield self._event("answer_start")
+        answer = cached["answer"]
+        size = config.ANSWER_CACHE_REPLAY_CHUNK_CHARS
+        delay = config.ANSWER_CACHE_REPLAY_DELAY_MS / 1000
+        for start in range(0, len(answer), size):
+            if start and delay:
+                time.sleep(delay)
+            yield self._event("answer", content=answer[start:start + size])
+        yield self._event("done")
 
     def retrieve_for_evaluation(
         self,
@@ -298,18 +402,44 @@ class ChatService:
         similarity_threshold: float = config.RAG_SIMILARITY_THRESHOLD,
         max_results: int = config.RAG_MAX_RESULTS,
     ) -> Dict[str, Any]:
-        expanded_query = self._expand_query(question)
-        retrieval = self.pipeline.retrieve(expanded_query, similarity_threshold, max_results, question)
+        analysis = self._analyze(question)
+        expanded_query = analysis.expanded_query
+        retrieval = self._retrieve(analysis, similarity_threshold, max_results, question)
         context = self.context_builder.build_context(
-            retrieval.references, retrieval.unique_papers_dict, self.context_window
+            retrieval.references, retrieval.unique_papers_dict, self.context_tokens
         )
         return self._evaluation_payload(
             question, expanded_query, retrieval, context, "", "", retrieval.traces, {}
         )
 
+    def _retrieve(self, analysis, similarity_threshold: float, max_results: int, question: str) -> RetrievalResult:
+        """带检索结果缓存的 ``pipeline.retrieve``；索引版本未知时不缓存。"""
+        cache = shared_retrieval_cache(self.mode)
+        version_of = getattr(self.rag_system, "index_version", None)
+        version = version_of() if cache is not None and callable(version_of) else None
+        if not isinstance(version, str):
+            return self.pipeline.retrieve(
+                analysis.expanded_query, similarity_threshold, max_results, question, analysis=analysis
+            )
+        key = cache.key(analysis.question, analysis.expanded_query, similarity_threshold, max_results)
+        cached = cache.get(version, key)
+        if cached is not None:
+            cached.stats["retrieval_cache"] = "hit"
+            return cached
+        retrieval = self.pipeline.retrieve(
+            analysis.expanded_query, similarity_threshold, max_results, question, analysis=analysis
+        )
+        try:
+            cache.put(version, key, retrieval)
+        except Exception as exc:
+            self.logger.warning("检索结果缓存写入失败: %s", exc)
+        return retrieval
+
+    def _analyze(self, question: str):
+        return self.query_processor.analyze(question, self.retrieval_target_min, self.retrieval_target_max)
+
     def _expand_query(self, question: str) -> str:
-        expansion = self.query_expander.expand_query(question)
-        return expansion["search_query"] if expansion.get("expanded_terms") else question
+        return self._analyze(question).expanded_query
 
     def _evaluation_payload(self, question, expanded_query, retrieval, context, prompt, answer, traces, citation):
         chunks = []
@@ -390,8 +520,8 @@ class ChatService:
     def _retrieve_references(self, query, similarity_threshold, max_results, original_query=""):
         return self.pipeline.retrieve(query, similarity_threshold, max_results, original_query).to_legacy_dict()
 
-    def _build_context(self, references, unique_papers_dict, max_context_length):
-        return self.context_builder.build_context(references, unique_papers_dict, max_context_length)
+    def _build_context(self, references, unique_papers_dict, max_context_tokens):
+        return self.context_builder.build_context(references, unique_papers_dict, max_context_tokens)
 
     def _build_prompt(self, references, context, question):
         return self.context_builder.build_prompt(references, context, question)
@@ -5,23 +5,59 @@ from __future__ import annotations
 import hashlib
 import json
 import logging
+import os
+import queue
 import sqlite3
 import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
 
 import faiss
 import numpy as np
 from llama_index.core import Settings
-from llama_index.core.schema import NodeWithScore, TextNode
 
-from metadata_storage import MetadataStorage
-from persistent_storage import PersistentRAGSystem
+from config import RAGConfig, config
+from metadata_storage import shared_metadata_storage
+from persistent_storage import PersistentRAGSystem, embed_query_batch
+from services.document_features import document_feature_count, fetch_document_features, has_document_features
+from services.lexical_index import has_lexical_index, lexical_count, search_lexical
+from sweetseek.ann_index import RERANK_IDS_FILE, RERANK_VECTORS_FILE, ExactReranker, apply_search_params
+from sweetseek.hybrid_adapter import HybridNode, HybridNodeWithScore
 
 
 LOGGER = logging.getLogger(__name__)
 INDEX_FORMAT = "compact-faiss-sqlite"
 REQUIRED_FILES = ("vectors.faiss", "chunks.sqlite", "manifest.json", "checksums.sha256")
+CHECKSUMMED_FILES = ("vectors.faiss", "chunks.sqlite", "manifest.json")
+# 增量段：compact/deltas/<seq>-<version>/，与 release 相同的 FAISS + SQLite 布局。
+DELTAS_DIR = "deltas"
+# 已加载的 CompactRAGSystem 读取 index 时最多每隔这么久检查一次 current 与增量段是否变化。
+RELOAD_RECHECK_SECONDS = 2.0
+# 只读 mmap：向量页由内核按需换入并在多个域/进程间共享，启动时不再整文件拷贝进内存。
+MMAP_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+
+
+CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id INTEGER UNIQUE,
+    chunk_id TEXT PRIMARY KEY,
+    document_id TEXT,
+    file_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    page INTEGER,
+    text TEXT NOT NULL,
+    metadata_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_vector_id ON chunks(vector_id);
+CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id);
+CREATE INDEX IF NOT EXISTS idx_chunks_file_path ON chunks(file_path);
+CREATE TABLE IF NOT EXISTS build_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
 
 
 def resolve_current_release(index_root: str | Path) -> Optional[Path]:
@@ -33,7 +69,76 @@ def resolve_current_release(index_root: str | Path) -> Optional[Path]:
     return release if release.is_dir() else None
 
 
-def verify_release(release: Path, *, verify_checksums: bool = True) -> Dict[str, Any]:
+def delta_segment_seq(path: Path) -> int:
+    head = path.name.split("-", 1)[0]
+    return int(head) if head.isdigit() else -1
+
+
+def active_deltas(index_root: str | Path, base_manifest: Dict[str, Any]) -> List[Path]:
+    """Delta segments written after the base release was compacted, in ingest order."""
+    deltas_dir = Path(index_root) / "compact" / DELTAS_DIR
+    if not deltas_dir.is_dir():
+        return []
+    folded = int(base_manifest.get("segment_seq", 0))
+    # 段目录先写入临时名再 rename，带 manifest 的才是完整段。
+    return sorted(
+        (path for path in deltas_dir.iterdir()
+         if path.is_dir() and delta_segment_seq(path) > folded and (path / "manifest.json").is_file()),
+        key=delta_segment_seq,
+    )
+
+
+def segments_signature(index_root: str | Path) -> tuple:
+    release = resolve_current_release(index_root)
+    deltas_dir = Path(index_root) / "compact" / DELTAS_DIR
+    names = sorted(path.name for path in deltas_dir.iterdir()) if deltas_dir.is_dir() else []
+    return (str(release) if release else None, tuple(names))
+
+
+def release_sidecar_files(manifest: Dict[str, Any]) -> tuple:
+    return (RERANK_VECTORS_FILE, RERANK_IDS_FILE) if manifest.get("rerank") else ()
+
+
+def _verify_rerank_vectors(release: Path, manifest: Dict[str, Any], index: faiss.Index) -> None:
+    if manifest.get("quantizer") not in {"sq8", "pq"}:
+        raise ValueError(f"rerank vectors require a quantized index, got {manifest.get('quantizer')!r}")
+    vectors = np.load(str(release / RERANK_VECTORS_FILE), mmap_mode="r")
+    ids = np.load(str(release / RERANK_IDS_FILE), mmap_mode="r")
+    if vectors.dtype != np.float32 or vectors.shape != (int(index.ntotal), int(index.d)):
+        raise ValueError(
+            f"rerank vectors layout mismatch: {vectors.dtype}{vectors.shape}, faiss=({index.ntotal}, {index.d})"
+        )
+    if ids.dtype != np.int64 or ids.shape != (int(index.ntotal),):
+        raise ValueError(f"rerank id layout mismatch: {ids.dtype}{ids.shape}")
+    if len(ids) > 1 and not bool(np.all(ids[1:] > ids[:-1])):
+        raise ValueError("rerank ids must be strictly increasing")
+
+
+def read_release_index(path: str | Path) -> faiss.Index:
+    """Open a release index read-only via mmap, falling back to a full read."""
+    if MMAP_READ_FLAGS:
+        try:
+            return faiss.read_index(str(path), MMAP_READ_FLAGS)
+        except RuntimeError as exc:
+            LOGGER.warning("mmap load failed for %s, reading into memory: %s", path, exc)
+    return faiss.read_index(str(path))
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_release(
+    release: Path,
+    *,
+    verify_checksums: bool = True,
+    faiss_index: Optional[faiss.Index] = None,
+) -> Dict[str, Any]:
+    """Validate a release; pass ``faiss_index`` to reuse an already opened index."""
     missing = [name for name in REQUIRED_FILES if not (release / name).is_file()]
     if missing:
         raise ValueError(f"compact index is incomplete: {', '.join(missing)}")
@@ -41,20 +146,24 @@ def verify_release(release: Path, *, verify_checksums: bool = True) -> Dict[str,
     manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
     if manifest.get("index_format") != INDEX_FORMAT:
         raise ValueError(f"unsupported compact index format: {manifest.get('index_format')!r}")
+    checksummed = CHECKSUMMED_FILES + release_sidecar_files(manifest)
+    missing = [name for name in checksummed if not (release / name).is_file()]
+    if missing:
+        raise ValueError(f"compact index is incomplete: {', '.join(missing)}")
 
     if verify_checksums:
         expected: Dict[str, str] = {}
         for line in (release / "checksums.sha256").read_text(encoding="utf-8").splitlines():
             digest, separator, filename = line.partition("  ")
-            if not separator or filename not in {"vectors.faiss", "chunks.sqlite", "manifest.json"}:
+            if not separator or filename not in checksummed:
                 raise ValueError("invalid checksum manifest")
             expected[filename] = digest
-        for filename in ("vectors.faiss", "chunks.sqlite", "manifest.json"):
-            digest = hashlib.sha256((release / filename).read_bytes()).hexdigest()
+        for filename in checksummed:
+            digest = sha256_file(release / filename)
             if expected.get(filename) != digest:
                 raise ValueError(f"checksum mismatch: {filename}")
 
-    index = faiss.read_index(str(release / "vectors.faiss"))
+    index = faiss_index if faiss_index is not None else read_release_index(release / "vectors.faiss")
     connection = sqlite3.connect(f"file:{release / 'chunks.sqlite'}?mode=ro", uri=True)
     try:
         chunk_count = int(connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
@@ -64,12 +173,29 @@ def verify_release(release: Path, *, verify_checksums: bool = True) -> Dict[str,
         document_count = int(
             connection.execute("SELECT COUNT(DISTINCT file_path) FROM chunks").fetchone()[0]
         )
+        lexical_rows = None
+        if manifest.get("lexical_index"):
+            if not has_lexical_index(connection):
+                raise ValueError("manifest declares a lexical index but chunks_fts is missing")
+            lexical_rows = lexical_count(connection)
+        feature_rows = None
+        if manifest.get("document_features"):
+            if not has_document_features(connection):
+                raise ValueError("manifest declares document features but the documents table is missing")
+            feature_rows = document_feature_count(connection)
     finally:
         connection.close()
+    # 不同写法的同一路径归一化后共用一个 document_id，因此行数只能不多于 file_path 数。
+    if feature_rows is not None and (feature_rows > document_count or (document_count and not feature_rows)):
+        raise ValueError(f"document feature count mismatch: documents={feature_rows}, papers={document_count}")
+    if lexical_rows is not None and lexical_rows != mapped_count:
+        raise ValueError(f"lexical/chunk count mismatch: fts={lexical_rows}, mapped={mapped_count}")
     if index.ntotal != mapped_count or mapped_count != chunk_count:
         raise ValueError(
             f"vector/chunk count mismatch: faiss={index.ntotal}, mapped={mapped_count}, chunks={chunk_count}"
         )
+    if manifest.get("rerank"):
+        _verify_rerank_vectors(release, manifest, index)
     if int(manifest.get("vector_count", -1)) != int(index.ntotal):
         raise ValueError("manifest vector count does not match FAISS")
     if int(manifest.get("chunk_count", -1)) != chunk_count:
@@ -86,76 +212,558 @@ def verify_release(release: Path, *, verify_checksums: bool = True) -> Dict[str,
     }
 
 
+def write_checksums(release: Path) -> None:
+    manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+    lines = []
+    for filename in CHECKSUMMED_FILES + release_sidecar_files(manifest):
+        digest = sha256_file(release / filename)
+        lines.append(f"{digest}  {filename}")
+    (release / "checksums.sha256").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def activate_release(compact_root: Path, release: Path) -> None:
+    current = compact_root / "current"
+    temporary = compact_root / ".current.next"
+    temporary.unlink(missing_ok=True)
+    temporary.symlink_to(Path("releases") / release.name)
+    os.replace(temporary, current)
+
+
+# One statement text for any number of ids, so sqlite3's statement cache keeps it prepared.
+_FETCH_CHUNKS_SQL = (
+    "SELECT vector_id, chunk_id, document_id, file_path, filename, page, text, metadata_json "
+    "FROM chunks WHERE vector_id IN (SELECT value FROM json_each(?))"
+)
+_CHUNK_IDS_BY_VECTOR_SQL = "SELECT vector_id, chunk_id FROM chunks WHERE vector_id IN (SELECT value FROM json_each(?))"
+_EXISTING_CHUNK_IDS_SQL = "SELECT chunk_id FROM chunks WHERE chunk_id IN (SELECT value FROM json_each(?))"
+
+
+class LazyChunkMetadata(dict):
+    """Chunk metadata that decodes ``metadata_json`` only when a non-identity key is read.
+
+    Release builders derive the ``file_path``/``filename``/``document_id`` columns from the
+    same node metadata, so filtering, diversification and deduplication never pay for
+    ``json.loads``; chunks that reach reference building decode on first access.
+    """
+
+    __slots__ = ("_raw", "_page")
+
+    def __init__(self, file_path: str, file_name: str, document_id: Any, raw: Optional[str], page: Any):
+        super().__init__(file_path=file_path, file_name=file_name, document_id=document_id)
+        self._raw = raw
+        self._page = page
+
+    @property
+    def decoded(self) -> bool:
+        return self._raw is None
+
+    def _materialize(self) -> None:
+        raw = self._raw
+        if raw is None:
+            return
+        self._raw = None
+        metadata = json.loads(raw or "{}")
+        metadata.setdefault("file_path", dict.__getitem__(self, "file_path"))
+        metadata.setdefault("file_name", dict.__getitem__(self, "file_name"))
+        if self._page is not None:
+            metadata.setdefault("page_label", str(self._page))
+        metadata.setdefault("document_id", dict.__getitem__(self, "document_id"))
+        dict.clear(self)
+        dict.update(self, metadata)
+
+    def _ensure(self, key: Any) -> None:
+        if self._raw is not None and not dict.__contains__(self, key):
+            self._materialize()
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __getitem__(self, key):
+        self._ensure(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._ensure(key)
+        return dict.get(self, key, default)
+
+    def __contains__(self, key) -> bool:
+        self._ensure(key)
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self._materialize()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self._materialize()
+        return dict.__len__(self)
+
+    def __eq__(self, other) -> bool:
+        self._materialize()
+        return dict.__eq__(self, other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        self._materialize()
+        return dict.__repr__(self)
+
+    def __setitem__(self, key, value) -> None:
+        self._materialize()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key) -> None:
+        self._materialize()
+        dict.__delitem__(self, key)
+
+    def keys(self):
+        self._materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self._materialize()
+        return dict.values(self)
+
+    def items(self):
+        self._materialize()
+        return dict.items(self)
+
+    def copy(self) -> Dict[str, Any]:
+        self._materialize()
+        return dict(dict.items(self))
+
+    def pop(self, key, *default):
+        self._materialize()
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        self._materialize()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs) -> None:
+        self._materialize()
+        dict.update(self, *args, **kwargs)
+
+    def __reduce__(self):
+        # Pickle and copy as a plain dict: the default protocol refills items through
+        # __setitem__ before the slots are restored.
+        return dict, (self.copy(),)
+
+
+class SearchBatcher:
+    """Coalesce concurrent FAISS searches that arrive within ``window_ms`` into one matrix search.
+
+    FAISS reads on an immutable index are thread-safe, so this is purely a throughput aid:
+    one ``search`` over N stacked rows is cheaper than N single-row searches under load.
+    """
+
+    def __init__(self, faiss_index: faiss.Index, window_ms: float, max_rows: int = 64, result_timeout: float = 30.0):
+        self.faiss_index = faiss_index
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_rows = max(1, int(max_rows))
+        self.result_timeout = max(0.1, float(result_timeout))
+        self._pending: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        # Enqueueing and closing share one lock so no request can land behind the sentinel.
+        self._lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.requests = 0
+        self._worker = threading.Thread(target=self._run, name="compact-search-batcher", daemon=True)
+        self._worker.start()
+
+    def search(self, query_vectors: np.ndarray, top_k: int):
+        future: Future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._pending.put((query_vectors, int(top_k), future))
+        if closed:
+            return self.faiss_index.search(query_vectors, top_k)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            # The worker is stuck or gone; answer directly rather than hang the request.
+            return self.faiss_index.search(query_vectors, top_k)
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        rows = first[0].shape[0]
+        deadline = time.monotonic() + self.window
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._pending.put(None)
+                break
+            batch.append(item)
+            rows += item[0].shape[0]
+        return batch
+
+    def _serve(self, batch: List[tuple]) -> None:
+        try:
+            top_k = max(item[1] for item in batch)
+            scores, ids = self.faiss_index.search(np.vstack([item[0] for item in batch]), top_k)
+        except Exception as exc:
+            for _, _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        offset = 0
+        for vectors, k, future in batch:
+            end = offset + vectors.shape[0]
+            future.set_result((scores[offset:end, :k], ids[offset:end, :k]))
+            offset = end
+
+    def _run(self) -> None:
+        while True:
+            first = self._pending.get()
+            if first is None:
+                break
+            self._serve(self._collect(first))
+        # Serve anything that is still queued after the sentinel instead of abandoning it.
+        leftovers = []
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            self._serve(leftovers)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.put(None)
+        self._worker.join(timeout=1.0)
+
+
+def _default_batch_window_ms() -> float:
+    try:
+        from config import config as _cfg
+        return float(getattr(_cfg, "COMPACT_SEARCH_BATCH_WINDOW_MS", 0.0))
+    except Exception:
+        return 0.0
+
+
 class CompactRetriever:
     def __init__(self, compact_index: "CompactIndex", top_k: int):
         self.compact_index = compact_index
         self.top_k = max(1, int(top_k))
 
-    def retrieve(self, query: str) -> List[NodeWithScore]:
-        embedding = self.compact_index.embed_query(query)
-        query_vector = np.asarray([embedding], dtype="float32")
-        if query_vector.shape[1] != self.compact_index.dimension:
+    def retrieve(self, query: str) -> List[HybridNodeWithScore]:
+        return self.retrieve_many([query])[0]
+
+    def retrieve_many(self, queries: Sequence[str]) -> List[List[HybridNodeWithScore]]:
+        """Embed all query variants in one call and search them as one FAISS matrix."""
+        if not queries:
+            return []
+        query_vectors = np.asarray(self.compact_index.embed_queries(list(queries)), dtype="float32")
+        if query_vectors.ndim != 2 or query_vectors.shape[0] != len(queries):
+            raise ValueError(f"expected {len(queries)} query embeddings, got shape {query_vectors.shape}")
+        if query_vectors.shape[1] != self.compact_index.dimension:
             raise ValueError(
-                f"query/index dimensions differ: {query_vector.shape[1]} != {self.compact_index.dimension}"
+                f"query/index dimensions differ: {query_vectors.shape[1]} != {self.compact_index.dimension}"
             )
-        faiss.normalize_L2(query_vector)
-        with self.compact_index.search_lock:
-            scores, ids = self.compact_index.faiss_index.search(query_vector, self.top_k)
-        hits = [(int(vector_id), float(score)) for vector_id, score in zip(ids[0], scores[0]) if vector_id >= 0]
-        if not hits:
-            return []
+        faiss.normalize_L2(query_vectors)
+        self._query_vectors = query_vectors
+        return self.compact_index.search_nodes(query_vectors, self.top_k)
+
+    @property
+    def has_lexical(self) -> bool:
+        return self.compact_index.has_lexical
+
+    def search_lexical(self, queries: Sequence[str], top_k: int) -> List[List[tuple]]:
+        """FTS5 lookup only (no embedding), safe to run alongside ``retrieve_many``."""
+        return self.compact_index.lexical_hits(queries, top_k)
 
-        placeholders = ",".join("?" for _ in hits)
-        rows = self.compact_index.connection.execute(
-            f"SELECT vector_id, chunk_id, document_id, file_path, filename, page, text, metadata_json "
-            f"FROM chunks WHERE vector_id IN ({placeholders})",
-            [vector_id for vector_id, _ in hits],
-        ).fetchall()
-        by_id = {int(row[0]): row for row in rows}
-        nodes: List[NodeWithScore] = []
-        for vector_id, score in hits:
-            row = by_id.get(vector_id)
-            if row is None:
-                continue
-            metadata = json.loads(row[7] or "{}")
-            metadata.setdefault("file_path", row[3])
-            metadata.setdefault("file_name", row[4])
-            if row[5] is not None:
-                metadata.setdefault("page_label", str(row[5]))
-            metadata.setdefault("document_id", row[2])
-            node = TextNode(id_=row[1], text=row[6] or "", metadata=metadata)
-            nodes.append(NodeWithScore(node=node, score=score))
-        return nodes
+    def hydrate_lexical(self, queries: Sequence[str], hits: List[List[tuple]]) -> List[List[HybridNodeWithScore]]:
+        """Turn lexical hits into nodes scored with the exact query/chunk cosine similarity."""
+        query_vectors = getattr(self, "_query_vectors", None)
+        if query_vectors is None or len(query_vectors) != len(queries):
+            query_vectors = np.asarray(self.compact_index.embed_queries(list(queries)), dtype="float32")
+            faiss.normalize_L2(query_vectors)
+        return self.compact_index.lexical_nodes(query_vectors, hits)
 
 
 class CompactIndex:
-    def __init__(self, release: Path, embed_query):
+    def __init__(
+        self,
+        release: Path,
+        embed_query: Callable[[str], List[float]],
+        embed_queries: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        batch_window_ms: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ):
         self.release = release
-        self.faiss_index = faiss.read_index(str(release / "vectors.faiss"))
+        self.faiss_index = read_release_index(release / "vectors.faiss")
         self.dimension = int(self.faiss_index.d)
+        # IVF/HNSW 的默认 nprobe/efSearch 随索引序列化；此处仅应用按知识域配置的覆盖值。
+        self.search_params = apply_search_params(self.faiss_index, nprobe=nprobe, ef_search=ef_search)
+        self.reranker: Optional[ExactReranker] = None
+        manifest_path = release / "manifest.json"
+        rerank = json.loads(manifest_path.read_text(encoding="utf-8")).get("rerank") if manifest_path.is_file() else None
+        if rerank:
+            self.reranker = ExactReranker(
+                release / RERANK_VECTORS_FILE, release / RERANK_IDS_FILE, int(rerank.get("factor", 4))
+            )
+        else:
+            # 词法命中按 ID 取向量补分；IVF 默认没有 direct map，无法 reconstruct（每个向量多占 8 字节）
+            ivf = faiss.try_extract_index_ivf(self.faiss_index)
+            if ivf is not None:
+                ivf.make_direct_map()
         self.embed_query = embed_query
-        self.search_lock = threading.Lock()
+        self.embed_queries = embed_queries or (lambda queries: [embed_query(query) for query in queries])
+        # 只读索引上的 FAISS 检索线程安全，不再全局加锁；窗口 > 0 时合并并发请求为一次矩阵检索。
+        if batch_window_ms is None:
+            batch_window_ms = _default_batch_window_ms()
+        self.batcher: Optional[SearchBatcher] = (
+            SearchBatcher(self.faiss_index, batch_window_ms) if batch_window_ms > 0 else None
+        )
         self.connection = sqlite3.connect(
             f"file:{release / 'chunks.sqlite'}?mode=ro&immutable=1", uri=True, check_same_thread=False
         )
+        self.has_lexical = has_lexical_index(self.connection)
+        self.has_documents = has_document_features(self.connection)
+
+    def search(self, query_vectors: np.ndarray, top_k: int):
+        if self.reranker is None:
+            return self._search(query_vectors, top_k)
+        _, candidates = self._search(query_vectors, self.reranker.candidate_k(top_k))
+        return self.reranker.rerank(query_vectors, candidates, top_k)
+
+    def _search(self, query_vectors: np.ndarray, top_k: int):
+        if self.batcher is not None:
+            return self.batcher.search(query_vectors, top_k)
+        return self.faiss_index.search(query_vectors, top_k)
+
+    def lexical_hits(self, queries: Sequence[str], top_k: int) -> List[List[tuple]]:
+        if not self.has_lexical:
+            return [[] for _ in queries]
+        return [[(self, vector_id, bm25) for vector_id, bm25 in hits]
+                for hits in search_lexical(self.connection, queries, top_k)]
+
+    def vector_scores(self, query_vector: np.ndarray, vector_ids: Sequence[int]) -> np.ndarray:
+        """Cosine scores for stored vectors: exact via the reranker side files, else from ``reconstruct``."""
+        scores = np.zeros(len(vector_ids), dtype="float32")
+        if self.reranker is not None:
+            matrix = np.asarray([vector_ids], dtype="int64")
+            reranked, ids = self.reranker.rerank(query_vector[None, :], matrix, len(vector_ids))
+            by_id = {int(vector_id): float(score) for vector_id, score in zip(ids[0], reranked[0]) if vector_id >= 0}
+            return np.asarray([by_id.get(int(vector_id), 0.0) for vector_id in vector_ids], dtype="float32")
+        for position, vector_id in enumerate(vector_ids):
+            try:
+                scores[position] = float(self.faiss_index.reconstruct(int(vector_id)) @ query_vector)
+            except RuntimeError:
+                # ID 不在索引中（不应发生），保留 0 分
+                pass
+        return scores
+
+    def lexical_nodes(self, query_vectors: np.ndarray, hits: List[List[tuple]]) -> List[List[HybridNodeWithScore]]:
+        by_segment: Dict[int, tuple] = {}
+        for row_hits in hits:
+            for segment, vector_id, _ in row_hits:
+                by_segment.setdefault(id(segment), (segment, set()))[1].add(vector_id)
+        nodes = {key: segment.fetch_chunks(ids) for key, (segment, ids) in by_segment.items()}
+        results = []
+        for query_vector, row_hits in zip(query_vectors, hits):
+            scores: Dict[int, Dict[int, float]] = {}
+            for key, (segment, _) in by_segment.items():
+                ids = [vector_id for hit_segment, vector_id, _ in row_hits if hit_segment is segment]
+                if ids:
+                    scores[key] = dict(zip(ids, segment.vector_scores(query_vector, ids)))
+            ranked = []
+            for segment, vector_id, _ in row_hits:
+                node = nodes[id(segment)].get(vector_id)
+                if node is not None:
+                    ranked.append(HybridNodeWithScore(
+                        node, float(scores[id(segment)][vector_id]), lexical_rank=len(ranked) + 1
+                    ))
+            results.append(ranked)
+        return results
+
+    def search_nodes(self, query_vectors: np.ndarray, top_k: int) -> List[List[HybridNodeWithScore]]:
+        scores, ids = self.search(query_vectors, top_k)
+        per_query = [
+            [(int(vector_id), float(score)) for vector_id, score in zip(ids[row], scores[row]) if vector_id >= 0]
+            for row in range(len(query_vectors))
+        ]
+        nodes = self.fetch_chunks({vector_id for hits in per_query for vector_id, _ in hits})
+        return [
+            [HybridNodeWithScore(nodes[vector_id], score) for vector_id, score in hits if vector_id in nodes]
+            for hits in per_query
+        ]
+
+    def document_features(self, document_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Build-time metadata and static ranking features, keyed by reference document_id."""
+        if not self.has_documents:
+            return {}
+        return fetch_document_features(self.connection, document_ids)
+
+    def fetch_chunks(self, vector_ids: Iterable[int]) -> Dict[int, HybridNode]:
+        """Hydrate each distinct vector id once; metadata JSON stays encoded until read."""
+        unique_ids = sorted(set(vector_ids))
+        if not unique_ids:
+            return {}
+        rows = self.connection.execute(_FETCH_CHUNKS_SQL, (json.dumps(unique_ids),)).fetchall()
+        return {
+            int(row[0]): HybridNode(row[6] or "", LazyChunkMetadata(row[3], row[4], row[2], row[7], row[5]), row[1])
+            for row in rows
+        }
+
+    def chunk_ids(self, vector_ids: Iterable[int]) -> Dict[int, str]:
+        unique_ids = sorted(set(vector_ids))
+        if not unique_ids:
+            return {}
+        rows = self.connection.execute(_CHUNK_IDS_BY_VECTOR_SQL, (json.dumps(unique_ids),)).fetchall()
+        return {int(vector_id): chunk_id for vector_id, chunk_id in rows}
+
+    def existing_chunk_ids(self, chunk_ids: Iterable[str]) -> set:
+        unique_ids = sorted(set(chunk_ids))
+        if not unique_ids:
+            return set()
+        rows = self.connection.execute(_EXISTING_CHUNK_IDS_SQL, (json.dumps(unique_ids),)).fetchall()
+        return {row[0] for row in rows}
 
     def as_retriever(self, similarity_top_k: int = 10) -> CompactRetriever:
         return CompactRetriever(self, similarity_top_k)
 
     def close(self) -> None:
+        if self.batcher is not None:
+            self.batcher.close()
         self.connection.close()
 
 
+class SegmentedCompactIndex:
+    """Base release plus delta segments searched together and merged by score.
+
+    A chunk rewritten by a newer segment (same chunk id) is served only from that segment,
+    whatever the older copy scores.
+    """
+
+    def __init__(self, base: CompactIndex, deltas: Sequence[CompactIndex]):
+        self.base = base
+        self.deltas = list(deltas)
+        self.release = base.release
+        self.dimension = base.dimension
+        self.embed_query = base.embed_query
+        self.embed_queries = base.embed_queries
+        self.search_params = base.search_params
+        self.has_lexical = base.has_lexical
+        self.has_documents = any(segment.has_documents for segment in (base, *deltas))
+
+    @property
+    def segments(self) -> List[CompactIndex]:
+        return [self.base, *self.deltas]
+
+    def _superseded(self, candidates: Dict[int, set]) -> Dict[int, set]:
+        """Map segment position -> those of its candidate chunk ids that a newer segment also holds."""
+        stale: Dict[int, set] = {}
+        for position, chunk_ids in candidates.items():
+            found: set = set()
+            for newer in self.segments[position + 1:]:
+                found |= newer.existing_chunk_ids(chunk_ids - found)
+            stale[position] = found
+        return stale
+
+    def lexical_hits(self, queries: Sequence[str], top_k: int) -> List[List[tuple]]:
+        """bm25 scores of different FTS5 tables are not comparable: rank per segment, fuse by RRF."""
+        per_segment = [segment.lexical_hits(queries, top_k) for segment in self.segments]
+        chunk_ids = [
+            segment.chunk_ids(vector_id for hits in rows for _, vector_id, _ in hits)
+            for segment, rows in zip(self.segments, per_segment)
+        ]
+        stale = self._superseded({
+            position: set(chunk_ids[position].values()) for position in range(len(self.segments) - 1)
+        })
+        rrf_k = max(1, int(getattr(config, "RAG_RRF_K", 60)))
+        merged = []
+        for row in range(len(queries)):
+            fused = []
+            for position, rows in enumerate(per_segment):
+                rank = 0
+                for hit in rows[row]:
+                    if chunk_ids[position].get(hit[1]) in stale.get(position, ()):
+                        continue
+                    rank += 1
+                    # 同分时较新的段在前
+                    fused.append((1.0 / (rrf_k + rank), position, hit))
+            fused.sort(key=lambda item: (item[0], item[1]), reverse=True)
+            merged.append([hit for _, _, hit in fused[:top_k]])
+        return merged
+
+    def lexical_nodes(self, query_vectors: np.ndarray, hits: List[List[tuple]]) -> List[List[HybridNodeWithScore]]:
+        return self.base.lexical_nodes(query_vectors, hits)
+
+    def document_features(self, document_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        document_ids = set(document_ids)
+        features: Dict[str, Dict[str, Any]] = {}
+        # 较新的段覆盖旧段（同一文献重新入库后以最新构建为准）。
+        for segment in self.segments:
+            features.update(segment.document_features(document_ids))
+        return features
+
+    def search_nodes(self, query_vectors: np.ndarray, top_k: int) -> List[List[HybridNodeWithScore]]:
+        per_segment = [segment.search_nodes(query_vectors, top_k) for segment in self.segments]
+        # 同一 chunk 在较新的段中被重新写入时只保留最新一份，即使旧副本得分更高。
+        stale = self._superseded({
+            position: {hit.node_id for hits in per_segment[position] for hit in hits}
+            for position in range(len(self.segments) - 1)
+        })
+        results = []
+        for row in range(len(query_vectors)):
+            hits = [
+                hit for position, rows in enumerate(per_segment)
+                for hit in rows[row] if hit.node_id not in stale.get(position, ())
+            ]
+            hits.sort(key=lambda hit: hit.score, reverse=True)
+            results.append(hits[:top_k])
+        return results
+
+    def as_retriever(self, similarity_top_k: int = 10) -> CompactRetriever:
+        return CompactRetriever(self, similarity_top_k)
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+
+
 class CompactRAGSystem:
-    """RAG-system compatible facade that never deserializes legacy JSON indexes."""
+    """RAG-system compatible facade that never deserializes legacy JSON indexes.
 
-    def __init__(self, data_dir: str, persist_dir: str, metadata_path: str):
+    Reading ``index`` rechecks ``compact/current`` and the delta directory at most every
+    ``RELOAD_RECHECK_SECONDS``, so a running server picks up new releases and delta segments.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        persist_dir: str,
+        metadata_path: str,
+        rag_config: Optional[RAGConfig] = None,
+    ):
         self.data_dir = data_dir
         self.persist_dir = persist_dir
-        self.metadata_storage = MetadataStorage(metadata_path)
-        self.index: Optional[CompactIndex] = None
+        self.rag_config = rag_config
+        self.metadata_storage = shared_metadata_storage(metadata_path)
+        self._index: Optional[CompactIndex | SegmentedCompactIndex] = None
+        # 上次重载换下的索引：已取到它的检索可能仍在进行，下次重载时再关闭
+        self._retired: Optional[CompactIndex | SegmentedCompactIndex] = None
         self.last_error: Optional[str] = None
         self.manifest: Dict[str, Any] = {}
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
         model_state_dir = Path(persist_dir) / "compact" / ".model-state"
         self._model_system = PersistentRAGSystem(
             data_dir=data_dir,
@@ -170,26 +778,84 @@ class CompactRAGSystem:
         if release is None:
             self.last_error = "紧凑索引 current 版本不存在"
             return False
+        signature = segments_signature(self.persist_dir)
+        segments: List[CompactIndex] = []
         try:
-            manifest = verify_release(release, verify_checksums=False)
             self._model_system._configure_models()
             embed_model = Settings.embed_model
+
+            def open_segment(path: Path) -> tuple:
+                segment = CompactIndex(
+                    path,
+                    embed_model.get_query_embedding,
+                    lambda queries: embed_query_batch(embed_model, queries),
+                    nprobe=getattr(self.rag_config, "ann_nprobe", 0),
+                    ef_search=getattr(self.rag_config, "ann_ef_search", 0),
+                )
+                segments.append(segment)
+                return segment, verify_release(path, verify_checksums=False, faiss_index=segment.faiss_index)
+
+            base, manifest = open_segment(release)
             model_dimension = int(getattr(self._model_system, "embedding_dim", 0) or 0)
             if model_dimension and model_dimension != int(manifest["dimension"]):
                 raise ValueError(
                     f"embedding dimension mismatch: model={model_dimension}, index={manifest['dimension']}"
                 )
-            if self.index is not None:
-                self.index.close()
-            self.index = CompactIndex(release, embed_model.get_query_embedding)
-            self.manifest = manifest
+            deltas = []
+            delta_stats = {"delta_segments": 0, "delta_vector_count": 0}
+            for path in active_deltas(self.persist_dir, manifest):
+                delta, delta_manifest = open_segment(path)
+                if int(delta_manifest["dimension"]) != int(manifest["dimension"]):
+                    raise ValueError(f"delta segment dimension mismatch: {path.name}")
+                deltas.append(delta)
+                delta_stats["delta_segments"] += 1
+                delta_stats["delta_vector_count"] += int(delta_manifest["vector_count"])
+            if self._retired is not None:
+                self._retired.close()
+            self._retired = self._index
+            self._index = SegmentedCompactIndex(base, deltas) if deltas else base
+            self.manifest = {**manifest, **delta_stats}
+            self._signature = signature
+            self._checked_at = time.monotonic()
             return True
         except Exception as exc:
-            self.index = None
+            for segment in segments:
+                segment.close()
+            # 已在服务的索引继续使用；只有首次加载失败才没有可用索引
             self.last_error = str(exc)
             LOGGER.exception("Failed to load compact index")
             return False
 
+    @property
+    def index(self) -> Optional[CompactIndex | SegmentedCompactIndex]:
+        self._refresh()
+        return self._index
+
+    def _refresh(self) -> None:
+        if self._index is None or time.monotonic() - self._checked_at < RELOAD_RECHECK_SECONDS:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            self.reload_if_changed()
+        finally:
+            self._reload_lock.release()
+
+    def index_version(self) -> Optional[str]:
+        """Loaded release version plus the newest active delta; ``None`` before loading."""
+        if self.index is None or not self.manifest:
+            return None
+        deltas = self._signature[1] if self._signature else ()
+        version = str(self.manifest.get("version"))
+        return f"{version}+{deltas[-1]}" if deltas else version
+
+    def reload_if_changed(self) -> bool:
+        """Reload when ``compact/current`` or the delta set changed since the last load."""
+        if self._index is not None and self._signature == segments_signature(self.persist_dir):
+            return False
+        return self.load_existing_index()
+
     def get_stats(self) -> Dict[str, Any]:
         release = resolve_current_release(self.persist_dir)
         if release is not None and not self.manifest:
@@ -211,5 +877,10 @@ class CompactRAGSystem:
                 "vector_count": int(self.manifest.get("vector_count", 0)),
                 "documents_count": int(self.manifest.get("documents_count", 0)),
                 "index_version": self.manifest.get("version"),
+                "index_type": self.manifest.get("index_type", "flat"),
+                "delta_segments": int(self.manifest.get("delta_segments", 0)),
             })
+            payload["vector_count"] += int(self.manifest.get("delta_vector_count", 0))
+        if self.index is not None and self.index.search_params:
+            payload["search_params"] = dict(self.index.search_params)
         return payload
@@ -0,0 +1,317 @@
+"""Incremental delta segments for compact releases and their compaction into a new base."""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import shutil
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from services.compact_index import (
+    CHUNKS_SCHEMA,
+    DELTAS_DIR,
+    INDEX_FORMAT,
+    RERANK_IDS_FILE,
+    RERANK_VECTORS_FILE,
+    activate_release,
+    active_deltas,
+    delta_segment_seq,
+    resolve_current_release,
+    verify_release,
+    write_checksums,
+)
+from services.document_features import (
+    DOCUMENT_FEATURES_VERSION,
+    MetadataLookup,
+    build_document_features,
+    stored_metadata,
+)
+from services.lexical_index import LEXICAL_INDEX_VERSION, build_lexical_index
+from sweetseek.ann_index import DEFAULT_RERANK_FACTOR, build_ann_index, index_vectors
+
+LOGGER = logging.getLogger(__name__)
+LOCK_FILE = ".segments.lock"
+COMPACTION_LOCK_FILE = ".compaction.lock"
+_INSERT_CHUNK_SQL = (
+    "INSERT INTO chunks(vector_id, chunk_id, document_id, file_path, filename, page, text, metadata_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# 压缩时沿用 base 的索引参数（nlist 按新规模重新估算）。
+_ANN_PARAM_KEYS = {"nprobe": "nprobe", "efSearch": "ef_search", "hnsw_m": "hnsw_m", "pq_m": "pq_m", "pq_bits": "pq_bits"}
+
+
+@dataclass
+class SegmentChunk:
+    chunk_id: str
+    file_path: str
+    filename: str
+    text: str
+    vector: Sequence[float]
+    document_id: str = ""
+    page: Optional[int] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _utc_stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+@contextmanager
+def segments_lock(compact_root: Path) -> Iterator[None]:
+    """Serialize delta writers and the compaction swap for one index root."""
+    compact_root.mkdir(parents=True, exist_ok=True)
+    with (compact_root / LOCK_FILE).open("w") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _current_manifest(index_root: Path) -> Tuple[Path, Dict[str, Any]]:
+    release = resolve_current_release(index_root)
+    if release is None:
+        raise ValueError("紧凑索引 current 版本不存在，无法写入增量段")
+    return release, json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+
+
+def _finish_segment(
+    path: Path,
+    manifest: Dict[str, Any],
+    connection: sqlite3.Connection,
+    metadata_lookup: Optional[MetadataLookup] = None,
+) -> Dict[str, Any]:
+    if manifest.get("lexical_index"):
+        build_lexical_index(connection)
+        manifest["lexical_index"] = LEXICAL_INDEX_VERSION
+    if manifest.get("document_features"):
+        build_document_features(connection, metadata_lookup)
+        manifest["document_features"] = DOCUMENT_FEATURES_VERSION
+    manifest["chunk_count"] = int(connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+    manifest["documents_count"] = int(
+        connection.execute("SELECT COUNT(DISTINCT file_path) FROM chunks").fetchone()[0]
+    )
+    connection.commit()
+    connection.close()
+    (path / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    write_checksums(path)
+    return verify_release(path)
+
+
+def write_delta_segment(
+    index_root: str | Path,
+    chunks: Sequence[SegmentChunk],
+    source: str = "incremental",
+    metadata_lookup: Optional[MetadataLookup] = None,
+) -> Path:
+    """Write one ingest batch as a small flat FAISS + SQLite segment beside the current base.
+
+    The segment becomes visible atomically (built under a temporary name, then renamed),
+    and is searched together with the base until ``compact_segments`` folds it in.
+    ``metadata_lookup`` resolves paper metadata for the per-document features table.
+    """
+    if not chunks:
+        raise ValueError("no chunks to write")
+    index_root = Path(index_root)
+    compact_root = index_root / "compact"
+    deltas_dir = compact_root / DELTAS_DIR
+    vectors = np.asarray([chunk.vector for chunk in chunks], dtype="float32")
+    if vectors.ndim != 2 or not vectors.shape[1]:
+        raise ValueError(f"invalid chunk vectors: shape {vectors.shape}")
+    faiss.normalize_L2(vectors)
+
+    with segments_lock(compact_root):
+        _, base_manifest = _current_manifest(index_root)
+        if int(base_manifest.get("dimension", vectors.shape[1])) != vectors.shape[1]:
+            raise ValueError(
+                f"delta dimension mismatch: base={base_manifest.get('dimension')}, delta={vectors.shape[1]}"
+            )
+        deltas_dir.mkdir(parents=True, exist_ok=True)
+        existing = [delta_segment_seq(path) for path in deltas_dir.iterdir()]
+        seq = max([int(base_manifest.get("segment_seq", 0)), *existing]) + 1
+        version = f"{seq:06d}-{_utc_stamp()}"
+        staging = deltas_dir / f".{version}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+        index.add_with_ids(vectors, np.arange(len(chunks), dtype="int64"))
+        faiss.write_index(index, str(staging / "vectors.faiss"))
+        connection = sqlite3.connect(staging / "chunks.sqlite")
+        connection.executescript(CHUNKS_SCHEMA)
+        connection.executemany(
+            _INSERT_CHUNK_SQL,
+            [
+                (
+                    vector_id, chunk.chunk_id, chunk.document_id, chunk.file_path, chunk.filename, chunk.page,
+                    chunk.text, json.dumps(chunk.metadata, ensure_ascii=False, separators=(",", ":")),
+                )
+                for vector_id, chunk in enumerate(chunks)
+            ],
+        )
+        _finish_segment(staging, {
+            "index_format": INDEX_FORMAT,
+            "segment": "delta",
+            "segment_seq": seq,
+            "version": version,
+            "base_version": base_manifest.get("version"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "dimension": int(vectors.shape[1]),
+            "vector_count": len(chunks),
+            "vectors_seen": len(chunks),
+            "orphan_vector_count": 0,
+            "source": source,
+            "index_type": "flat",
+            **({"lexical_index": LEXICAL_INDEX_VERSION} if base_manifest.get("lexical_index") else {}),
+            **({"document_features": DOCUMENT_FEATURES_VERSION} if base_manifest.get("document_features") else {}),
+        }, connection, metadata_lookup)
+        segment = deltas_dir / version
+        staging.rename(segment)
+    LOGGER.info("Wrote delta segment %s (%d chunks)", segment.name, len(chunks))
+    return segment
+
+
+def _release_vectors(release: Path, manifest: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    if manifest.get("rerank"):
+        return (
+            np.load(str(release / RERANK_VECTORS_FILE)),
+            np.load(str(release / RERANK_IDS_FILE)).astype("int64"),
+        )
+    return index_vectors(faiss.read_index(str(release / "vectors.faiss")))
+
+
+def compact_segments(
+    index_root: str | Path,
+    version: Optional[str] = None,
+    *,
+    activate: bool = True,
+    remove_folded: bool = True,
+) -> Optional[Path]:
+    """Fold the active delta segments into a new base release and swap ``compact/current``.
+
+    Deltas are immutable, so the build runs without the segment lock; deltas written meanwhile
+    get a higher sequence number than ``segment_seq`` and stay active on top of the new base.
+    Returns ``None`` when there is nothing to compact.
+    """
+    index_root = Path(index_root)
+    compact_root = index_root / "compact"
+    compact_root.mkdir(parents=True, exist_ok=True)
+    with (compact_root / COMPACTION_LOCK_FILE).open("w") as compaction_lock:
+        try:
+            fcntl.flock(compaction_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError("another compaction is already running") from None
+        return _compact_locked(index_root, compact_root, version, activate, remove_folded)
+
+
+def _compact_locked(
+    index_root: Path,
+    compact_root: Path,
+    version: Optional[str],
+    activate: bool,
+    remove_folded: bool,
+) -> Optional[Path]:
+    with segments_lock(compact_root):
+        base, base_manifest = _current_manifest(index_root)
+        deltas = active_deltas(index_root, base_manifest)
+    if not deltas:
+        return None
+
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    release = compact_root / "releases" / version
+    if release.exists():
+        raise ValueError(f"release already exists: {release}")
+    release.mkdir(parents=True)
+    try:
+        connection = sqlite3.connect(release / "chunks.sqlite")
+        source = sqlite3.connect(f"file:{base / 'chunks.sqlite'}?mode=ro", uri=True)
+        try:
+            source.backup(connection)
+        finally:
+            source.close()
+
+        # 文献元数据沿用各段构建时的匹配结果，新段覆盖旧段。
+        known_metadata = stored_metadata(connection)
+        vectors, ids = _release_vectors(base, base_manifest)
+        next_id = int(ids.max()) + 1 if len(ids) else 0
+        added_vectors: List[np.ndarray] = []
+        added_ids: List[np.ndarray] = []
+        dropped: set = set()
+        for delta in deltas:
+            delta_vectors, delta_ids = index_vectors(faiss.read_index(str(delta / "vectors.faiss")))
+            remap = {int(old): next_id + offset for offset, old in enumerate(delta_ids)}
+            rows = sqlite3.connect(f"file:{delta / 'chunks.sqlite'}?mode=ro", uri=True)
+            try:
+                known_metadata.update(stored_metadata(rows))
+                for row in rows.execute(
+                    "SELECT vector_id, chunk_id, document_id, file_path, filename, page, text, metadata_json "
+                    "FROM chunks ORDER BY vector_id"
+                ):
+                    # 重新入库的 chunk 以最新段为准，旧向量随旧行一并剔除。
+                    previous = connection.execute(
+                        "SELECT vector_id FROM chunks WHERE chunk_id=?", (row[1],)
+                    ).fetchone()
+                    if previous is not None:
+                        connection.execute("DELETE FROM chunks WHERE chunk_id=?", (row[1],))
+                        dropped.add(int(previous[0]))
+                    connection.execute(_INSERT_CHUNK_SQL, (remap[int(row[0])], *row[1:]))
+            finally:
+                rows.close()
+            added_vectors.append(delta_vectors)
+            added_ids.append(np.asarray([remap[int(old)] for old in delta_ids], dtype="int64"))
+            next_id += len(delta_ids)
+
+        all_vectors = np.vstack([vectors, *added_vectors])
+        all_ids = np.concatenate([ids, *added_ids])
+        live = ~np.isin(all_ids, np.fromiter(dropped, dtype="int64", count=len(dropped)))
+        all_vectors, all_ids = np.ascontiguousarray(all_vectors[live], dtype="float32"), all_ids[live]
+
+        index_type = base_manifest.get("index_type", "flat")
+        quantizer = base_manifest.get("quantizer", "none")
+        ann_kwargs = {arg: base_manifest[key] for key, arg in _ANN_PARAM_KEYS.items() if key in base_manifest}
+        index, params = build_ann_index(all_vectors, all_ids, index_type, quantizer=quantizer, **ann_kwargs)
+        faiss.write_index(index, str(release / "vectors.faiss"))
+        if params.get("quantizer"):
+            order = np.argsort(all_ids)
+            np.save(release / RERANK_VECTORS_FILE, all_vectors[order])
+            np.save(release / RERANK_IDS_FILE, all_ids[order])
+            factor = int((base_manifest.get("rerank") or {}).get("factor", DEFAULT_RERANK_FACTOR))
+            params["rerank"] = {"vectors": RERANK_VECTORS_FILE, "ids": RERANK_IDS_FILE, "factor": factor}
+
+        manifest = {
+            key: value for key, value in base_manifest.items()
+            if key not in {"recall_report", "rerank", "quantizer", "nlist", "pq_m", "pq_bits"}
+        }
+        manifest.update(params)
+        manifest.update({
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "dimension": int(all_vectors.shape[1]),
+            "vector_count": int(len(all_ids)),
+            "vectors_seen": int(len(all_ids)),
+            "orphan_vector_count": 0,
+            "segment_seq": delta_segment_seq(deltas[-1]),
+            "compacted_from": {"base": base_manifest.get("version"), "deltas": [delta.name for delta in deltas]},
+        })
+        _finish_segment(release, manifest, connection, known_metadata.get)
+    except Exception:
+        shutil.rmtree(release, ignore_errors=True)
+        raise
+
+    if activate:
+        with segments_lock(compact_root):
+            activate_release(compact_root, release)
+            if remove_folded:
+                for delta in deltas:
+                    shutil.rmtree(delta, ignore_errors=True)
+    LOGGER.info("Compacted %d delta segments into %s", len(deltas), release.name)
+    return release
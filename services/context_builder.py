@@ -2,12 +2,53 @@
 
 import math
 import re
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from services.encapsulation_references import format_gbt7714
 from services.metadata_service import MetadataService
 from services.rag_types import stable_document_id
 
+# Prompt 模板或上下文组装规则变化时递增，使答案缓存中的旧回答失效。
+PROMPT_TEMPLATE_VERSION = "prompt-v2"
+
+_CITATION_MARKS = re.compile(r'\[\d+\]|\[CrossRef\]|\[PubMed\]|\[Google Scholar\]', re.IGNORECASE)
+_LIST_NUMBERS = re.compile(r'^\d+\.\s+', re.MULTILINE)
+_CJK = re.compile(r'[\u3000-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_TOKENIZER: Optional[Any] = None
+
+
+def _tokenizer():
+    """llama-index 自带的 cl100k 编码（离线缓存随包分发）；不可用时退回字符估算。"""
+    global _TOKENIZER
+    if _TOKENIZER is None:
+        try:
+            from llama_index.core.utils import get_tokenizer
+
+            _TOKENIZER = get_tokenizer()
+        except Exception:
+            _TOKENIZER = False
+    return _TOKENIZER
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算 token 数；无分词器时按中文约 0.6、其它字符约 0.3 token/字符计。"""
+    if not text:
+        return 0
+    tokenizer = _tokenizer()
+    if tokenizer:
+        return len(tokenizer(text))
+    cjk = len(_CJK.findall(text))
+    return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+@lru_cache(maxsize=8192)
+def clean_chunk_text(text: str) -> Tuple[str, int]:
+    """去掉文献编号、数据库标记与列表序号并压缩空白，返回 (清洗后文本, token 数)；同一文本只处理一次。"""
+    cleaned = _LIST_NUMBERS.sub('', _CITATION_MARKS.sub('', text or ''))
+    cleaned = ' '.join(cleaned.split())
+    return cleaned, estimate_tokens(cleaned)
+
 
 class ContextBuilder:
     def __init__(self, metadata_service: MetadataService, mode: str = "main"):
@@ -16,9 +57,16 @@ class ContextBuilder:
 
     def build_references_raw(self, unique_papers_list) -> List[Dict[str, Any]]:
         references_raw = []
+        document_ids = [stable_document_id(paper_info['file_path']) for paper_info in unique_papers_list]
+        precomputed = self.metadata_service.lookup_document_features(document_ids)
         for paper_index, paper_info in enumerate(unique_papers_list, 1):
             file_path = paper_info['file_path']
+            document = precomputed.get(document_ids[paper_index - 1])
             paper_metadata = self.metadata_service.lookup_metadata_fast(file_path) if file_path else None
+            if document is not None and document.get('metadata'):
+                # 构建时快照只作兜底：线上目录中非空的字段（补全、修订后的元数据）优先
+                live = {key: value for key, value in (paper_metadata or {}).items() if value not in (None, '', [])}
+                paper_metadata = {**document['metadata'], **live}
 
             if paper_metadata:
                 references_raw.append({
@@ -33,7 +81,7 @@ class ContextBuilder:
                     'pages': paper_metadata.get('pages', paper_metadata.get('page', '')),
                     'filename': paper_info['filename'],
                     'file_path': paper_info['file_path'],
-                    'document_id': stable_document_id(paper_info['file_path']),
+                    'document_id': document_ids[paper_index - 1],
                     'score': paper_info['max_score'],
                     'content': paper_info['sample_content']
                 })
@@ -48,40 +96,49 @@ class ContextBuilder:
                     'doi': 'Not Available',
                     'filename': paper_info['filename'],
                     'file_path': paper_info['file_path'],
-                    'document_id': stable_document_id(paper_info['file_path']),
+                    'document_id': document_ids[paper_index - 1],
                     'score': paper_info['max_score'],
                     'content': paper_info['sample_content']
                 })
+            if document is not None:
+                references_raw[-1]['static_features'] = document['static_features']
         return references_raw
 
-    def build_context(self, references, unique_papers_dict, max_context_length) -> str:
-        numbered_context_chunks = []
-        total_length = 0
-
+    def build_context(self, references, unique_papers_dict, max_context_tokens) -> str:
+        """按 token 预算装配上下文：逐轮为每篇文献放入其剩余得分最高且放得下的文本块，
+        放不下的块跳过（更短的块仍可填充剩余预算）；输出按文献顺序分组。"""
+        candidates: List[List[Tuple[str, int]]] = []
+        seen = set()
         for ref in references:
-            ref_file_path = ref['file_path']
-            ref_id = ref['ref_id']
-
-            if ref_file_path in unique_papers_dict:
-                paper_chunks = unique_papers_dict[ref_file_path]['chunks']
-                for chunk in paper_chunks:
-                    chunk_text = chunk.text
-                    chunk_text = re.sub(r'\[\d+\]', '', chunk_text)
-                    chunk_text = re.sub(r'\[CrossRef\]|\[PubMed\]|\[Google Scholar\]', '', chunk_text, flags=re.IGNORECASE)
-                    chunk_text = re.sub(r'^\d+\.\s+', '', chunk_text, flags=re.MULTILINE)
-                    chunk_text = re.sub(r'\s+', ' ', chunk_text).strip()
-
-                    if total_length + len(chunk_text) > max_context_length:
-                        break
-
-                    numbered_chunk = f"[{ref_id}] {chunk_text}"
-                    numbered_context_chunks.append(numbered_chunk)
-                    total_length += len(chunk_text)
-
-                if total_length >= max_context_length:
-                    break
-
-        return "\n\n".join(numbered_context_chunks)
+            paper = unique_papers_dict.get(ref['file_path'])
+            chunks = sorted(paper['chunks'], key=lambda chunk: -float(getattr(chunk, 'score', 0) or 0)) if paper else []
+            prefix_tokens = estimate_tokens(f"[{ref['ref_id']}] ")
+            items = []
+            for chunk in chunks:
+                chunk_text, tokens = clean_chunk_text(str(getattr(chunk, 'text', '') or ''))
+                if chunk_text and chunk_text not in seen:
+                    seen.add(chunk_text)
+                    items.append((chunk_text, tokens + prefix_tokens + 1))
+            candidates.append(items)
+
+        remaining = int(max_context_tokens)
+        picked: List[List[str]] = [[] for _ in references]
+        progress = True
+        while progress:
+            progress = False
+            for index, items in enumerate(candidates):
+                fit = next((position for position, item in enumerate(items) if item[1] <= remaining), None)
+                if fit is not None:
+                    chunk_text, cost = items.pop(fit)
+                    picked[index].append(chunk_text)
+                    remaining -= cost
+                    progress = True
+
+        return "\n\n".join(
+            f"[{ref['ref_id']}] {chunk_text}"
+            for ref, texts in zip(references, picked)
+            for chunk_text in texts
+        )
 
     def build_prompt(self, references, context, question) -> str:
         ref_list_summary = "\n".join([
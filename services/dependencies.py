@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
+from config import config
 from evidence_ranker import EvidenceRanker
 from logger import setup_logger
 from query_expander import SweetnessQueryExpander
 from services.compound_service import CompoundService
 from services.chat_service import ChatService
+from services.async_llm_client import AsyncDeepSeekLLMClient, shared_async_llm_client
 from services.llm_client import DeepSeekLLMClient
 
 
@@ -15,7 +17,7 @@ from services.llm_client import DeepSeekLLMClient
 class Services:
     query_expander: SweetnessQueryExpander
     evidence_ranker: EvidenceRanker
-    llm_client: Optional[DeepSeekLLMClient]
+    llm_client: Optional[Union[DeepSeekLLMClient, AsyncDeepSeekLLMClient]]
     compound_service: CompoundService
     chat_service: ChatService
 
@@ -30,7 +32,9 @@ def build_services() -> Services:
     import persistent_storage
     if hasattr(persistent_storage, "configure_llm"):
         persistent_storage.configure_llm()
-    if hasattr(persistent_storage, "deepseek_client") and hasattr(persistent_storage, "deepseek_model"):
+    if config.LLM_CLIENT_BACKEND == "httpx" and config.DEEPSEEK_API_KEY and config.DEEPSEEK_BASE_URL:
+        llm_client = shared_async_llm_client(config.DEEPSEEK_API_KEY, config.DEEPSEEK_BASE_URL, config.DEEPSEEK_MODEL)
+    elif hasattr(persistent_storage, "deepseek_client") and hasattr(persistent_storage, "deepseek_model"):
         llm_client = DeepSeekLLMClient(persistent_storage.deepseek_client, persistent_storage.deepseek_model)
     else:
         logger.warning("DeepSeek client 未配置，LLM功能将不可用")
@@ -0,0 +1,158 @@
+"""Per-paper static ranking features stored in the compact release ``documents`` table.
+
+期刊分级、研究类型/证据强度关键词扫描与元数据匹配只依赖文献本身，
+在构建 release 时按 document_id 算好一次；查询时只需再计算语义相关度。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from evidence_ranker import EvidenceRanker
+from services.metadata_service import MetadataService
+from services.rag_types import stable_document_id
+
+DOCUMENT_FEATURES_VERSION = "documents-v1"
+DOCUMENTS_TABLE = "documents"
+DOCUMENTS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {DOCUMENTS_TABLE} (
+    document_id TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    metadata_json TEXT NOT NULL,
+    publication_year INTEGER,
+    study_type_score REAL NOT NULL,
+    evidence_type TEXT NOT NULL,
+    evidence_type_score REAL NOT NULL,
+    journal_score REAL NOT NULL
+);
+"""
+# 与 EvidenceRanker 的扫描窗口一致：研究类型看前 800 字，证据强度看前 1500 字。
+LEAD_TEXT_CHARS = 1500
+
+MetadataLookup = Callable[[str], Optional[Dict[str, Any]]]
+
+
+def storage_lookup(storage: Any) -> MetadataLookup:
+    """按 MetadataService.lookup_metadata_fast 的规则匹配（路径 → 相对路径 → 文件名）。"""
+    return MetadataService(SimpleNamespace(metadata_storage=storage)).lookup_metadata_fast
+
+
+def _lead_texts(connection: sqlite3.Connection) -> Iterable[tuple]:
+    """每篇文献按页码顺序拼接的前 LEAD_TEXT_CHARS 字。"""
+    current = None
+    filename = ""
+    parts: list = []
+    size = 0
+    rows = connection.execute(
+        "SELECT file_path, filename, text FROM chunks ORDER BY file_path, page IS NULL, page, vector_id"
+    )
+    for file_path, row_filename, text in rows:
+        if file_path != current:
+            if current is not None:
+                yield current, filename, " ".join(parts)[:LEAD_TEXT_CHARS]
+            current, filename, parts, size = file_path, row_filename, [], 0
+        if size < LEAD_TEXT_CHARS:
+            parts.append(text or "")
+            size += len(text or "") + 1
+    if current is not None:
+        yield current, filename, " ".join(parts)[:LEAD_TEXT_CHARS]
+
+
+def build_document_features(
+    connection: sqlite3.Connection,
+    metadata_lookup: Optional[MetadataLookup] = None,
+    ranker: Optional[EvidenceRanker] = None,
+    batch_size: int = 500,
+) -> int:
+    """(重)建 documents 表；未匹配到元数据的文献按与检索时相同的规则回退标题/期刊。"""
+    ranker = ranker or EvidenceRanker()
+    connection.execute(f"DROP TABLE IF EXISTS {DOCUMENTS_TABLE}")
+    connection.executescript(DOCUMENTS_SCHEMA)
+    batch = []
+    total = 0
+    for file_path, filename, lead in _lead_texts(connection):
+        metadata = metadata_lookup(file_path) if metadata_lookup else None
+        metadata = metadata if isinstance(metadata, dict) else None
+        if metadata:
+            title = metadata.get("title", "Unknown Title")
+            journal = metadata.get("journal", "Unknown Journal")
+            year = metadata.get("year", "N/A")
+        else:
+            title, year = filename, "N/A"
+            journal = "营养数据集" if "datasets" in file_path.lower() or "dataset" in filename.lower() else "Unknown"
+        features = ranker.static_features(str(title or ""), str(journal or ""), year, lead)
+        batch.append((
+            stable_document_id(file_path), file_path, filename,
+            json.dumps(metadata, ensure_ascii=False, separators=(",", ":")),
+            features["publication_year"], features["study_type_score"], features["evidence_type"],
+            features["evidence_type_score"], features["journal_score"],
+        ))
+        if len(batch) >= batch_size:
+            total += _insert(connection, batch)
+            batch = []
+    total += _insert(connection, batch)
+    connection.commit()
+    return total
+
+
+def _insert(connection: sqlite3.Connection, rows: list) -> int:
+    connection.executemany(
+        f"INSERT OR REPLACE INTO {DOCUMENTS_TABLE}(document_id, file_path, filename, metadata_json, "
+        "publication_year, study_type_score, evidence_type, evidence_type_score, journal_score) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+def has_document_features(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (DOCUMENTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def document_feature_count(connection: sqlite3.Connection) -> int:
+    return int(connection.execute(f"SELECT COUNT(*) FROM {DOCUMENTS_TABLE}").fetchone()[0])
+
+
+def stored_metadata(connection: sqlite3.Connection) -> Dict[str, Optional[Dict[str, Any]]]:
+    """file_path → 构建时匹配到的元数据，供压缩重建 documents 表时沿用。"""
+    if not has_document_features(connection):
+        return {}
+    return {
+        file_path: json.loads(raw)
+        for file_path, raw in connection.execute(f"SELECT file_path, metadata_json FROM {DOCUMENTS_TABLE}")
+    }
+
+
+def fetch_document_features(
+    connection: sqlite3.Connection, document_ids: Iterable[str]
+) -> Dict[str, Dict[str, Any]]:
+    """document_id → {"metadata": dict | None, "static_features": {...}}。"""
+    unique_ids = sorted(set(document_ids))
+    if not unique_ids:
+        return {}
+    rows = connection.execute(
+        "SELECT document_id, metadata_json, publication_year, study_type_score, evidence_type, "
+        f"evidence_type_score, journal_score FROM {DOCUMENTS_TABLE} "
+        "WHERE document_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(unique_ids),),
+    ).fetchall()
+    return {
+        row[0]: {
+            "metadata": json.loads(row[1]),
+            "static_features": {
+                "publication_year": row[2],
+                "study_type_score": float(row[3]),
+                "evidence_type": row[4],
+                "evidence_type_score": float(row[5]),
+                "journal_score": float(row[6]),
+            },
+        }
+        for row in rows
+    }
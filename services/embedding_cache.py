@@ -0,0 +1,218 @@
+"""文档块嵌入的持久化缓存：sha256(嵌入文本) + 模型指纹 → float16 向量。
+
+全量重建、紧凑 release 构建与增量段都先查缓存，只为新文本调用嵌入模型；
+旧版 LlamaIndex 存储转换/迁移时用其中已有的向量预热缓存（键为当时实际嵌入的文本）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    text_sha256 TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimension INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (text_sha256, model)
+) WITHOUT ROWID;
+"""
+# json_each 单次查询的键数上限
+_LOOKUP_BATCH = 2000
+
+EmbedFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+def model_fingerprint(dimension: int, source: Optional[str] = None, name: Optional[str] = None) -> str:
+    """嵌入模型指纹（来源 + 模型名 + 维度），与 rag_admin 写入 manifest 的 embedding_fingerprint 一致。"""
+    value = ":".join((source or config.EMBED_MODEL_SOURCE, name or config.EMBED_MODEL_NAME, str(int(dimension))))
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+class EmbeddingCache:
+    """SQLite (WAL) 存储，可由多个领域、多个构建进程共用。"""
+
+    def __init__(self, path: str):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, digests: Sequence[str]) -> Dict[str, np.ndarray]:
+        unique = sorted(set(digests))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                rows = self._connection.execute(
+                    "SELECT text_sha256, dimension, vector FROM embeddings "
+                    "WHERE model = ? AND text_sha256 IN (SELECT value FROM json_each(?))",
+                    (model, json.dumps(unique[start:start + _LOOKUP_BATCH])),
+                ).fetchall()
+                for digest, dimension, blob in rows:
+                    vector = np.frombuffer(blob, dtype="<f2")
+                    if len(vector) == dimension:
+                        found[digest] = vector.astype("float32")
+        return found
+
+    def put_many(self, model: str, entries: Dict[str, Sequence[float]]) -> None:
+        if not entries:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        rows = []
+        for digest, vector in entries.items():
+            array = np.asarray(vector, dtype="<f2").reshape(-1)
+            rows.append((digest, model, len(array), array.tobytes(), now))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings(text_sha256, model, dimension, vector, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def embed(self, model: str, texts: Sequence[str], embed_fn: EmbedFunction) -> List[List[float]]:
+        """按输入顺序返回向量；同一批内重复的文本只嵌入一次。"""
+        digests = [text_digest(text) for text in texts]
+        found = self.get_many(model, digests)
+        self.hits += sum(digest in found for digest in digests)
+        pending: Dict[str, str] = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found:
+                pending.setdefault(digest, text)
+        self.misses += len(pending)
+        if pending:
+            computed = embed_fn(list(pending.values()))
+            if len(computed) != len(pending):
+                raise ValueError(f"embedding count mismatch: {len(computed)} != {len(pending)}")
+            fresh = dict(zip(pending, computed))
+            self.put_many(model, fresh)
+            found.update({digest: np.asarray(vector, dtype="float32") for digest, vector in fresh.items()})
+        return [found[digest].tolist() for digest in digests]
+
+    def wrap(self, model: str, embed_fn: EmbedFunction) -> EmbedFunction:
+        return lambda texts: self.embed(model, texts, embed_fn)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": str(self.path), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED: Dict[str, EmbeddingCache] = {}
+
+
+def shared_embedding_cache(path: Optional[str] = None) -> Optional[EmbeddingCache]:
+    """进程内按路径共享的缓存；EMBED_CACHE_PATH 为空时关闭（返回 None）。"""
+    path = config.EMBED_CACHE_PATH if path is None else path
+    if not path:
+        return None
+    key = str(Path(path).expanduser().resolve())
+    with _SHARED_LOCK:
+        cache = _SHARED.get(key)
+        if cache is None:
+            cache = _SHARED[key] = EmbeddingCache(key)
+        return cache
+
+
+def _legacy_embed_text(raw: Any) -> Optional[str]:
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.storage.docstore.utils import json_to_doc
+
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    data = raw.get("__data__") if isinstance(raw, dict) else None
+    if isinstance(data, str):
+        data = json.loads(data)
+    if not isinstance(data, dict):
+        return None
+    node = json_to_doc({"__data__": data, "__type__": raw.get("__type__", "1")})
+    return node.get_content(metadata_mode=MetadataMode.EMBED)
+
+
+def seed_from_legacy_store(
+    cache: EmbeddingCache,
+    docstore_path: str | Path,
+    vector_path: str | Path,
+    model: Optional[str] = None,
+    batch_size: int = 2000,
+) -> int:
+    """用 LlamaIndex JSON 存储中的向量预热缓存，返回写入条数。
+
+    键为 LlamaIndex 实际嵌入的文本（MetadataMode.EMBED），与重建时 _insert_document_batch 查询的键一致；
+    节点 id → 文本摘要的中间映射放在临时 SQLite 中，内存占用与存储规模无关。
+    """
+    import ijson
+
+    batch_size = max(1, int(batch_size))
+    seeded = 0
+    with tempfile.TemporaryDirectory(dir=cache.path.parent) as scratch:
+        keys = sqlite3.connect(Path(scratch) / "keys.sqlite")
+        try:
+            keys.execute("CREATE TABLE keys (node_id TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+            rows = []
+            with Path(docstore_path).open("rb") as handle:
+                for node_id, raw in ijson.kvitems(handle, "docstore/data"):
+                    try:
+                        text = _legacy_embed_text(raw)
+                    except Exception as exc:
+                        logger.debug("跳过无法解析的节点 %s: %s", node_id, exc)
+                        continue
+                    if text:
+                        rows.append((str(node_id), text_digest(text)))
+                    if len(rows) >= batch_size:
+                        keys.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)", rows)
+                        rows = []
+            keys.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)", rows)
+            keys.commit()
+
+            pending: Dict[str, List[float]] = {}
+
+            def flush() -> int:
+                found = keys.execute(
+                    "SELECT node_id, digest FROM keys WHERE node_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(list(pending)),),
+                ).fetchall()
+                entries = {digest: pending[node_id] for node_id, digest in found}
+                cache.put_many(model, entries)
+                pending.clear()
+                return len(entries)
+
+            with Path(vector_path).open("rb") as handle:
+                for node_id, vector in ijson.kvitems(handle, "embedding_dict", use_float=True):
+                    if not vector:
+                        continue
+                    if model is None:
+                        model = model_fingerprint(len(vector))
+                    pending[str(node_id)] = vector
+                    if len(pending) >= batch_size:
+                        seeded += flush()
+            if pending:
+                seeded += flush()
+        finally:
+            keys.close()
+    return seeded
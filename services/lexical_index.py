@@ -0,0 +1,105 @@
+"""SQLite FTS5 lexical index over compact ``chunks.sqlite`` with a mixed Chinese/English tokenizer."""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Iterable, List, Sequence, Tuple
+
+LEXICAL_INDEX_VERSION = "fts5-mixed-v2"
+LEXICAL_TABLE = "chunks_fts"
+# 预分词后以空格拼接写入；tokenchars 保留 CAS 号 (50-81-7)、小数 (1.5) 等内部的 - 和 .
+LEXICAL_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {LEXICAL_TABLE} USING fts5("
+    "tokens, content='', tokenize=\"unicode61 remove_diacritics 2 tokenchars '-.'\")"
+)
+_LATIN = re.compile(r"[A-Za-z0-9]+(?:[-.][A-Za-z0-9]+)*")
+_CJK = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_TOKEN = re.compile(rf"{_LATIN.pattern}|{_CJK.pattern}")
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "that", "the", "to", "was", "were", "with", "what", "which", "how", "does", "do",
+})
+
+
+def tokenize_mixed(text: str) -> List[str]:
+    """英文/数字按词小写化（保留 CAS、缩写及 Reb M 的 m 这类单字母），中文连续段切成字二元组。"""
+    tokens: List[str] = []
+    for match in _TOKEN.finditer(text or ""):
+        piece = match.group(0)
+        if _CJK.fullmatch(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+            continue
+        token = piece.lower()
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def query_terms(text: str) -> List[str]:
+    """查询词项：单个拉丁字母与前一个词合成短语（"reb m"），避免单字母独立匹配大量无关文本。"""
+    terms: List[str] = []
+    for token in tokenize_mixed(text):
+        if len(token) == 1 and token.isalpha() and terms:
+            terms[-1] = f"{terms[-1]} {token}"
+        else:
+            terms.append(token)
+    return list(dict.fromkeys(terms))
+
+
+def match_expression(query: str) -> str:
+    """把查询转成 FTS5 MATCH 表达式：去重后的词项（或短语）OR 连接，交给 bm25 排序。"""
+    return " OR ".join(f'"{term}"' for term in query_terms(query))
+
+
+def build_lexical_index(connection: sqlite3.Connection, batch_size: int = 2000) -> int:
+    """(重)建 chunks_fts，rowid 与 chunks.vector_id 一致。"""
+    connection.execute(f"DROP TABLE IF EXISTS {LEXICAL_TABLE}")
+    connection.execute(LEXICAL_SCHEMA)
+    cursor = connection.execute("SELECT vector_id, text FROM chunks WHERE vector_id IS NOT NULL")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        connection.executemany(
+            f"INSERT INTO {LEXICAL_TABLE}(rowid, tokens) VALUES (?, ?)",
+            [(int(vector_id), " ".join(tokenize_mixed(text))) for vector_id, text in rows],
+        )
+        total += len(rows)
+    connection.commit()
+    return total
+
+
+def has_lexical_index(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (LEXICAL_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def lexical_count(connection: sqlite3.Connection) -> int:
+    return int(connection.execute(f"SELECT COUNT(*) FROM {LEXICAL_TABLE}").fetchone()[0])
+
+
+def search_lexical(
+    connection: sqlite3.Connection, queries: Sequence[str], top_k: int
+) -> List[List[Tuple[int, float]]]:
+    """每个查询返回 [(vector_id, bm25)]，bm25 越小越相关（FTS5 约定）。"""
+    results: List[List[Tuple[int, float]]] = []
+    for query in queries:
+        expression = match_expression(query)
+        if not expression:
+            results.append([])
+            continue
+        rows: Iterable = connection.execute(
+            f"SELECT rowid, bm25({LEXICAL_TABLE}) FROM {LEXICAL_TABLE} "
+            f"WHERE {LEXICAL_TABLE} MATCH ? ORDER BY bm25({LEXICAL_TABLE}) LIMIT ?",
+            (expression, max(1, int(top_k))),
+        )
+        results.append([(int(vector_id), float(score)) for vector_id, score in rows])
+    return results
@@ -0,0 +1,130 @@
+"""文献元数据检索引擎：内存 SQLite FTS5 按字段加权排序，游标分页。
+
+每个领域的 MetadataService 各持有一个引擎，随元数据倒排索引一起重建；
+查询词与扩展术语按 tokenize_mixed 分词后做前缀匹配，相关度用 bm25 的列权重
+提升标题/作者/DOI 命中，年份排序走 (year_sort, rowid) 索引。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.lexical_index import query_terms, tokenize_mixed
+from services.metadata_index import MetadataSearchIndex, year_value
+
+SEARCH_FIELDS = ("title", "authors", "doi", "journal", "filename")
+# bm25 列权重，与 SEARCH_FIELDS 顺序一致。
+FIELD_WEIGHTS = (5.0, 3.0, 4.0, 1.0, 1.0)
+SORT_ORDERS = ("year", "relevance")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE papers (rowid INTEGER PRIMARY KEY, year_sort INTEGER NOT NULL);
+CREATE INDEX papers_year ON papers(year_sort, rowid);
+CREATE VIRTUAL TABLE papers_fts USING fts5(
+    title, authors, doi, journal, filename,
+    content='', prefix='2 3', tokenize="unicode61 remove_diacritics 2 tokenchars '-.'"
+);
+"""
+
+
+def _field_tokens(meta: Dict[str, Any]) -> Tuple[str, ...]:
+    authors = meta.get("authors", [])
+    authors = " ".join(str(author) for author in authors) if isinstance(authors, list) else str(authors or "")
+    values = (meta.get("title", ""), authors, meta.get("doi", ""), meta.get("journal", ""), meta.get("filename", ""))
+    return tuple(" ".join(tokenize_mixed(str(value or ""))) for value in values)
+
+
+def match_expression(terms: Iterable[str]) -> str:
+    """每个检索词内部各分词前缀 AND，检索词之间 OR；"reb m" 这类带单字母的短语按原词精确匹配。"""
+    clauses = []
+    for term in terms:
+        tokens = query_terms(term)
+        if tokens:
+            parts = (f'"{token}"' if " " in token else f'"{token}"*' for token in tokens)
+            clauses.append("(" + " AND ".join(parts) + ")")
+    return " OR ".join(dict.fromkeys(clauses))
+
+
+def encode_cursor(sort: str, key: float, rowid: int) -> str:
+    raw = json.dumps([sort, key, rowid], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[float, int]:
+    """游标与排序方式不符或无法解析时抛 ValueError。"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key, rowid = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("无效的分页游标") from exc
+    if cursor_sort != sort or not isinstance(key, (int, float)) or not isinstance(rowid, int):
+        raise ValueError("无效的分页游标")
+    return key, rowid
+
+
+class LiteratureSearchEngine:
+    def __init__(self, index: MetadataSearchIndex):
+        self.index = index
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        # rowid = 记录号 + 1；未知年份排在最后。
+        self._connection.executemany(
+            "INSERT INTO papers(rowid, year_sort) VALUES (?, ?)",
+            ((record_id + 1, -year_value(meta.get("year", "N/A"))) for record_id, (_, meta) in enumerate(index.records)),
+        )
+        self._connection.executemany(
+            "INSERT INTO papers_fts(rowid, title, authors, doi, journal, filename) VALUES (?, ?, ?, ?, ?, ?)",
+            ((record_id + 1,) + _field_tokens(meta) for record_id, (_, meta) in enumerate(index.records)),
+        )
+        self._connection.commit()
+
+    def search(
+        self,
+        terms: Iterable[str],
+        sort: str = "year",
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """返回 {"records": [(path, meta), ...], "total": 匹配总数, "next_cursor": str | None}。"""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        expression = match_expression(terms)
+        if not expression:
+            return {"records": [], "total": 0, "next_cursor": None}
+        after = decode_cursor(cursor, sort) if cursor else None
+        if sort == "year":
+            sql = (
+                "SELECT p.rowid, p.year_sort FROM papers_fts JOIN papers p ON p.rowid = papers_fts.rowid "
+                "WHERE papers_fts MATCH ?"
+                + (" AND (p.year_sort, p.rowid) > (?, ?)" if after else "")
+                + " ORDER BY p.year_sort, p.rowid LIMIT ?"
+            )
+        else:
+            weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS)
+            sql = (
+                f"SELECT rowid, score FROM (SELECT rowid, bm25(papers_fts, {weights}) AS score "
+                "FROM papers_fts WHERE papers_fts MATCH ?)"
+                + (" WHERE (score, rowid) > (?, ?)" if after else "")
+                + " ORDER BY score, rowid LIMIT ?"
+            )
+        params: List[Any] = [expression, *(after or ()), limit + 1]
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+            total = self._connection.execute(
+                "SELECT COUNT(*) FROM papers_fts WHERE papers_fts MATCH ?", (expression,)
+            ).fetchone()[0]
+        page = rows[:limit]
+        next_cursor = encode_cursor(sort, page[-1][1], page[-1][0]) if len(rows) > limit else None
+        return {
+            "records": [self.index.records[rowid - 1] for rowid, _ in page],
+            "total": int(total),
+            "next_cursor": next_cursor,
+        }
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import json
-from typing import Iterable, List, Optional
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional
 
 
 @dataclass(frozen=True)
@@ -15,31 +17,152 @@ class LLMClientError(RuntimeError):
     pass
 
 
-class DeepSeekLLMClient:
-    def __init__(self, client, model: str):
-        self._client = client
-        self._model = model
+class PrefetchedStream:
+    """Start a streaming completion in the background and read its deltas later.
 
-    def stream_chat(self, messages: List[dict], *, temperature: float, max_tokens: int) -> Iterable[ChatDelta]:
+    The request is issued immediately (on a thread, or a greenlet under gevent), so work the
+    caller does before iterating overlaps with the model's time to first token. ``close()``
+    closes the upstream stream through its own ``close()`` even while the reader is still
+    waiting for the first token; both LLM clients return streams that allow this.
+    """
+
+    _END = object()
+
+    def __init__(self, start: Callable[[], Iterable[ChatDelta]]):
+        self._start = start
+        self._deltas: "queue.Queue[object]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stream: Optional[Iterable[ChatDelta]] = None
+        self._stopped = threading.Event()
+        self._finished = False
+        threading.Thread(target=self._produce, name="llm-prefetch", daemon=True).start()
+
+    def _produce(self) -> None:
+        stream = None
         try:
-            stream = self._client.chat.completions.create(
-                model=self._model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=True,
-            )
+            stream = self._start()
+            with self._lock:
+                self._stream = stream
+            if not self._stopped.is_set():
+                for delta in stream:
+                    if self._stopped.is_set():
+                        break
+                    self._deltas.put(delta)
+        except Exception as exc:
+            if not self._stopped.is_set():
+                self._deltas.put(exc)
+        finally:
+            if self._stopped.is_set():
+                _close_quietly(stream)
+            self._deltas.put(self._END)
+
+    def __iter__(self) -> Iterator[ChatDelta]:
+        return self
+
+    def __next__(self) -> ChatDelta:
+        if self._finished:
+            raise StopIteration
+        item = self._deltas.get()
+        if item is self._END:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            self._finished = True
+            raise item
+        return item
+
+    def close(self) -> None:
+        self._finished = True
+        with self._lock:
+            self._stopped.set()
+            stream = self._stream
+        _close_quietly(stream)
+
+
+def _close_quietly(stream) -> None:
+    close = getattr(stream, "close", None)
+    if callable(close):
+        try:
+            close()
+        except ValueError:
+            # 普通生成器正在另一线程中执行时不能关闭，读线程收到下一个片段后自行关闭
+            pass
+
+
+class _CompletionStream:
+    """Iterator over an OpenAI streaming completion.
+
+    ``close()`` may be called from another thread: it closes the HTTP response, which aborts
+    a read that is still waiting for data, and releases the connection.
+    """
+
+    def __init__(self, create: Callable[[], Any]):
+        self._create = create
+        self._lock = threading.Lock()
+        self._response = None
+        self._chunks: Optional[Iterator[Any]] = None
+        self._closed = False
+
+    def __iter__(self) -> Iterator[ChatDelta]:
+        return self
+
+    def _open(self) -> None:
+        try:
+            response = self._create()
         except Exception as e:
             raise LLMClientError(str(e)) from e
+        with self._lock:
+            self._response = response
+            closed = self._closed
+        if closed:
+            response.close()
+            raise StopIteration
+        self._chunks = iter(response)
 
-        for chunk in stream:
+    def __next__(self) -> ChatDelta:
+        if self._closed:
+            raise StopIteration
+        if self._chunks is None:
+            self._open()
+        while True:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                raise
+            except Exception:
+                if self._closed:
+                    raise StopIteration
+                raise
             if not chunk.choices:
                 continue
             delta = chunk.choices[0].delta
             content = getattr(delta, "content", None) or ""
             reasoning = getattr(delta, "reasoning_content", None) or ""
             if content or reasoning:
-                yield ChatDelta(content=content, reasoning_content=reasoning)
+                return ChatDelta(content=content, reasoning_content=reasoning)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            response = self._response
+        if response is not None:
+            response.close()
+
+
+class DeepSeekLLMClient:
+    def __init__(self, client, model: str):
+        self._client = client
+        self._model = model
+
+    def stream_chat(self, messages: List[dict], *, temperature: float, max_tokens: int) -> Iterator[ChatDelta]:
+        """The request is sent on first ``next()``; ``close()`` on the result aborts it from any thread."""
+        return _CompletionStream(lambda: self._client.chat.completions.create(
+            model=self._model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        ))
 
     def chat(self, messages: List[dict], *, temperature: float, max_tokens: int) -> tuple[str, Optional[str]]:
         answer_chunks: list[str] = []
@@ -0,0 +1,175 @@
+"""PDF 元数据并行提取：进程池解析，结果按文件内容 SHA-256 缓存。
+
+缓存只存与路径无关的部分（extract_document_metadata），文件名与由文件名推断的期刊
+在取用时按当前路径补上，因此改名或移动过的文献不会被重新解析。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pdf_metadata_extractor import PDFMetadataExtractor
+
+logger = logging.getLogger(__name__)
+
+# 解析规则变化时递增，旧版本的缓存条目自动失效。
+EXTRACTOR_VERSION = "pdf-metadata-v2"
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracted_metadata (
+    sha256 TEXT NOT NULL,
+    extractor_version TEXT NOT NULL,
+    metadata_json TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (sha256, extractor_version)
+);
+"""
+_HASH_BLOCK = 1 << 20
+
+ProgressCallback = Callable[[int, int, int], None]
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """sha256 → 路径无关元数据的 SQLite 缓存，可由多个领域共用。"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_CACHE_SCHEMA)
+
+    def get_many(self, digests: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        unique = sorted(set(digests))
+        if not unique:
+            return {}
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sha256, metadata_json FROM extracted_metadata "
+                "WHERE extractor_version = ? AND sha256 IN (SELECT value FROM json_each(?))",
+                (EXTRACTOR_VERSION, json.dumps(unique)),
+            ).fetchall()
+        return {digest: json.loads(raw) for digest, raw in rows}
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO extracted_metadata(sha256, extractor_version, metadata_json, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                ((digest, EXTRACTOR_VERSION, json.dumps(meta, ensure_ascii=False), now)
+                 for digest, meta in entries.items()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_WORKER_EXTRACTOR: Optional[PDFMetadataExtractor] = None
+
+
+def _extract_document(pdf_path: str) -> Dict[str, Any]:
+    """进程池入口：每个工作进程复用一个提取器。"""
+    global _WORKER_EXTRACTOR
+    if _WORKER_EXTRACTOR is None:
+        _WORKER_EXTRACTOR = PDFMetadataExtractor()
+    return _WORKER_EXTRACTOR.extract_document_metadata(pdf_path)
+
+
+def extract_metadata_batch(
+    pdf_paths: List[str],
+    workers: int = 1,
+    cache: Optional[ExtractionCache] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    批量提取元数据，返回 {路径: 元数据}（顺序同输入；无法读取或解析失败的文件记日志后跳过）
+
+    每篇解析完成即写入缓存，进程池中途崩溃时已完成的结果不会丢失，重跑只解析剩余文件。
+    progress(已完成, 总数, 命中缓存数) 在每篇完成后回调。
+    """
+    workers = max(1, int(workers))
+    digests: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(file_sha256, path): path for path in pdf_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                digests[path] = future.result()
+            except OSError as exc:
+                logger.error(f"读取文件失败 {path}: {exc}")
+
+    by_digest: Dict[str, Dict[str, Any]] = cache.get_many(digests.values()) if cache else {}
+    cached = sum(digest in by_digest for digest in digests.values())
+    # 内容相同的文件（副本、改名）只解析一次。
+    pending = {digest: path for path, digest in digests.items() if digest not in by_digest}
+    copies = Counter(digests.values())
+    total = len(digests)
+    done = cached
+    if progress:
+        progress(done, total, cached)
+
+    def finish(digest: str, run: Callable[[], Dict[str, Any]]) -> None:
+        nonlocal done
+        try:
+            metadata = run()
+        except Exception as exc:
+            logger.error(f"元数据提取失败 {pending[digest]}: {type(exc).__name__}: {exc}")
+        else:
+            by_digest[digest] = metadata
+            if cache:
+                cache.put_many({digest: metadata})
+        done += copies[digest]
+        if progress:
+            progress(done, total, cached)
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {pool.submit(_extract_document, path): digest for digest, path in pending.items()}
+            for future in as_completed(futures):
+                finish(futures[future], future.result)
+    else:
+        for digest, path in pending.items():
+            finish(digest, lambda path=path: _extract_document(path))
+
+    finisher = PDFMetadataExtractor()
+    return {
+        path: finisher.apply_filename_fallbacks(dict(by_digest[digests[path]]), path)
+        for path in pdf_paths
+        if digests.get(path) in by_digest
+    }
+
+
+def update_build_status(index_dir: str, **updates: Any) -> None:
+    """合并写入 ``build_status.json``（scripts/rag_admin.py status 读取的同一文件）。"""
+    path = Path(index_dir) / "build_status.json"
+    try:
+        status = json.loads(path.read_text(encoding="utf-8")) if path.is_file() else {}
+    except (OSError, ValueError):
+        status = {}
+    status.update(updates, updated_at=datetime.now(timezone.utc).isoformat())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(path.suffix + ".tmp")
+    temporary.write_text(json.dumps(status, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temporary, path)
@@ -0,0 +1,147 @@
+"""元数据检索索引：按标题/文件名/期刊等字段的词段建倒排表，子串查询只核验候选记录。
+
+补充文献与各领域 ``/documents?q=`` 都是“某词是否为字段文本的子串”语义。
+查询词中的任一连续词段（英文/数字串或中文串）必然落在命中记录的某个词段之内，
+因此在去重后的词段表里找包含它的词段即可得到候选超集，再对候选逐条做原始子串判断，
+结果与全量扫描一致。
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from path_utils import normalize_for_storage
+
+_RUN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[㐀-䶿一-鿿豈-﫿]+")
+_YEAR = re.compile(r"(19|20)\d{2}")
+# 词段 → 记录集合的查询缓存上限，超出后整体清空（同一索引上的查询词高度重复）。
+_POSTING_CACHE_LIMIT = 4096
+
+
+def year_value(value: Any) -> int:
+    """从年份字段中取四位年份，取不到按 0 处理。"""
+    match = _YEAR.search(str(value))
+    return int(match.group(0)) if match else 0
+
+
+def _runs(text: str) -> List[str]:
+    return _RUN.findall((text or "").lower())
+
+
+def _index_text(path: str, meta: Dict[str, Any]) -> str:
+    """参与建索引的全部字段，含各调用方使用的缺省值，保证候选是超集。"""
+    authors = meta.get("authors", [])
+    return " ".join([
+        str(meta.get("title", "")),
+        str(meta.get("filename", "")),
+        os.path.basename(str(path)),
+        str(meta.get("journal", "")),
+        "Unknown Journal",
+        str(meta.get("year", "N/A")),
+        str(meta.get("doi", "")),
+        " ".join(str(author) for author in authors) if isinstance(authors, list) else str(authors),
+    ])
+
+
+class MetadataSearchIndex:
+    """一次构建、只读共享；元数据变化后由 MetadataService 整体重建。"""
+
+    def __init__(self, metadata_all: Dict[str, Dict[str, Any]], signature: Any = None):
+        self.signature = signature
+        self.records: List[Tuple[str, Dict[str, Any]]] = list(metadata_all.items())
+        postings: Dict[str, Set[int]] = {}
+        self._by_storage_path: Dict[str, List[int]] = {}
+        for record_id, (path, meta) in enumerate(self.records):
+            for run in set(_runs(_index_text(path, meta))):
+                postings.setdefault(run, set()).add(record_id)
+            self._by_storage_path.setdefault(normalize_for_storage(str(path)), []).append(record_id)
+        self._vocabulary: List[str] = sorted(postings)
+        self._postings: List[Set[int]] = [postings[run] for run in self._vocabulary]
+        # 词段以 \n 分隔拼成一个串，子串定位交给 str.find，再二分映射回词段序号。
+        self._blob = "\n".join(self._vocabulary)
+        self._starts: List[int] = []
+        offset = 0
+        for run in self._vocabulary:
+            self._starts.append(offset)
+            offset += len(run) + 1
+        # 与补充文献弱候选一致：按年份倒序，同年保持元数据原顺序。
+        self.year_order: List[int] = sorted(
+            range(len(self.records)),
+            key=lambda record_id: year_value(self.records[record_id][1].get("year", "N/A")),
+            reverse=True,
+        )
+        self._run_cache: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _records_containing(self, run: str) -> Set[int]:
+        cached = self._run_cache.get(run)
+        if cached is not None:
+            return cached
+        found: Set[int] = set()
+        position = self._blob.find(run)
+        while position >= 0:
+            slot = bisect.bisect_right(self._starts, position) - 1
+            found |= self._postings[slot]
+            position = self._blob.find(run, self._starts[slot] + len(self._vocabulary[slot]) + 1)
+        if len(self._run_cache) >= _POSTING_CACHE_LIMIT:
+            self._run_cache.clear()
+        self._run_cache[run] = found
+        return found
+
+    def candidates(self, needles: Iterable[str]) -> List[int]:
+        """可能以子串形式包含任一查询词的记录号（升序，即元数据原顺序）。
+
+        查询词不含任何可索引词段（如纯符号）时无法缩小范围，返回全部记录。
+        """
+        found: Set[int] = set()
+        for needle in needles:
+            if not needle:
+                continue
+            runs = _runs(needle)
+            if not runs:
+                return list(range(len(self.records)))
+            found |= self._records_containing(max(runs, key=len))
+        return sorted(found)
+
+    def search(self, needles: Sequence[str], text_of: Callable[[str, Dict[str, Any]], str]) -> List[int]:
+        """``any(needle in text_of(path, meta))`` 为真的记录号，顺序同全量扫描。"""
+        needles = [needle for needle in needles if needle]
+        if not needles:
+            return []
+        matches = []
+        for record_id in self.candidates(needles):
+            text = text_of(*self.records[record_id])
+            if any(needle in text for needle in needles):
+                matches.append(record_id)
+        return matches
+
+    def ids_for_paths(self, paths: Iterable[str]) -> List[int]:
+        """按 normalize_for_storage 后的路径取记录号（焦点文献列表用）。"""
+        ids: Set[int] = set()
+        for path in paths or ():
+            ids.update(self._by_storage_path.get(normalize_for_storage(str(path)), ()))
+        return sorted(ids)
+
+
+def metadata_signature(metadata_all: Dict[str, Dict[str, Any]]) -> Tuple[int, str]:
+    """条数加最近修改时间；MetadataStorage 每次保存都会刷新 last_modified。"""
+    latest = max((str(meta.get("last_modified", "")) for meta in metadata_all.values()), default="")
+    return len(metadata_all), latest
+
+
+def build_metadata_index(
+    metadata_all: Dict[str, Dict[str, Any]],
+    previous: Optional[MetadataSearchIndex] = None,
+    signature: Any = None,
+) -> MetadataSearchIndex:
+    """签名未变时复用旧索引，否则重建；未给出签名（如目录版本号）时由内容计算。"""
+    if signature is None:
+        signature = metadata_signature(metadata_all)
+    if previous is not None and previous.signature == signature:
+        return previous
+    return MetadataSearchIndex(metadata_all, signature)
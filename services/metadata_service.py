@@ -1,10 +1,14 @@
 """元数据查找、缓存、焦点文件列表管理"""
 
 import os
+import threading
 from pathlib import Path
 from typing import Any, Dict, Optional, Set
 
+from metadata_storage import MetadataStorage
 from path_utils import normalize_for_storage
+from services.literature_search import LiteratureSearchEngine
+from services.metadata_index import MetadataSearchIndex, build_metadata_index
 
 
 class MetadataService:
@@ -15,6 +19,9 @@ class MetadataService:
             "by_path": {},
             "by_filename": {},
         }
+        self._search_index: Optional[MetadataSearchIndex] = None
+        self._search_index_lock = threading.Lock()
+        self._literature_search: Optional[LiteratureSearchEngine] = None
 
     def get_all_metadata(self) -> Dict[str, Dict[str, Any]]:
         if not hasattr(self.rag_system, "metadata_storage"):
@@ -25,7 +32,14 @@ class MetadataService:
             return {}
         return metadata_all if isinstance(metadata_all, dict) else {}
 
+    def _catalog(self) -> Optional[MetadataStorage]:
+        storage = getattr(self.rag_system, "metadata_storage", None)
+        return storage if isinstance(storage, MetadataStorage) else None
+
     def refresh_metadata_index(self) -> None:
+        """非 MetadataStorage 的存储对象才需要在这里自建路径/文件名索引。"""
+        if self._catalog() is not None:
+            return
         metadata_all = self.get_all_metadata()
         if not metadata_all:
             self._metadata_index_cache = {"size": 0, "by_path": {}, "by_filename": {}}
@@ -50,7 +64,31 @@ class MetadataService:
             "by_filename": by_filename,
         }
 
+    def search_index(self) -> MetadataSearchIndex:
+        """元数据倒排索引，供补充文献与文献列表/搜索接口共用；元数据变化后自动重建。"""
+        catalog = self._catalog()
+        # 共享目录带版本号：版本未变时不必复制全部元数据来比较签名。
+        version = (id(catalog), catalog.version) if catalog is not None else None
+        with self._search_index_lock:
+            if version is not None and self._search_index is not None and self._search_index.signature == version:
+                return self._search_index
+        metadata_all = self.get_all_metadata()
+        with self._search_index_lock:
+            self._search_index = build_metadata_index(metadata_all, self._search_index, signature=version)
+            return self._search_index
+
+    def literature_search(self) -> LiteratureSearchEngine:
+        """/api/search 的 FTS5 检索引擎，与 search_index 同步重建。"""
+        index = self.search_index()
+        with self._search_index_lock:
+            if self._literature_search is None or self._literature_search.index is not index:
+                self._literature_search = LiteratureSearchEngine(index)
+            return self._literature_search
+
     def lookup_metadata_fast(self, file_path: str) -> Optional[Dict[str, Any]]:
+        catalog = self._catalog()
+        if catalog is not None:
+            return catalog.find_metadata(file_path)
         self.refresh_metadata_index()
         by_path = self._metadata_index_cache.get("by_path", {})
 
@@ -68,6 +106,18 @@ class MetadataService:
             return by_filename[filename]
         return None
 
+    def lookup_document_features(self, document_ids) -> Dict[str, Dict[str, Any]]:
+        """紧凑索引构建时预计算的文献元数据与静态排序特征；旧索引返回空字典。"""
+        index = getattr(self.rag_system, "index", None)
+        lookup = getattr(index, "document_features", None)
+        if not callable(lookup):
+            return {}
+        try:
+            features = lookup(document_ids)
+        except Exception:
+            return {}
+        return features if isinstance(features, dict) else {}
+
     @staticmethod
     def load_focus_filelist(filepath: str) -> Set[str]:
         out: Set[str] = set()
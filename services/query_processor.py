@@ -1,12 +1,57 @@
 """查询分析、信号提取、复杂度估计"""
 
 import re
-from typing import Any, Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from services.rag_types import QueryAnalysis
+from services.signal_matcher import SignalMatcher
 
 
 class QueryProcessor:
-    def __init__(self, query_expander: Any):
+    def __init__(self, query_expander: Any, cache_size: Optional[int] = None):
         self.query_expander = query_expander
+        self.cache_size = config.QUERY_ANALYSIS_CACHE_SIZE if cache_size is None else max(0, int(cache_size))
+        self._analysis_cache: "OrderedDict[tuple, QueryAnalysis]" = OrderedDict()
+        self._analysis_lock = threading.Lock()
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return " ".join((question or "").split())
+
+    def analyze(self, question: str, target_min: int, target_max: int) -> QueryAnalysis:
+        """每个请求只做一次查询分析；相同（规范化后）问题跨请求复用。"""
+        normalized = self.normalize_question(question)
+        key = (normalized, int(target_min), int(target_max))
+        with self._analysis_lock:
+            cached = self._analysis_cache.get(key)
+            if cached is not None:
+                self._analysis_cache.move_to_end(key)
+                return cached
+
+        expansion = self.query_expander.expand_query(normalized) if self.query_expander else {}
+        expansion = expansion or {}
+        expanded_query = expansion["search_query"] if expansion.get("expanded_terms") else normalized
+        window_min, window_max = self.adaptive_reference_window(normalized, target_min, target_max)
+        analysis = QueryAnalysis(
+            question=normalized,
+            expansion=expansion,
+            expanded_query=expanded_query,
+            signals=self.get_query_signals(normalized, expansion),
+            variants=self.build_query_variants(expanded_query, normalized),
+            complexity=self.estimate_query_complexity(normalized),
+            target_min=window_min,
+            target_max=window_max,
+        )
+        if self.cache_size:
+            with self._analysis_lock:
+                self._analysis_cache[key] = analysis
+                self._analysis_cache.move_to_end(key)
+                while len(self._analysis_cache) > self.cache_size:
+                    self._analysis_cache.popitem(last=False)
+        return analysis
 
     def build_query_variants(self, expanded_query: str, original_question: str) -> List[str]:
         variants: List[str] = []
@@ -51,16 +96,21 @@ class QueryProcessor:
     def normalize_signal_term(term: str) -> str:
         return (term or "").strip().lower()
 
-    def get_query_signals(self, query: str) -> Dict[str, Any]:
+    def get_query_signals(self, query: str, expansion: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         base_tokens = self.extract_topic_tokens(query)
         terms = {self.normalize_signal_term(t) for t in base_tokens if len(self.normalize_signal_term(t)) >= 2}
         protein_concepts: List[str] = []
         matched_concepts_raw: List[str] = []
         concept_aliases: Dict[str, List[str]] = {}
 
-        if self.query_expander and hasattr(self.query_expander, "expand_query"):
+        if expansion is None and self.query_expander and hasattr(self.query_expander, "expand_query"):
+            try:
+                expansion = self.query_expander.expand_query(query) or {}
+            except Exception:
+                expansion = {}
+        if expansion:
             try:
-                expanded = self.query_expander.expand_query(query) or {}
+                expanded = expansion
                 matched_concepts = expanded.get("matched_concepts", []) or []
                 matched_concepts_raw = [str(c) for c in matched_concepts if str(c).strip()]
                 expanded_terms = expanded.get("expanded_terms", []) or []
@@ -86,14 +136,20 @@ class QueryProcessor:
             except Exception:
                 pass
 
+        sorted_terms = sorted(t for t in terms if t)
         return {
-            "terms": sorted(t for t in terms if t),
+            "terms": sorted_terms,
             "protein_concepts": sorted(set(protein_concepts)),
             "matched_concepts_raw": matched_concepts_raw,
             "concept_aliases": concept_aliases,
+            # 每个查询编译一次，供各阶段对 chunk/参考文献/元数据逐条打分复用
+            "matcher": SignalMatcher(sorted_terms, concept_aliases),
         }
 
     def reference_overlap_score(self, ref_text: str, signals: Dict[str, Any]) -> Tuple[int, int]:
+        matcher = signals.get("matcher")
+        if isinstance(matcher, SignalMatcher):
+            return matcher.count(ref_text)
         terms = signals.get("terms", [])
         concept_aliases = signals.get("concept_aliases", {})
         overlap = sum(1 for t in terms if t in ref_text)
@@ -8,7 +8,7 @@ from typing import Any, Dict, Optional, Set
 
 from config import config
 from services.query_processor import QueryProcessor
-from services.rag_types import RetrievalResult, StageTrace
+from services.rag_types import QueryAnalysis, RetrievalResult, StageTrace
 from services.reference_selector import ReferenceSelector
 from services.retrieval_service import RetrievalService
 
@@ -49,21 +49,31 @@ class RAGPipeline:
         similarity_threshold: float,
         max_results: int,
         question: str,
+        analysis: Optional[QueryAnalysis] = None,
     ) -> RetrievalResult:
         started = time.perf_counter()
-        signals = self.query_processor.get_query_signals(question)
-        target_min, target_max = self.query_processor.adaptive_reference_window(
-            question, self.target_min, self.target_max
-        )
+        # 扩展、信号、变体与参考文献窗口每个请求只分析一次，各阶段共用
+        if analysis is None:
+            analysis = self.query_processor.analyze(question, self.target_min, self.target_max)
+        signals = analysis.signals
+        target_min, target_max = analysis.target_min, analysis.target_max
         top_k_goal = max(int(max_results), self.max_top_k, target_max * 5)
         top_k = min(max(1, top_k_goal), self.hard_top_k)
-        variants = self.query_processor.build_query_variants(expanded_query, question)
+        if expanded_query == analysis.expanded_query:
+            variants = analysis.variants
+        else:
+            variants = self.query_processor.build_query_variants(expanded_query, question)
         retrieved = self.retrieval_service.retrieve_chunks_multi_query(variants, top_k)
         valid = [chunk for chunk in retrieved if getattr(chunk, "text", None)]
         retrieve_trace = StageTrace(
             "retrieval",
             (time.perf_counter() - started) * 1000,
-            {"query_variants": variants, "raw_chunks": len(retrieved), "valid_chunks": len(valid)},
+            {
+                "query_variants": variants,
+                "raw_chunks": len(retrieved),
+                "valid_chunks": len(valid),
+                "lexical_chunks": sum(isinstance(getattr(chunk, "lexical_rank", None), int) for chunk in valid),
+            },
         )
 
         selection_started = time.perf_counter()
@@ -72,7 +82,9 @@ class RAGPipeline:
         selected = self.retrieval_service.diversify_chunks(filtered, target_max)
         unique = self.retrieval_service.deduplicate_chunks(selected)
 
-        while len(unique) < target_min and threshold > self.min_threshold:
+        # 有词法索引时，精确词项命中已随 RRF 融合直接保留，不再逐步降低阈值补召回。
+        lexical = self.retrieval_service.has_lexical_index() is True
+        while not lexical and len(unique) < target_min and threshold > self.min_threshold:
             threshold = max(self.min_threshold, threshold - self.threshold_step)
             filtered = self.retrieval_service.filter_chunks(valid, threshold, signals, self.dual_focus_files)
             selected = self.retrieval_service.diversify_chunks(filtered, target_max)
@@ -92,6 +104,7 @@ class RAGPipeline:
             target_max,
             self.dual_focus_files,
             self.allow_weak_supplement,
+            signals=signals,
         )
         keep_paths = {ref["file_path"] for ref in references}
         unique = {path: info for path, info in unique.items() if path in keep_paths}
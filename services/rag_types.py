@@ -24,6 +24,20 @@ def stable_chunk_id(chunk: Any, file_path: str = "") -> str:
     return hashlib.sha256(seed.encode("utf-8")).hexdigest()[:24]
 
 
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """Everything derived from the question alone; computed once and shared by every stage."""
+
+    question: str
+    expansion: Dict[str, Any]
+    expanded_query: str
+    signals: Dict[str, Any]
+    variants: List[str]
+    complexity: float
+    target_min: int
+    target_max: int
+
+
 @dataclass
 class StageTrace:
     name: str
@@ -2,7 +2,7 @@
 
 import os
 import re
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from path_utils import normalize_for_storage
 from services.query_processor import QueryProcessor
@@ -23,11 +23,13 @@ class RankingService:
         return references_ranked
 
     def apply_topic_boundary(self, references: List[Dict[str, Any]], original_query: str,
-                             dual_focus_files: Set[str] = None) -> List[Dict[str, Any]]:
+                             dual_focus_files: Set[str] = None,
+                             signals: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         if not references:
             return references
 
-        signals = self.query_processor.get_query_signals(original_query)
+        if signals is None:
+            signals = self.query_processor.get_query_signals(original_query)
         topic_terms = signals.get("terms", [])
         if not topic_terms:
             return references
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set
 
 from services.context_builder import ContextBuilder
 from services.ranking_service import RankingService
@@ -28,11 +28,14 @@ class ReferenceSelector:
         target_max: int,
         dual_focus_files: Set[str],
         allow_weak_supplement: bool,
+        signals: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
         papers = sorted(unique_papers.values(), key=lambda paper: paper["max_score"], reverse=True)
         references = self.context_builder.build_references_raw(papers)
         references = self.ranking_service.rank_references(references)
-        references = self.ranking_service.apply_topic_boundary(references, question, dual_focus_files)
+        references = self.ranking_service.apply_topic_boundary(
+            references, question, dual_focus_files, signals=signals
+        )
         for reference in references:
             reference["source_type"] = "retrieved"
             reference["supplemented"] = False
@@ -43,6 +46,7 @@ class ReferenceSelector:
             question,
             dual_focus_files=dual_focus_files,
             allow_weak=allow_weak_supplement,
+            signals=signals,
         )
         return references[:target_max]
 
@@ -0,0 +1,407 @@
+"""Streaming offline builder for compact FAISS + SQLite releases.
+
+文本抽取（进程池）→ 句子切分 → 大批量嵌入三个阶段以有界队列串联，每批嵌入结果
+直接追加到 release 目录下的暂存向量文件并写入 chunks.sqlite；已完成文件与向量行数
+在同一事务里记入 build_state，中断后以同一 version 重跑即从断点续建。
+流水线内存只取决于队列长度与批大小，与语料规模无关，FAISS 索引在最后一步由暂存向量组装。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+
+from services.compact_index import CHUNKS_SCHEMA
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+
+LOGGER = logging.getLogger(__name__)
+STAGING_VECTORS_FILE = "vectors.staging.f32"
+DEFAULT_EMBED_BATCH_SIZE = 256
+DEFAULT_QUEUE_SIZE = 8
+_FILE_STATE_PREFIX = "file:"
+_INSERT_CHUNK_SQL = (
+    "INSERT INTO chunks(vector_id, chunk_id, document_id, file_path, filename, page, text, metadata_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_FLAT_ADD_ROWS = 65536
+_QUEUE_POLL_SECONDS = 0.2
+_DONE = object()
+
+EmbedFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+@dataclass
+class ExtractedFile:
+    file_path: str
+    digest: str = ""
+    file_size: int = 0
+    # (页码, 文本)；非 PDF 文档页码为 None
+    pages: List[Tuple[Optional[int], str]] = field(default_factory=list)
+    error: str = ""
+
+
+@dataclass
+class FileChunks:
+    file_path: str
+    rows: List[Tuple[str, str, str, str, Optional[int], str, str]] = field(default_factory=list)
+    error: str = ""
+
+
+def _pdf_pages(file_path: str) -> List[Tuple[Optional[int], str]]:
+    if fitz is None:
+        from pypdf import PdfReader
+
+        reader = PdfReader(file_path)
+        return [(number, page.extract_text() or "") for number, page in enumerate(reader.pages, 1)]
+    doc = fitz.open(file_path)
+    try:
+        return [(number, page.get_text()) for number, page in enumerate(doc, 1)]
+    finally:
+        doc.close()
+
+
+def _reader_pages(file_path: str) -> List[Tuple[Optional[int], str]]:
+    from llama_index.core import SimpleDirectoryReader
+
+    pages = []
+    for document in SimpleDirectoryReader(input_files=[file_path]).load_data():
+        try:
+            page = int((document.metadata or {}).get("page_label"))
+        except (TypeError, ValueError):
+            page = None
+        pages.append((page, document.get_content()))
+    return pages
+
+
+def extract_file_text(file_path: str) -> ExtractedFile:
+    """进程池入口：PDF 按页抽取，其余格式交给 SimpleDirectoryReader；失败记入 error 而不抛出。"""
+    try:
+        data = Path(file_path).read_bytes()
+        pages = _pdf_pages(file_path) if file_path.lower().endswith(".pdf") else _reader_pages(file_path)
+    except Exception as exc:
+        return ExtractedFile(file_path, error=f"{type(exc).__name__}: {exc}")
+    return ExtractedFile(file_path, hashlib.sha256(data).hexdigest(), len(data), pages)
+
+
+def default_splitter():
+    """与 PersistentRAGSystem / 增量段相同的切分参数。"""
+    from llama_index.core.node_parser import SentenceSplitter
+
+    return SentenceSplitter(
+        chunk_size=512,
+        chunk_overlap=50,
+        paragraph_separator="\n\n",
+        secondary_chunking_regex="[^,.;。？！]+[,.;。？！]?",
+    )
+
+
+def split_file(extracted: ExtractedFile, splitter: Any) -> FileChunks:
+    if extracted.error:
+        return FileChunks(extracted.file_path, error=extracted.error)
+    file_path = extracted.file_path
+    filename = os.path.basename(file_path)
+    file_type = mimetypes.guess_type(file_path)[0]
+    rows = []
+    for page, text in extracted.pages:
+        for piece in splitter.split_text(text or ""):
+            if not piece.strip():
+                continue
+            metadata = {"file_path": file_path, "file_name": filename, "file_size": extracted.file_size}
+            if file_type:
+                metadata["file_type"] = file_type
+            if page is not None:
+                metadata["page_label"] = str(page)
+            # 路径 + 序号决定 chunk_id，续建或重建同一文件时保持不变。
+            chunk_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{file_path}#{len(rows)}"))
+            rows.append((
+                chunk_id, extracted.digest, file_path, filename, page, piece,
+                json.dumps(metadata, ensure_ascii=False, separators=(",", ":")),
+            ))
+    return FileChunks(file_path, rows)
+
+
+def _put(target: "queue.Queue", item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _iter_queue(source: "queue.Queue", stop: threading.Event) -> Iterator[Any]:
+    while not stop.is_set():
+        try:
+            item = source.get(timeout=_QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _set_state(connection: sqlite3.Connection, key: str, value: Any) -> None:
+    connection.execute(
+        "INSERT INTO build_state(key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (key, json.dumps(value, ensure_ascii=False)),
+    )
+
+
+def _get_state(connection: sqlite3.Connection, key: str, default: Any = None) -> Any:
+    row = connection.execute("SELECT value FROM build_state WHERE key=?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+class ReleaseBuilder:
+    """把一批文件流式写入 ``release`` 目录；同一目录再次运行时跳过 build_state 中已完成的文件。
+
+    ``embed_signature`` 标识嵌入模型，续建时与已写入的向量不一致会直接报错。
+    """
+
+    def __init__(
+        self,
+        release: str | Path,
+        embed_fn: EmbedFunction,
+        *,
+        workers: int = 1,
+        embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        splitter: Any = None,
+        embed_signature: str = "",
+    ):
+        self.release = Path(release)
+        self.embed_fn = embed_fn
+        self.workers = max(1, int(workers))
+        self.embed_batch_size = max(1, int(embed_batch_size))
+        self.queue_size = max(1, int(queue_size))
+        self.splitter = splitter
+        self.embed_signature = embed_signature
+        self.database_path = self.release / "chunks.sqlite"
+        self.staging_path = self.release / STAGING_VECTORS_FILE
+
+    def connect(self) -> sqlite3.Connection:
+        self.release.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database_path)
+        connection.executescript(CHUNKS_SCHEMA)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def completed_files(self, connection: sqlite3.Connection) -> Set[str]:
+        rows = connection.execute("SELECT key FROM build_state WHERE substr(key, 1, ?) = ?",
+                                  (len(_FILE_STATE_PREFIX), _FILE_STATE_PREFIX))
+        return {key[len(_FILE_STATE_PREFIX):] for (key,) in rows}
+
+    def _restore(self, connection: sqlite3.Connection) -> Tuple[int, int]:
+        """按已提交的行数截断暂存向量文件（丢弃中断时写了一半的批次）。"""
+        rows = int(_get_state(connection, "vector_rows", 0))
+        dimension = int(_get_state(connection, "dimension", 0))
+        signature = _get_state(connection, "embed_signature")
+        if signature is not None and signature != self.embed_signature:
+            raise ValueError(f"embedding model changed since the build started: {signature!r} != {self.embed_signature!r}")
+        expected = rows * dimension * 4
+        size = self.staging_path.stat().st_size if self.staging_path.exists() else 0
+        if size < expected:
+            raise ValueError(f"staging vectors are truncated: {size} bytes < {expected}")
+        if size > expected or not self.staging_path.exists():
+            with self.staging_path.open("ab") as handle:
+                handle.truncate(expected)
+        committed = int(connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0])
+        if committed != rows:
+            raise ValueError(f"build state mismatch: chunks={committed}, vector_rows={rows}")
+        return rows, dimension
+
+    def _extract(self, files: Sequence[str], output: "queue.Queue", stop: threading.Event) -> None:
+        if self.workers == 1:
+            for file_path in files:
+                if not _put(output, extract_file_text(file_path), stop):
+                    return
+            return
+        # 在途任务数不超过队列长度，进程池不会无限预取。
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight: Set[Any] = set()
+            try:
+                for file_path in files:
+                    if stop.is_set():
+                        return
+                    in_flight.add(pool.submit(extract_file_text, file_path))
+                    if len(in_flight) >= self.workers + self.queue_size:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            if not _put(output, future.result(), stop):
+                                return
+                while in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        if not _put(output, future.result(), stop):
+                            return
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _split(self, source: "queue.Queue", output: "queue.Queue", stop: threading.Event) -> None:
+        splitter = self.splitter or default_splitter()
+        for extracted in _iter_queue(source, stop):
+            if not _put(output, split_file(extracted, splitter), stop):
+                return
+
+    def _stage(self, target: Callable[..., None], args: tuple, output: "queue.Queue", stop: threading.Event,
+               errors: List[BaseException]) -> threading.Thread:
+        def run() -> None:
+            try:
+                target(*args)
+            except BaseException as exc:  # 交给写入线程抛出
+                errors.append(exc)
+            finally:
+                _put(output, _DONE, stop)
+
+        thread = threading.Thread(target=run, name=f"release-{target.__name__.strip('_')}", daemon=True)
+        thread.start()
+        return thread
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            vectors.extend(self.embed_fn(texts[start:start + self.embed_batch_size]))
+        matrix = np.asarray(vectors, dtype="float32")
+        if matrix.ndim != 2 or matrix.shape != (len(texts), matrix.shape[1]) or not matrix.shape[1]:
+            raise ValueError(f"invalid embedding batch: shape {matrix.shape} for {len(texts)} texts")
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def _commit(self, connection: sqlite3.Connection, batch: List[FileChunks], rows: int, dimension: int) -> Tuple[int, int]:
+        texts = [row[5] for item in batch for row in item.rows]
+        vectors = self._embed(texts) if texts else np.zeros((0, dimension), dtype="float32")
+        if texts:
+            if dimension and vectors.shape[1] != dimension:
+                raise ValueError(f"mixed vector dimensions: {vectors.shape[1]} != {dimension}")
+            dimension = int(vectors.shape[1])
+            # 先落盘向量再提交事务：中断后多出的尾部向量会被 _restore 截掉。
+            with self.staging_path.open("ab") as handle:
+                handle.write(vectors.tobytes())
+                handle.flush()
+                os.fsync(handle.fileno())
+        vector_id = rows
+        for item in batch:
+            connection.executemany(
+                _INSERT_CHUNK_SQL,
+                [(vector_id + offset, *row) for offset, row in enumerate(item.rows)],
+            )
+            vector_id += len(item.rows)
+            state = {"chunks": len(item.rows)}
+            if item.error:
+                state["error"] = item.error
+            _set_state(connection, _FILE_STATE_PREFIX + item.file_path, state)
+        _set_state(connection, "vector_rows", vector_id)
+        _set_state(connection, "dimension", dimension)
+        _set_state(connection, "embed_signature", self.embed_signature)
+        connection.commit()
+        return vector_id, dimension
+
+    def run(self, files: Sequence[str], progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """处理 ``files`` 中尚未完成的文件，返回累计统计（含跳过的不可读文件）。"""
+        connection = self.connect()
+        try:
+            rows, dimension = self._restore(connection)
+            done = self.completed_files(connection)
+            pending = [file_path for file_path in dict.fromkeys(files) if file_path not in done]
+            stats = {"files_total": len(done) + len(pending), "files_done": len(done), "chunks": rows}
+            if progress:
+                progress(dict(stats))
+            stop = threading.Event()
+            errors: List[BaseException] = []
+            extracted: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+            split: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+            threads = [
+                self._stage(self._extract, (pending, extracted, stop), extracted, stop, errors),
+                self._stage(self._split, (extracted, split, stop), split, stop, errors),
+            ]
+            try:
+                batch: List[FileChunks] = []
+                batch_chunks = 0
+                for item in _iter_queue(split, stop):
+                    if errors:
+                        break
+                    if item.error:
+                        LOGGER.warning("Skipping unreadable file %s: %s", item.file_path, item.error)
+                    batch.append(item)
+                    batch_chunks += len(item.rows)
+                    if batch_chunks >= self.embed_batch_size:
+                        rows, dimension = self._commit(connection, batch, rows, dimension)
+                        stats.update(files_done=stats["files_done"] + len(batch), chunks=rows)
+                        batch, batch_chunks = [], 0
+                        if progress:
+                            progress(dict(stats))
+                if errors:
+                    raise errors[0]
+                if batch:
+                    rows, dimension = self._commit(connection, batch, rows, dimension)
+                    stats.update(files_done=stats["files_done"] + len(batch), chunks=rows)
+                    if progress:
+                        progress(dict(stats))
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+            if errors:
+                raise errors[0]
+        finally:
+            connection.close()
+        stats["skipped_files"] = self.skipped_files()
+        stats["dimension"] = dimension
+        return stats
+
+    def skipped_files(self) -> List[Dict[str, str]]:
+        connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        try:
+            skipped = []
+            for key, raw in connection.execute("SELECT key, value FROM build_state"):
+                if key.startswith(_FILE_STATE_PREFIX):
+                    state = json.loads(raw)
+                    if state.get("error"):
+                        skipped.append({"file": key[len(_FILE_STATE_PREFIX):], "reason": state["error"]})
+            return skipped
+        finally:
+            connection.close()
+
+    def write_flat_index(self) -> Tuple[int, int]:
+        """由暂存向量分块组装精确内积索引 vectors.faiss，返回 (向量数, 维度)。"""
+        connection = sqlite3.connect(self.database_path)
+        try:
+            rows = int(_get_state(connection, "vector_rows", 0))
+            dimension = int(_get_state(connection, "dimension", 0))
+        finally:
+            connection.close()
+        if not rows or not dimension:
+            raise ValueError("no vectors were built")
+        vectors = np.memmap(self.staging_path, dtype="float32", mode="r", shape=(rows, dimension))
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        for start in range(0, rows, _FLAT_ADD_ROWS):
+            block = np.ascontiguousarray(vectors[start:start + _FLAT_ADD_ROWS])
+            index.add_with_ids(block, np.arange(start, start + len(block), dtype="int64"))
+        del vectors
+        faiss.write_index(index, str(self.release / "vectors.faiss"))
+        return int(index.ntotal), dimension
+
+    def discard_staging(self) -> None:
+        self.staging_path.unlink(missing_ok=True)
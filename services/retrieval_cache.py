@@ -0,0 +1,133 @@
+"""检索结果的进程内 LRU 缓存（每个知识域一个）。
+
+同一问题、阈值、结果数与索引版本下 ``RAGPipeline.retrieve`` 的输出是确定的；命中时直接
+反序列化 ``RetrievalResult``，跳过嵌入、FAISS 检索与参考文献筛选。条目以 pickle 字节保存
+（紧凑索引的惰性元数据按普通 dict 序列化），调用方修改返回值不会污染缓存；每个条目含数百段
+原文，因此除条数外还按 pickle 总字节数淘汰。无法还原的条目视为未命中并移除；
+索引版本（``compact/current`` release 或增量段）变化时整域清空。
+"""
+
+from __future__ import annotations
+
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
+from services.rag_types import RetrievalResult
+
+CacheKey = Tuple[str, str, float, int]
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 0):
+        """max_bytes 为所有条目 pickle 字节数之和的上限，0 表示只限条数。"""
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.index_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(question: str, expanded_query: str, similarity_threshold: float, max_results: int) -> CacheKey:
+        return (question, expanded_query, round(float(similarity_threshold), 4), int(max_results))
+
+    def _sync_version(self, index_version: str) -> None:
+        if index_version != self.index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.index_version = index_version
+
+    def get(self, index_version: str, key: CacheKey) -> Optional[RetrievalResult]:
+        with self._lock:
+            self._sync_version(index_version)
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            result = pickle.loads(blob)
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is blob:
+                    del self._entries[key]
+                    self._bytes -= len(blob)
+                self.errors += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, index_version: str, key: CacheKey, result: RetrievalResult) -> None:
+        if self.max_entries <= 0:
+            return
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._sync_version(index_version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            if self.max_bytes and len(blob) > self.max_bytes:
+                return
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "index_version": self.index_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_SHARED_LOCK = threading.Lock()
+_SHARED: Dict[str, RetrievalCache] = {}
+
+
+def shared_retrieval_cache(domain: str) -> Optional[RetrievalCache]:
+    """按知识域共享的缓存；RETRIEVAL_CACHE_SIZE 为 0 时关闭（返回 None）。"""
+    if config.RETRIEVAL_CACHE_SIZE <= 0:
+        return None
+    with _SHARED_LOCK:
+        cache = _SHARED.get(domain)
+        if cache is None:
+            cache = _SHARED[domain] = RetrievalCache(
+                config.RETRIEVAL_CACHE_SIZE, config.RETRIEVAL_CACHE_MAX_MB * 1024 * 1024
+            )
+        return cache
+
+
+def retrieval_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _SHARED_LOCK:
+        caches = dict(_SHARED)
+    return {domain: cache.stats() for domain, cache in caches.items()}
@@ -1,7 +1,9 @@
 """多查询检索、过滤、去重、多样化"""
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
+from config import config
 from path_utils import normalize_for_storage
 from services.query_processor import QueryProcessor
 from services.rag_types import stable_chunk_id, stable_document_id
@@ -17,15 +19,14 @@ class RetrievalService:
         if not queries:
             return []
         per_query_top_k = max(40, top_k // len(queries))
+        retriever = self.rag_system.index.as_retriever(similarity_top_k=per_query_top_k)
+        if getattr(retriever, 'has_lexical', False) is True:
+            dense, lexical = self._retrieve_hybrid(retriever, queries, per_query_top_k)
+            return self._fuse_rrf(dense + lexical)[:top_k]
         merged: Dict[str, Any] = {}
-        for q in queries:
-            retriever = self.rag_system.index.as_retriever(similarity_top_k=per_query_top_k)
-            for chunk in retriever.retrieve(q):
-                metadata = getattr(chunk, 'metadata', {}) or {}
-                file_path = metadata.get('file_path') or metadata.get('file_name') or ''
-                chunk_text = getattr(chunk, 'text', '') or ''
-                node_id = getattr(chunk, 'node_id', None) or getattr(getattr(chunk, 'node', None), 'node_id', None)
-                key = str(node_id or stable_chunk_id(chunk, file_path))
+        for chunks in self._retrieve_variants(queries, per_query_top_k, retriever):
+            for chunk in chunks:
+                key = self._chunk_key(chunk)
                 prev = merged.get(key)
                 if prev is None:
                     merged[key] = chunk
@@ -38,15 +39,69 @@ class RetrievalService:
         merged_chunks.sort(key=lambda c: float(getattr(c, 'score', 0) or 0), reverse=True)
         return merged_chunks[:top_k]
 
+    def has_lexical_index(self) -> bool:
+        return getattr(getattr(self.rag_system, 'index', None), 'has_lexical', False) is True
+
+    def _retrieve_variants(self, queries: List[str], per_query_top_k: int, retriever: Any = None) -> List[List[Any]]:
+        if retriever is None:
+            retriever = self.rag_system.index.as_retriever(similarity_top_k=per_query_top_k)
+        # Compact/hybrid retrievers embed every variant in one encode() and run one matrix search;
+        # legacy LlamaIndex retrievers keep the per-variant path.
+        if callable(getattr(type(retriever), 'retrieve_many', None)):
+            return retriever.retrieve_many(queries)
+        return [retriever.retrieve(q) for q in queries]
+
+    def _retrieve_hybrid(self, retriever: Any, queries: List[str], per_query_top_k: int):
+        """FAISS 与 FTS5 并行检索；词法命中在向量检索结束后按精确余弦补分。"""
+        lexical_top_k = max(1, int(getattr(config, 'RAG_LEXICAL_TOP_K', 20)))
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='hybrid-retrieval') as pool:
+            lexical_future = pool.submit(retriever.search_lexical, queries, lexical_top_k)
+            dense = retriever.retrieve_many(queries)
+            lexical_hits = lexical_future.result()
+        return dense, retriever.hydrate_lexical(queries, lexical_hits)
+
+    def _fuse_rrf(self, ranked_lists: List[List[Any]]) -> List[Any]:
+        """Reciprocal rank fusion：score(d) = Σ 1 / (k + rank)，向量/词法每个变体各算一路。"""
+        rrf_k = max(1, int(getattr(config, 'RAG_RRF_K', 60)))
+        fused: Dict[str, float] = {}
+        chunks: Dict[str, Any] = {}
+        for ranked in ranked_lists:
+            for rank, chunk in enumerate(ranked, 1):
+                key = self._chunk_key(chunk)
+                fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+                prev = chunks.get(key)
+                if prev is None:
+                    chunks[key] = chunk
+                    continue
+                lexical_rank = getattr(chunk, 'lexical_rank', None)
+                if isinstance(lexical_rank, int) and getattr(prev, 'lexical_rank', None) is None:
+                    prev.lexical_rank = lexical_rank
+                if float(getattr(chunk, 'score', 0) or 0) > float(getattr(prev, 'score', 0) or 0):
+                    prev.score = chunk.score
+        return [chunks[key] for key in sorted(fused, key=fused.get, reverse=True)]
+
+    @staticmethod
+    def _chunk_key(chunk: Any) -> str:
+        metadata = getattr(chunk, 'metadata', {}) or {}
+        file_path = metadata.get('file_path') or metadata.get('file_name') or ''
+        node_id = getattr(chunk, 'node_id', None) or getattr(getattr(chunk, 'node', None), 'node_id', None)
+        return str(node_id or stable_chunk_id(chunk, file_path))
+
     def filter_chunks(self, chunks, threshold: float, signals: Optional[Dict[str, Any]] = None,
                       dual_focus_files=None) -> List[Any]:
         filtered = []
+        bypass_rank = int(getattr(config, 'RAG_LEXICAL_BYPASS_RANK', 5))
         for chunk in chunks:
             try:
                 score = float(chunk.score) if hasattr(chunk, 'score') else 0.0
             except (TypeError, ValueError):
                 score = 0.0
-            if score >= threshold or self._chunk_matches_signals(chunk, signals, dual_focus_files):
+            lexical_rank = getattr(chunk, 'lexical_rank', None)
+            if (
+                score >= threshold
+                or (isinstance(lexical_rank, int) and lexical_rank <= bypass_rank)
+                or self._chunk_matches_signals(chunk, signals, dual_focus_files)
+            ):
                 filtered.append(chunk)
         return filtered
 
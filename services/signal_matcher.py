@@ -0,0 +1,79 @@
+"""查询信号多模式匹配：每个查询编译一次，单遍扫描文本得到词项/概念命中数。"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """把词表折叠成前缀树形状的正则，每个起点只沿共同前缀走一次。"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # 贪婪可选：同一起点优先取最长词，较短的前缀词由包含闭包补回。
+        return f"(?:{body})?" if "" in node else body
+
+    return render(trie)
+
+
+class SignalMatcher:
+    """等价于逐词 ``term in text`` 与逐概念别名检查，但每段文本只扫描一遍。
+
+    安装了 pyahocorasick 时使用 Aho-Corasick 自动机；否则退化为前缀树正则，
+    以零宽前瞻在每个位置取最长命中词。一个词出现则它包含的所有词也必然出现，
+    因此预先为每个词算好 (词项位掩码, 概念位掩码) 的包含闭包，命中后按位或即可。
+    """
+
+    def __init__(self, terms: Iterable[str], concept_aliases: Mapping[str, Iterable[str]]):
+        self.terms: List[str] = sorted({term for term in terms if term})
+        self.concepts: List[List[str]] = [sorted({alias for alias in aliases if alias})
+                                          for aliases in concept_aliases.values()]
+        patterns = sorted(set(self.terms).union(*self.concepts), key=len, reverse=True)
+        self._masks: Dict[str, Tuple[int, int]] = {}
+        for pattern in patterns:
+            term_mask = sum(1 << bit for bit, term in enumerate(self.terms) if term in pattern)
+            concept_mask = sum(
+                1 << bit for bit, aliases in enumerate(self.concepts) if any(alias in pattern for alias in aliases)
+            )
+            self._masks[pattern] = (term_mask, concept_mask)
+        self._automaton = None
+        self._regex = None
+        if patterns and ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pattern, masks in self._masks.items():
+                self._automaton.add_word(pattern, masks)
+            self._automaton.make_automaton()
+        elif patterns:
+            self._regex = re.compile(f"(?=({_trie_pattern(patterns)}))")
+
+    def count(self, text: str) -> Tuple[int, int]:
+        """返回 (命中的词项数, 命中的概念数)。"""
+        if not text:
+            return 0, 0
+        if self._automaton is not None:
+            hits = {masks for _, masks in self._automaton.iter(text)}
+        elif self._regex is not None:
+            hits = {self._masks[found] for found in set(self._regex.findall(text))}
+        else:
+            return 0, 0
+        term_bits = 0
+        concept_bits = 0
+        for term_mask, concept_mask in hits:
+            term_bits |= term_mask
+            concept_bits |= concept_mask
+        return term_bits.bit_count(), concept_bits.bit_count()
@@ -1,10 +1,9 @@
 """文献补充至目标下限"""
 
 import os
-import re
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set
 
-from path_utils import normalize_for_storage
+from services.metadata_index import year_value
 from services.metadata_service import MetadataService
 from services.query_processor import QueryProcessor
 from services.rag_types import stable_document_id
@@ -22,64 +21,79 @@ class SupplementService:
         original_query: str,
         dual_focus_files: Set[str] = None,
         allow_weak: bool = True,
+        signals: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
         if len(references) >= target_min:
             return references
-        metadata_all = self.metadata_service.get_all_metadata()
-        if not metadata_all:
+        index = self.metadata_service.search_index()
+        if not len(index):
             return references
-        signals = self.query_processor.get_query_signals(original_query)
+        if signals is None:
+            signals = self.query_processor.get_query_signals(original_query)
         existing_paths = {str(ref.get("file_path", "")) for ref in references}
         existing_titles = {str(ref.get("title", "")).lower() for ref in references}
-        strong_candidates: List[Dict[str, Any]] = []
-        weak_candidates: List[Dict[str, Any]] = []
         dual_focus_mode = dual_focus_files and self.query_processor.is_dual_quinoa_soy_query(signals)
+        focus_ids = set(index.ids_for_paths(dual_focus_files)) if dual_focus_mode else set()
 
-        for path, meta in metadata_all.items():
+        def _excluded(path: str, meta: Dict[str, Any]) -> bool:
+            return str(path) in existing_paths or str(meta.get("title", "")).lower() in existing_titles
+
+        # 只有包含某个查询词/概念别名的记录才可能有重叠分，其余记录无需逐条打分。
+        needles = list(signals.get("terms", []))
+        for aliases in signals.get("concept_aliases", {}).values():
+            needles.extend(aliases)
+        strong_candidates = []
+        strong_ids = set()
+        for record_id in sorted(focus_ids.union(index.candidates(needles))):
+            path, meta = index.records[record_id]
+            if _excluded(path, meta):
+                continue
             title = str(meta.get("title", ""))
             filename = str(meta.get("filename", ""))
             journal = str(meta.get("journal", "Unknown Journal"))
             text = " ".join([title, filename, journal]).lower()
             overlap, concept_hits = self.query_processor.reference_overlap_score(text, signals)
-            if str(path) in existing_paths or title.lower() in existing_titles:
-                continue
-
-            candidate = {
-                "ref_id": "ref_0",
-                "journal": journal or "Unknown Journal",
-                "year": str(meta.get("year", "N/A")),
-                "title": title or filename or "Unknown Title",
-                "authors": meta.get("authors", []) if isinstance(meta.get("authors", []), list) else [],
-                "doi": str(meta.get("doi", "Not Available")),
-                "filename": filename or os.path.basename(str(path)),
-                "file_path": str(path),
-                "document_id": stable_document_id(str(path)),
-                "score": 0.04 + 0.01 * overlap,
-                "final_score": 0.04 + 0.01 * overlap,
-                "content": "",
-                "source_type": "metadata_supplement",
-                "supplemented": True,
-            }
-            is_focus = dual_focus_mode and normalize_for_storage(str(path)) in dual_focus_files
+            is_focus = record_id in focus_ids
             if is_focus or overlap > 0 or concept_hits > 0:
-                strong_candidates.append((is_focus, concept_hits, overlap, candidate))
-            else:
-                weak_candidates.append(candidate)
-
-        def _year_val(v: str) -> int:
-            m = re.search(r"(19|20)\d{2}", str(v))
-            return int(m.group(0)) if m else 0
+                strong_ids.add(record_id)
+                strong_candidates.append((is_focus, concept_hits, overlap, self._candidate(path, meta, overlap)))
 
-        strong_candidates.sort(key=lambda c: (c[0], c[1], c[2], _year_val(c[3].get("year", "0"))), reverse=True)
-        weak_candidates.sort(key=lambda c: _year_val(c.get("year", "0")), reverse=True)
+        strong_candidates.sort(key=lambda c: (c[0], c[1], c[2], year_value(c[3].get("year", "0"))), reverse=True)
 
         needed = max(0, target_min - len(references))
         if needed > 0:
             supplements: List[Dict[str, Any]] = [c[3] for c in strong_candidates[:needed]]
             if allow_weak and len(supplements) < needed:
-                supplements.extend(weak_candidates[:needed - len(supplements)])
+                for record_id in index.year_order:
+                    if len(supplements) >= needed:
+                        break
+                    path, meta = index.records[record_id]
+                    if record_id not in strong_ids and not _excluded(path, meta):
+                        supplements.append(self._candidate(path, meta, 0))
             references = references + supplements
 
         for idx, ref in enumerate(references, 1):
             ref["ref_id"] = f"ref_{idx}"
         return references
+
+    @staticmethod
+    def _candidate(path: str, meta: Dict[str, Any], overlap: int) -> Dict[str, Any]:
+        title = str(meta.get("title", ""))
+        filename = str(meta.get("filename", ""))
+        journal = str(meta.get("journal", "Unknown Journal"))
+        return {
+            "ref_id": "ref_0",
+            "journal": journal or "Unknown Journal",
+            "year": str(meta.get("year", "N/A")),
+            "title": title or filename or "Unknown Title",
+            "authors": meta.get("authors", []) if isinstance(meta.get("authors", []), list) else [],
+            "doi": str(meta.get("doi", "Not Available")),
+            "filename": filename or os.path.basename(str(path)),
+            "file_path": str(path),
+            "document_id": stable_document_id(str(path)),
+            "score": 0.04 + 0.01 * overlap,
+            "final_score": 0.04 + 0.01 * overlap,
+            "content": "",
+            "source_type": "metadata_supplement",
+            "supplemented": True,
+        }
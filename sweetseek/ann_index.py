@@ -0,0 +1,336 @@
+"""
+FAISS 近似最近邻索引构建与检索参数
+
+所有索引均使用内积度量（向量已 L2 归一化，等价于余弦相似度）：
+- flat:      IndexFlatIP，精确检索，O(N·d)
+- ivf_flat:  IndexIVFFlat，倒排聚类，检索 nprobe 个簇
+- hnsw_flat: IndexHNSWFlat，图索引，由 efSearch 控制召回/延迟
+- ivf_pq:    IndexIVFPQ，倒排 + 乘积量化，内存最小
+
+quantizer=sq8/pq 时向量以 8bit 标量量化或乘积量化编码保存，检索后由
+ExactReranker 从 float32 旁路 memmap 取回候选向量做精确重排。
+"""
+
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw_flat", "ivf_pq")
+QUANTIZERS = ("none", "sq8", "pq")
+DEFAULT_RERANK_FACTOR = 4
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+# 量化索引（sq8/pq）附带的 float32 旁路向量，用于候选精确重排。
+RERANK_VECTORS_FILE = "rerank_vectors.npy"
+RERANK_IDS_FILE = "rerank_ids.npy"
+# 训练样本上限：IVF 聚类每簇约 256 个点即可收敛，更多只会拖慢构建。
+MAX_TRAINING_POINTS = 256 * 1024
+
+
+def default_nlist(count: int) -> int:
+    """经验值 4·sqrt(N)，并保证每个簇至少约 39 个训练点。"""
+    if count <= 0:
+        return 1
+    return max(1, min(int(4 * math.sqrt(count)), count // 39 or 1))
+
+
+def _default_pq_m(dimension: int) -> int:
+    return next(m for m in (64, 48, 32, 24, 16, 8, 4, 2, 1) if m <= dimension and dimension % m == 0)
+
+
+def _training_sample(vectors: np.ndarray, seed: int = 7) -> np.ndarray:
+    if vectors.shape[0] <= MAX_TRAINING_POINTS:
+        return vectors
+    rows = np.random.default_rng(seed).choice(vectors.shape[0], MAX_TRAINING_POINTS, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def _pq_params(dimension: int, count: int, pq_m: int, pq_bits: int) -> Tuple[int, int]:
+    pq_m = int(pq_m) or _default_pq_m(dimension)
+    if dimension % pq_m:
+        raise ValueError(f"pq_m={pq_m} must divide dimension {dimension}")
+    # PQ 每个子空间需要至少 2^bits 个训练点，小语料自动降位。
+    return pq_m, max(1, min(int(pq_bits), int(math.log2(max(2, count)))))
+
+
+def build_ann_index(
+    vectors: np.ndarray,
+    ids: Optional[np.ndarray] = None,
+    index_type: str = "flat",
+    *,
+    quantizer: str = "none",
+    nlist: int = 0,
+    nprobe: int = DEFAULT_NPROBE,
+    hnsw_m: int = DEFAULT_HNSW_M,
+    ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+    ef_search: int = DEFAULT_EF_SEARCH,
+    pq_m: int = 0,
+    pq_bits: int = 8,
+) -> Tuple["faiss.Index", Dict[str, Any]]:
+    """训练并填充索引，返回 (索引, 需写入 manifest 的参数)。
+
+    Args:
+        vectors: 已归一化的 float32 矩阵 (N, d)
+        ids: 外部向量 ID；给定时外层包 IndexIDMap2，否则以行号为 ID
+        quantizer: none / sq8 / pq，向量编码方式（ivf_pq 固定为 pq）
+    """
+    if faiss is None:
+        raise ImportError("需要安装faiss-cpu: pip install faiss-cpu")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"unsupported index type: {index_type!r} (expected one of {', '.join(INDEX_TYPES)})")
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"unsupported quantizer: {quantizer!r} (expected one of {', '.join(QUANTIZERS)})")
+    if index_type == "ivf_pq":
+        index_type, quantizer = "ivf_flat", "pq"
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count, dimension = vectors.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+    params: Dict[str, Any] = {"index_type": "ivf_pq" if index_type == "ivf_flat" and quantizer == "pq" else index_type}
+    if quantizer != "none":
+        params["quantizer"] = quantizer
+    if quantizer == "pq":
+        pq_m, pq_bits = _pq_params(dimension, count, pq_m, pq_bits)
+        params.update({"pq_m": pq_m, "pq_bits": pq_bits})
+
+    if index_type == "flat":
+        if quantizer == "sq8":
+            inner = faiss.IndexScalarQuantizer(dimension, sq8, metric)
+        elif quantizer == "pq":
+            inner = faiss.IndexPQ(dimension, pq_m, pq_bits, metric)
+        else:
+            inner = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw_flat":
+        if quantizer == "sq8":
+            inner = faiss.IndexHNSWSQ(dimension, sq8, int(hnsw_m), metric)
+        elif quantizer == "pq":
+            inner = faiss.IndexHNSWPQ(dimension, pq_m, int(hnsw_m), pq_bits, metric)
+        else:
+            inner = faiss.IndexHNSWFlat(dimension, int(hnsw_m), metric)
+        inner.hnsw.efConstruction = int(ef_construction)
+        inner.hnsw.efSearch = int(ef_search)
+        params.update({"hnsw_m": int(hnsw_m), "efConstruction": int(ef_construction), "efSearch": int(ef_search)})
+    else:
+        nlist = min(int(nlist) or default_nlist(count), max(1, count))
+        coarse = faiss.IndexFlatIP(dimension)
+        if quantizer == "sq8":
+            inner = faiss.IndexIVFScalarQuantizer(coarse, dimension, nlist, sq8, metric)
+        elif quantizer == "pq":
+            inner = faiss.IndexIVFPQ(coarse, dimension, nlist, pq_m, pq_bits, metric)
+        else:
+            inner = faiss.IndexIVFFlat(coarse, dimension, nlist, metric)
+        inner.nprobe = max(1, min(int(nprobe), nlist))
+        params.update({"nlist": nlist, "nprobe": int(inner.nprobe)})
+    if not inner.is_trained:
+        inner.train(_training_sample(vectors))
+
+    if ids is None:
+        inner.add(vectors)
+        return inner, params
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index, params
+
+
+def apply_search_params(
+    index: "faiss.Index",
+    *,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Dict[str, int]:
+    """在加载时设置 nprobe/efSearch（检索开始前调用一次，之后只读、线程安全）。"""
+    applied: Dict[str, int] = {}
+    if nprobe:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = max(1, min(int(nprobe), int(ivf.nlist)))
+            applied["nprobe"] = int(ivf.nprobe)
+    if ef_search:
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        hnsw = getattr(inner, "hnsw", None)
+        if hnsw is not None:
+            hnsw.efSearch = int(ef_search)
+            applied["efSearch"] = int(ef_search)
+    return applied
+
+
+def flat_vectors(index: "faiss.Index") -> Tuple[np.ndarray, np.ndarray]:
+    """从 IndexIDMap2(IndexFlat) 中取回 (向量矩阵, ID)。"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if not isinstance(inner, faiss.IndexFlat):
+        raise ValueError(f"expected a flat index, got {type(inner).__name__}")
+    vectors = faiss.rev_swig_ptr(inner.get_xb(), inner.ntotal * inner.d).reshape(inner.ntotal, inner.d).copy()
+    if isinstance(index, faiss.IndexIDMap):
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+    else:
+        ids = np.arange(inner.ntotal, dtype="int64")
+    return vectors, ids
+
+
+def index_vectors(index: "faiss.Index") -> Tuple[np.ndarray, np.ndarray]:
+    """取回索引中的全部 (向量, ID)；非 flat 索引通过 reconstruct 还原（PQ 为近似值）。"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexFlat):
+        return flat_vectors(index)
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        ivf.make_direct_map()
+    vectors = inner.reconstruct_n(0, inner.ntotal)
+    if isinstance(index, faiss.IndexIDMap):
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+    else:
+        ids = np.arange(inner.ntotal, dtype="int64")
+    return np.asarray(vectors, dtype="float32"), ids
+
+
+def recall_at_k(
+    exact: "faiss.Index",
+    approx: "faiss.Index",
+    queries: np.ndarray,
+    k: int = 10,
+    reranker: Optional["ExactReranker"] = None,
+    query_ids: Optional[np.ndarray] = None,
+) -> float:
+    """近似索引（可带精确重排）相对精确索引的 recall@k（两者 top-k 的 ID 交集比例）。
+
+    query_ids 给定时为留一法：查询取自索引本身，两侧结果先剔除查询向量自己再取 top-k，
+    否则自匹配会把召回率抬高。
+    """
+    if queries.shape[0] == 0:
+        return 1.0
+    held_out = query_ids is not None
+    k = max(1, min(int(k), int(exact.ntotal) - held_out))
+    depth = k + held_out
+    _, truth = exact.search(queries, depth)
+    if reranker is None:
+        _, found = approx.search(queries, depth)
+    else:
+        _, candidates = approx.search(queries, reranker.candidate_k(depth))
+        _, found = reranker.rerank(queries, candidates, depth)
+    hits = total = 0
+    for row, (row_truth, row_found) in enumerate(zip(truth, found)):
+        skip = {-1, int(query_ids[row])} if held_out else {-1}
+        row_truth = [int(i) for i in row_truth if int(i) not in skip][:k]
+        row_found = [int(i) for i in row_found if int(i) not in skip][:k]
+        hits += len(set(row_truth) & set(row_found))
+        total += len(row_truth)
+    return hits / total if total else 1.0
+
+
+def load_recall_questions(path) -> List[str]:
+    """读取评测问题：每行一个问题的文本文件，或 evaluation/questions 格式的 JSON 列表。"""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() != ".json":
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    items = json.loads(text)
+    if isinstance(items, dict):
+        items = items.get("questions") or items.get("items") or []
+    questions = [item if isinstance(item, str) else (item or {}).get("question", "") for item in items]
+    return [question.strip() for question in questions if question and question.strip()]
+
+
+def approximate_from_flat(
+    faiss_path,
+    index_type: str = "flat",
+    *,
+    quantizer: str = "none",
+    keep_ids: bool = True,
+    rerank_factor: int = DEFAULT_RERANK_FACTOR,
+    recall_k: int = 10,
+    recall_queries: int = 1000,
+    query_vectors: Optional[np.ndarray] = None,
+    **build_params,
+) -> Dict[str, Any]:
+    """把 faiss_path 处的精确 flat 索引原地替换为 ANN/量化索引，返回需写入 manifest 的参数。
+
+    keep_ids=False 时新索引以行号为 ID（hybrid 索引按位置对应 index.ids.txt）。量化索引在同目录
+    写出 float32 旁路文件供 ExactReranker 精确重排。recall@k 用 query_vectors（真实问题嵌入）
+    评估；未给出时从索引中抽样做留一法评估。
+    """
+    if index_type == "flat" and quantizer == "none":
+        return {"index_type": "flat"}
+    faiss_path = Path(faiss_path)
+    exact = faiss.read_index(str(faiss_path))
+    vectors, ids = flat_vectors(exact)
+    order = np.argsort(ids, kind="stable")
+    vectors, ids = vectors[order], ids[order]
+    approx, params = build_ann_index(
+        vectors, ids if keep_ids else None, index_type, quantizer=quantizer, **build_params
+    )
+    reranker = None
+    if params.get("quantizer"):
+        np.save(faiss_path.with_name(RERANK_VECTORS_FILE), vectors)
+        np.save(faiss_path.with_name(RERANK_IDS_FILE), ids)
+        factor = max(1, int(rerank_factor))
+        params["rerank"] = {"vectors": RERANK_VECTORS_FILE, "ids": RERANK_IDS_FILE, "factor": factor}
+        reranker = ExactReranker(
+            faiss_path.with_name(RERANK_VECTORS_FILE), faiss_path.with_name(RERANK_IDS_FILE), factor
+        )
+    if query_vectors is not None and len(query_vectors):
+        queries = np.ascontiguousarray(query_vectors, dtype="float32")
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries, query_ids, source = queries / norms, None, "questions"
+    else:
+        sample = min(len(vectors), max(1, int(recall_queries)))
+        rows = np.sort(np.random.default_rng(13).choice(len(vectors), sample, replace=False))
+        queries, query_ids, source = vectors[rows], ids[rows], "held_out"
+    recall = recall_at_k(exact, approx, queries, recall_k, reranker, query_ids)
+    params["recall_report"] = {
+        "k": int(recall_k), "queries": int(len(queries)), "query_source": source, "recall": round(recall, 4),
+    }
+    faiss.write_index(approx, str(faiss_path))
+    logger.info(
+        "ANN %s/%s recall@%d=%.4f over %d %s queries",
+        params["index_type"], params.get("quantizer", "none"), recall_k, recall, len(queries), source,
+    )
+    return params
+
+
+class ExactReranker:
+    """用 float32 旁路 memmap 对量化索引的候选做精确内积重排。
+
+    vectors_path / ids_path 为 np.save 写出的 (N, d) float32 矩阵与升序 int64 ID；
+    以 mmap 打开，只有候选行会被换入内存。
+    """
+
+    def __init__(self, vectors_path, ids_path, factor: int = DEFAULT_RERANK_FACTOR):
+        self.vectors = np.load(str(vectors_path), mmap_mode="r")
+        self.ids = np.load(str(ids_path), mmap_mode="r")
+        self.factor = max(1, int(factor))
+
+    def candidate_k(self, top_k: int) -> int:
+        return max(1, int(top_k)) * self.factor
+
+    def rerank(self, queries: np.ndarray, candidate_ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        top_k = max(1, int(top_k))
+        scores = np.full((len(queries), top_k), -np.inf, dtype="float32")
+        ids = np.full((len(queries), top_k), -1, dtype="int64")
+        for row, (query, candidates) in enumerate(zip(queries, candidate_ids)):
+            candidates = candidates[candidates >= 0]
+            if not len(candidates):
+                continue
+            positions = np.searchsorted(self.ids, candidates)
+            positions = np.clip(positions, 0, len(self.ids) - 1)
+            known = self.ids[positions] == candidates
+            candidates, positions = candidates[known], positions[known]
+            order = np.argsort(positions)
+            exact = np.asarray(self.vectors[positions[order]], dtype="float32") @ query
+            best = np.argsort(-exact, kind="stable")[:top_k]
+            scores[row, :len(best)] = exact[best]
+            ids[row, :len(best)] = candidates[order][best]
+        return scores, ids
@@ -6,11 +6,13 @@ from dataclasses import dataclass
 import json
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence
 
 import numpy as np
 import faiss
 
+from persistent_storage import embed_query_batch
+from sweetseek.ann_index import RERANK_IDS_FILE, RERANK_VECTORS_FILE, ExactReranker, apply_search_params
 from sweetseek.hybrid_retriever_v2 import HybridRetriever
 
 
@@ -29,6 +31,8 @@ class HybridNode:
 class HybridNodeWithScore:
     node: HybridNode
     score: float
+    # 词法（FTS5）命中的名次；None 表示仅由向量检索召回
+    lexical_rank: Optional[int] = None
 
     @property
     def text(self) -> str:
@@ -46,7 +50,8 @@ class HybridNodeWithScore:
 class HybridIndexAdapter:
     """Expose the subset of ``VectorStoreIndex`` consumed by the RAG pipeline."""
 
-    def __init__(self, index_dir: str | Path, embed_model: Any):
+    def __init__(self, index_dir: str | Path, embed_model: Any, *, nprobe: int = 0, ef_search: int = 0):
+        """nprobe/ef_search 为 0 时沿用构建时写入索引的检索参数。"""
         self.index_dir = Path(index_dir)
         self.embed_model = embed_model
         manifest_path = self.index_dir / "manifest.json"
@@ -70,6 +75,14 @@ class HybridIndexAdapter:
             raise ValueError("SQLite chunk count does not match the chunk ID mapping")
         if int(self.manifest.get("chunk_count", -1)) != len(self.retriever.doc_ids):
             raise ValueError("Manifest chunk count does not match the chunk ID mapping")
+        self.search_params = apply_search_params(self.retriever.faiss_index, nprobe=nprobe, ef_search=ef_search)
+        rerank = self.manifest.get("rerank")
+        if rerank:
+            self.retriever.reranker = ExactReranker(
+                self.index_dir / RERANK_VECTORS_FILE, self.index_dir / RERANK_IDS_FILE, int(rerank.get("factor", 4))
+            )
+            if self.retriever.reranker.vectors.shape != (len(self.retriever.doc_ids), self.embedding_dim):
+                raise ValueError("Rerank vectors do not match the FAISS index")
         self._top_k = 10
         self.storage_context = SimpleNamespace(docstore=SimpleNamespace(docs={}))
 
@@ -80,14 +93,22 @@ class HybridIndexAdapter:
         return clone
 
     def retrieve(self, query: str) -> List[HybridNodeWithScore]:
-        vector = np.asarray(self.embed_model.get_query_embedding(query), dtype=np.float32)
-        rows = self.retriever.retrieve(vector, top_k=self._top_k, similarity_threshold=-1.0)
+        return self.retrieve_many([query])[0]
+
+    def retrieve_many(self, queries: Sequence[str]) -> List[List[HybridNodeWithScore]]:
+        if not queries:
+            return []
+        vectors = np.asarray(embed_query_batch(self.embed_model, list(queries)), dtype=np.float32)
+        batches = self.retriever.retrieve_batch(vectors, top_k=self._top_k, similarity_threshold=-1.0)
         return [
-            HybridNodeWithScore(
-                HybridNode(row.get("content", ""), row.get("metadata") or {}, row["doc_id"]),
-                float(row.get("score", 0.0)),
-            )
-            for row in rows
+            [
+                HybridNodeWithScore(
+                    HybridNode(row.get("content", ""), row.get("metadata") or {}, row["doc_id"]),
+                    float(row.get("score", 0.0)),
+                )
+                for row in rows
+            ]
+            for rows in batches
         ]
 
     def stats(self) -> Dict[str, Any]:
@@ -96,4 +117,7 @@ class HybridIndexAdapter:
             "total_documents": self.retriever.metadata_db.count(),
             "chunk_count": self.retriever.metadata_db.count(),
             "embedding_dimension": self.embedding_dim,
+            "ann_index_type": self.manifest.get("index_type", "flat"),
+            "ann_search_params": dict(self.search_params),
+            "rerank": self.retriever.reranker is not None,
         }
@@ -39,6 +39,7 @@ try:
 except ImportError:
     faiss = None
 
+from sweetseek.ann_index import build_ann_index
 from sweetseek.metadata_db import MetadataDB
 
 logger = logging.getLogger(__name__)
@@ -74,18 +75,26 @@ class HybridRetriever:
 
         # FAISS索引(延迟加载)
         self.faiss_index: Optional[faiss.Index] = None
+        # 量化索引的精确重排器（按行号取 float32 旁路向量），由加载方设置
+        self.reranker = None
         self.doc_ids: List[str] = []  # 与FAISS索引对应的文档ID列表
 
     def build_index(
         self,
         documents: List[Dict],
-        embeddings: np.ndarray
-    ):
+        embeddings: np.ndarray,
+        index_type: str = "flat",
+        **ann_params,
+    ) -> Dict:
         """构建FAISS索引和SQLite元数据存储
 
         Args:
             documents: 文档列表 [{"doc_id": "xxx", "content": "xxx", "metadata": {...}}, ...]
             embeddings: 对应的向量矩阵 (N, embedding_dim)
+            index_type: flat / ivf_flat / hnsw_flat / ivf_pq，其余参数见 sweetseek.ann_index.build_ann_index
+
+        Returns:
+            索引参数（index_type、nlist、nprobe、efSearch 等）
         """
         if len(documents) != embeddings.shape[0]:
             raise ValueError(f"文档数量({len(documents)})与向量数量({embeddings.shape[0]})不匹配")
@@ -93,12 +102,12 @@ class HybridRetriever:
         logger.info(f"开始构建混合索引: {len(documents)}条文档")
 
         # Step 1: 构建FAISS索引
-        logger.info("构建FAISS索引...")
-        self.faiss_index = faiss.IndexFlatIP(self.embedding_dim)  # 内积相似度
-
+        logger.info(f"构建FAISS索引({index_type})...")
         # 归一化向量(使内积等价于余弦相似度)
         embeddings_normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        self.faiss_index.add(embeddings_normalized.astype(np.float32))
+        self.faiss_index, index_params = build_ann_index(
+            embeddings_normalized.astype(np.float32), None, index_type, **ann_params
+        )
 
         # 保存FAISS索引
         self.faiss_index_path.parent.mkdir(parents=True, exist_ok=True)
@@ -117,6 +126,7 @@ class HybridRetriever:
         self.metadata_db.insert_batch(documents)
 
         logger.info(f"✅ 混合索引构建完成: FAISS({len(self.doc_ids)}条) + SQLite({self.metadata_db.count()}条)")
+        return index_params
 
     def load_index(self):
         """加载已有的FAISS索引和ID映射"""
@@ -153,39 +163,71 @@ class HybridRetriever:
         Returns:
             [{"doc_id": "xxx", "content": "xxx", "metadata": {...}, "score": 0.xx}, ...]
         """
-        if self.faiss_index is None:
-            self.load_index()
-
-        # Step 1: FAISS向量检索
-        query_normalized = query_embedding / np.linalg.norm(query_embedding)
-        query_normalized = query_normalized.astype(np.float32).reshape(1, -1)
-
-        scores, indices = self.faiss_index.search(query_normalized, top_k)
-        scores = scores[0]  # (top_k,)
-        indices = indices[0]  # (top_k,)
-
-        # 过滤低于阈值的结果
-        valid_mask = scores >= similarity_threshold
-        scores = scores[valid_mask]
-        indices = indices[valid_mask]
-
-        if len(indices) == 0:
-            logger.warning(f"没有找到相似度 >= {similarity_threshold} 的结果")
-            return []
+        query_embedding = np.asarray(query_embedding).reshape(1, -1)
+        return self.retrieve_batch(query_embedding, top_k, similarity_threshold)[0]
 
-        # Step 2: 获取对应的文档ID
-        retrieved_doc_ids = [self.doc_ids[idx] for idx in indices]
+    def retrieve_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 10,
+        similarity_threshold: float = 0.3
+    ) -> List[List[Dict]]:
+        """多查询混合检索: 一次多行FAISS检索 → 每个查询一次SQLite查询
 
-        # Step 3: 从SQLite查询完整文档
-        documents = self.metadata_db.get_by_ids(retrieved_doc_ids)
+        Args:
+            query_embeddings: 查询向量矩阵 (num_queries, embedding_dim)
+            top_k: 每个查询返回Top-K结果
+            similarity_threshold: 相似度阈值
 
-        # Step 4: 添加相似度分数
-        doc_id_to_score = dict(zip(retrieved_doc_ids, scores))
-        for doc in documents:
-            doc["score"] = float(doc_id_to_score[doc["doc_id"]])
+        Returns:
+            与查询顺序一致的结果列表，每项格式同 ``retrieve``
+        """
+        if self.faiss_index is None:
+            self.load_index()
 
-        logger.info(f"检索到 {len(documents)} 条结果 (阈值={similarity_threshold})")
-        return documents
+        # Step 1: FAISS向量检索（多行矩阵一次完成）
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries_normalized = np.ascontiguousarray(queries / norms, dtype=np.float32)
+
+        if self.reranker is None:
+            all_scores, all_indices = self.faiss_index.search(queries_normalized, top_k)
+        else:
+            _, candidates = self.faiss_index.search(queries_normalized, self.reranker.candidate_k(top_k))
+            all_scores, all_indices = self.reranker.rerank(queries_normalized, candidates, top_k)
+
+        results: List[List[Dict]] = []
+        for scores, indices in zip(all_scores, all_indices):
+            # 过滤低于阈值的结果
+            valid_mask = (scores >= similarity_threshold) & (indices >= 0)
+            scores = scores[valid_mask]
+            indices = indices[valid_mask]
+
+            if len(indices) == 0:
+                logger.warning(f"没有找到相似度 >= {similarity_threshold} 的结果")
+                results.append([])
+                continue
+
+            # Step 2: 获取对应的文档ID
+            retrieved_doc_ids = [self.doc_ids[idx] for idx in indices]
+
+            # Step 3: 从SQLite查询完整文档
+            documents = self.metadata_db.get_by_ids(retrieved_doc_ids)
+
+            # Step 4: 添加相似度分数
+            doc_id_to_score = dict(zip(retrieved_doc_ids, scores))
+            for doc in documents:
+                doc["score"] = float(doc_id_to_score[doc["doc_id"]])
+            results.append(documents)
+
+        logger.info(
+            f"检索到 {sum(len(docs) for docs in results)} 条结果 "
+            f"(查询数={len(results)}, 阈值={similarity_threshold})"
+        )
+        return results
 
     def get_stats(self) -> Dict:
         """获取索引统计信息"""
@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(tmp_path, monkeypatch):
+    """嵌入缓存与答案缓存默认持久化在 SweetSeek_paper_database 下，测试中改到临时目录；
+    进程内检索结果缓存每个测试重新开始。"""
+    from config import config
+    from services import retrieval_cache
+
+    monkeypatch.setattr(config, "EMBED_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite"))
+    monkeypatch.setattr(config, "ANSWER_CACHE_PATH", str(tmp_path / "answer_cache.sqlite"))
+    monkeypatch.setattr(retrieval_cache, "_SHARED", {})
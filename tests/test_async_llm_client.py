@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from services.async_llm_client import AsyncDeepSeekLLMClient
+from services.llm_client import DeepSeekLLMClient, LLMClientError, PrefetchedStream
+
+
+class _StubLLMServer:
+    """本地 OpenAI 兼容桩服务：按 SSE 分块返回，记录并发数与客户端连接。"""
+
+    def __init__(self, chunks=("Hello", " world"), delay=0.0, first_byte_delay=0.0, status=200):
+        self.chunks = chunks
+        self.delay = delay
+        self.first_byte_delay = first_byte_delay
+        self.status = status
+        self.requests = []
+        self.peers = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append(body)
+                    stub.peers.add(self.client_address)
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    if stub.status != 200:
+                        payload = b'{"error": "overloaded"}'
+                        self.send_response(stub.status)
+                        self.send_header("Content-Length", str(len(payload)))
+                        self.end_headers()
+                        self.wfile.write(payload)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    time.sleep(stub.first_byte_delay)
+                    self._write_chunk(b": keep-alive\n\n")
+                    self._write_chunk(b'data: {"choices": [{"delta": {"reasoning_content": "think"}}]}\n\n')
+                    for text in stub.chunks:
+                        time.sleep(stub.delay)
+                        event = {"choices": [{"delta": {"content": text}}]}
+                        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self._write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(_StubLLMServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _client(server, **kwargs):
+    return AsyncDeepSeekLLMClient("test-key", server.url, "stub-model", **kwargs)
+
+
+def test_stream_chat_parses_sse_and_reuses_one_keepalive_connection(stub_server):
+    server = stub_server()
+    client = _client(server)
+    messages = [{"role": "user", "content": "hi"}]
+
+    deltas = list(client.stream_chat(messages, temperature=0.6, max_tokens=50))
+    assert [(delta.content, delta.reasoning_content) for delta in deltas] == [
+        ("", "think"), ("Hello", ""), (" world", ""),
+    ]
+    assert client.chat(messages, temperature=0.6, max_tokens=50) == ("Hello world", "think")
+    assert server.requests[0] == {
+        "model": "stub-model", "messages": messages, "temperature": 0.6, "max_tokens": 50, "stream": True,
+    }
+    assert len(server.peers) == 1
+    client.close()
+
+
+def test_concurrent_streams_are_capped_by_the_inflight_semaphore(stub_server):
+    server = stub_server(chunks=("a", "b", "c"), delay=0.05)
+    client = _client(server, max_inflight=2, max_connections=4)
+
+    def ask(index):
+        return client.chat([{"role": "user", "content": str(index)}], temperature=0, max_tokens=10)[0]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        answers = list(pool.map(ask, range(8)))
+    assert answers == ["abc"] * 8
+    assert server.max_active == 2
+    assert len(server.peers) <= 2
+    assert client.inflight == 0
+    client.close()
+
+
+def test_deadline_and_http_errors_raise_llm_client_error(stub_server):
+    slow = stub_server(first_byte_delay=1.0)
+    client = _client(slow, max_inflight=1)
+    started = time.monotonic()
+    with pytest.raises(LLMClientError, match="deadline"):
+        list(client.stream_chat([], temperature=0, max_tokens=10, deadline=0.2))
+    assert time.monotonic() - started < 0.9
+    assert client.inflight == 0
+    client.close()
+
+    failing = _client(stub_server(status=503))
+    with pytest.raises(LLMClientError, match="HTTP 503"):
+        failing.chat([], temperature=0, max_tokens=10)
+    failing.close()
+
+
+def test_closing_a_prefetched_stream_cancels_the_request_before_the_first_token(stub_server):
+    server = stub_server(first_byte_delay=2.0)
+    client = _client(server)
+    deltas = PrefetchedStream(lambda: client.stream_chat([], temperature=0, max_tokens=10))
+    deadline = time.monotonic() + 2
+    while client.inflight == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.inflight == 1
+
+    started = time.monotonic()
+    deltas.close()
+    while client.inflight and time.monotonic() - started < 1:
+        time.sleep(0.01)
+    assert client.inflight == 0
+    assert time.monotonic() - started < 1
+    assert list(deltas) == []
+    client.close()
+
+
+class _BlockingResponse:
+    """模拟 OpenAI 流式响应：迭代阻塞到 ``close()`` 为止，关闭后读操作报错。"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        self.closed.wait(5)
+        raise RuntimeError("response closed")
+
+    def close(self):
+        self.closed.set()
+
+
+def test_closing_a_prefetched_openai_stream_closes_the_http_response():
+    response = _BlockingResponse()
+    requested = threading.Event()
+
+    def create(**kwargs):
+        requested.set()
+        return response
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    deltas = PrefetchedStream(lambda: DeepSeekLLMClient(fake, "stub-model").stream_chat(
+        [], temperature=0, max_tokens=10,
+    ))
+    assert requested.wait(2)
+    time.sleep(0.05)
+
+    deltas.close()
+    assert response.closed.is_set()
+    assert list(deltas) == []
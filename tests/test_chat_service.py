@@ -71,7 +71,7 @@ class TestChatService(unittest.TestCase):
         self.assertEqual(result['references'][0]['ref_id'], 'ref_1')
         
         # Verify interactions
-        self.query_expander.expand_query.assert_called_with("test question")
+        self.query_expander.expand_query.assert_called_once_with("test question")
         mock_retriever.retrieve.assert_called()
         self.llm_client.chat.assert_called()
 
@@ -92,5 +92,20 @@ class TestChatService(unittest.TestCase):
         self.assertIn("未检索到相关文献", result['answer'])
         self.assertEqual(len(result['references']), 0)
 
+    def test_query_is_analyzed_once_and_memoized(self):
+        self.query_expander.expand_query.return_value = {
+            'search_query': 'query',
+            'expanded_terms': [],
+            'matched_concepts': []
+        }
+        mock_retriever = MagicMock()
+        mock_retriever.retrieve.return_value = []
+        self.rag_system.index.as_retriever.return_value = mock_retriever
+
+        self.chat_service.ask("test  question")
+        self.assertEqual(self.query_expander.expand_query.call_count, 1)
+        self.chat_service.ask(" test question ")
+        self.assertEqual(self.query_expander.expand_query.call_count, 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,13 +1,18 @@
+import copy
 import json
+import pickle
 import sys
 from pathlib import Path
 
 import faiss
+import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+from config import config
 from scripts.maintenance import convert_proteoglycan_compact as converter
-from services.compact_index import CompactIndex, resolve_current_release, verify_release
+from services.compact_index import CompactIndex, LazyChunkMetadata, resolve_current_release, verify_release
+from sweetseek.ann_index import approximate_from_flat
 
 
 def _node(node_id: str, document_id: str, filename: str, text: str):
@@ -96,3 +101,511 @@ def test_converter_rejects_missing_chunk_mapping(tmp_path, monkeypatch):
         assert "incomplete mapping" in str(exc)
     else:
         raise AssertionError("incomplete mapping must fail conversion")
+
+
+def _build_release(tmp_path, monkeypatch):
+    source = tmp_path / "legacy"
+    source.mkdir()
+    nodes = {
+        "node-a": _node("node-a", "doc-a", "a.pdf", "alpha protein polysaccharide"),
+        "node-b": _node("node-b", "doc-b", "b.pdf", "beta emulsion stability"),
+    }
+    (source / "docstore.json").write_text(
+        json.dumps({"docstore/metadata": {}, "docstore/data": nodes}), encoding="utf-8"
+    )
+    (source / "default__vector_store.json").write_text(
+        json.dumps({"embedding_dict": {"node-a": [1.0, 0.0], "node-b": [0.0, 1.0]}}),
+        encoding="utf-8",
+    )
+    index_root = tmp_path / "index"
+    monkeypatch.setattr(
+        sys, "argv",
+        ["convert", "--source", str(source), "--index-root", str(index_root), "--activate"],
+    )
+    assert converter.main() == 0
+    return resolve_current_release(index_root)
+
+
+def test_retrieve_many_embeds_all_variants_in_one_call(tmp_path, monkeypatch):
+    release = _build_release(tmp_path, monkeypatch)
+    batches = []
+
+    def embed_queries(queries):
+        batches.append(list(queries))
+        return [[1.0, 0.0] if "alpha" in query else [0.0, 1.0] for query in queries]
+
+    index = CompactIndex(release, lambda _query: [1.0, 0.0], embed_queries)
+    try:
+        results = index.as_retriever(similarity_top_k=1).retrieve_many(["alpha", "beta"])
+    finally:
+        index.close()
+    assert batches == [["alpha", "beta"]]
+    assert [hits[0].node_id for hits in results] == ["node-a", "node-b"]
+
+
+def test_variants_share_one_chunk_fetch_and_decode_metadata_lazily(tmp_path, monkeypatch):
+    release = _build_release(tmp_path, monkeypatch)
+    index = CompactIndex(release, lambda _query: [1.0, 0.0])
+    statements = []
+    index.connection.set_trace_callback(statements.append)
+    try:
+        results = index.as_retriever(similarity_top_k=2).retrieve_many(["alpha", "alpha again"])
+    finally:
+        index.close()
+    assert len([sql for sql in statements if "FROM chunks" in sql]) == 1
+    first, second = results
+    assert first[0].node is second[0].node
+    metadata = first[0].metadata
+    assert metadata.get("file_path") == "/local/papers/a.pdf"
+    assert not metadata.decoded
+    assert metadata["page_label"] == "2"
+    assert metadata.decoded
+
+
+def test_lazy_metadata_pickles_and_copies_as_a_plain_dict():
+    expected = {"file_path": "/p/a.pdf", "file_name": "a.pdf", "document_id": "doc-a", "page_label": "3", "year": 2020}
+    clones = (lambda value: pickle.loads(pickle.dumps(value)), copy.deepcopy, copy.copy)
+    for clone in clones:
+        copied = clone(LazyChunkMetadata("/p/a.pdf", "a.pdf", "doc-a", json.dumps({"year": 2020}), 3))
+        assert type(copied) is dict
+        assert copied == expected
+
+
+def test_compact_index_opens_release_once_with_mmap(tmp_path, monkeypatch):
+    release = _build_release(tmp_path, monkeypatch)
+    from services import compact_index as compact_module
+
+    reads = []
+    real_read_index = faiss.read_index
+
+    def tracking_read_index(path, *flags):
+        reads.append((path, flags))
+        return real_read_index(path, *flags)
+
+    monkeypatch.setattr(compact_module.faiss, "read_index", tracking_read_index)
+    index = CompactIndex(release, lambda _query: [1.0, 0.0])
+    try:
+        stats = verify_release(release, verify_checksums=True, faiss_index=index.faiss_index)
+    finally:
+        index.close()
+    assert stats["vector_count"] == 2
+    assert len(reads) == 1
+    assert reads[0][1] == (compact_module.MMAP_READ_FLAGS,)
+
+
+def test_search_batcher_coalesces_concurrent_queries():
+    import threading
+
+    import numpy as np
+
+    from services.compact_index import SearchBatcher
+
+    vectors = np.eye(4, dtype="float32")
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(4))
+    index.add_with_ids(vectors, np.arange(4, dtype="int64"))
+    batcher = SearchBatcher(index, window_ms=50)
+    results = {}
+
+    def search(row: int) -> None:
+        results[row] = batcher.search(vectors[row:row + 1], top_k=1 + row % 2)
+
+    threads = [threading.Thread(target=search, args=(row,)) for row in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        batcher.close()
+    assert batcher.requests == 4
+    assert batcher.batches < 4
+    for row, (scores, ids) in results.items():
+        assert ids.shape == (1, 1 + row % 2)
+        assert int(ids[0, 0]) == row
+
+
+def test_search_batcher_serves_requests_racing_close():
+    import threading
+
+    import numpy as np
+
+    from services.compact_index import SearchBatcher
+
+    vectors = np.eye(4, dtype="float32")
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(4))
+    index.add_with_ids(vectors, np.arange(4, dtype="int64"))
+    for _ in range(20):
+        batcher = SearchBatcher(index, window_ms=1, result_timeout=5)
+        results = []
+        threads = [
+            threading.Thread(target=lambda row=row: results.append(batcher.search(vectors[row:row + 1], 1)))
+            for row in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        batcher.close()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+        assert len(results) == 4
+
+    # A request stranded behind the sentinel is drained by the worker or answered after the timeout.
+    batcher = SearchBatcher(index, window_ms=1, result_timeout=0.2)
+    batcher._pending.put(None)
+    scores, ids = batcher.search(vectors[2:3], 1)
+    assert int(ids[0, 0]) == 2
+    batcher.close()
+
+
+def test_converter_writes_ann_index_parameters_and_recall(tmp_path, monkeypatch):
+    source = tmp_path / "legacy"
+    source.mkdir()
+    nodes = {f"node-{i}": _node(f"node-{i}", f"doc-{i}", f"{i}.pdf", f"text {i}") for i in range(8)}
+    vectors = {f"node-{i}": [float(i == axis) + 0.1 for axis in range(4)] for i in range(8)}
+    (source / "docstore.json").write_text(
+        json.dumps({"docstore/metadata": {}, "docstore/data": nodes}), encoding="utf-8"
+    )
+    (source / "default__vector_store.json").write_text(
+        json.dumps({"embedding_dict": vectors}), encoding="utf-8"
+    )
+    index_root = tmp_path / "index"
+    monkeypatch.setattr(
+        sys, "argv",
+        ["convert", "--source", str(source), "--index-root", str(index_root), "--activate",
+         "--index-type", "hnsw_flat", "--ef-search", "32"],
+    )
+    assert converter.main() == 0
+    release = resolve_current_release(index_root)
+    manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["index_type"] == "hnsw_flat"
+    assert manifest["efSearch"] == 32
+    assert manifest["recall_report"]["recall"] == 1.0
+    assert manifest["recall_report"]["query_source"] == "held_out"
+    assert verify_release(release)["vector_count"] == 8
+
+    index = CompactIndex(release, lambda _query: [1.0, 0.0, 0.0, 0.0], ef_search=64)
+    try:
+        assert index.search_params == {"efSearch": 64}
+        hits = index.as_retriever(similarity_top_k=1).retrieve("zero")
+    finally:
+        index.close()
+    assert hits[0].node_id == "node-0"
+
+
+def test_build_ann_index_ivf_recall_against_flat():
+    import numpy as np
+
+    from sweetseek.ann_index import apply_search_params, build_ann_index, recall_at_k
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 16)).astype("float32")
+    faiss.normalize_L2(vectors)
+    ids = np.arange(100, 2100, dtype="int64")
+    exact, _ = build_ann_index(vectors, ids, "flat")
+    approx, params = build_ann_index(vectors, ids, "ivf_flat", nlist=16, nprobe=4)
+    assert params == {"index_type": "ivf_flat", "nlist": 16, "nprobe": 4}
+    assert apply_search_params(approx, nprobe=16) == {"nprobe": 16}
+    assert recall_at_k(exact, approx, vectors[:50], k=10) == 1.0
+
+
+def test_quantized_release_reranks_from_float32_side_vectors(tmp_path, monkeypatch):
+    import numpy as np
+    import pytest
+
+    source = tmp_path / "legacy"
+    source.mkdir()
+    rng = np.random.default_rng(3)
+    raw = rng.standard_normal((300, 8)).astype("float32")
+    nodes = {f"node-{i}": _node(f"node-{i}", f"doc-{i}", f"{i}.pdf", f"text {i}") for i in range(300)}
+    (source / "docstore.json").write_text(
+        json.dumps({"docstore/metadata": {}, "docstore/data": nodes}), encoding="utf-8"
+    )
+    (source / "default__vector_store.json").write_text(
+        json.dumps({"embedding_dict": {f"node-{i}": raw[i].tolist() for i in range(300)}}), encoding="utf-8"
+    )
+    index_root = tmp_path / "index"
+    monkeypatch.setattr(
+        sys, "argv",
+        ["convert", "--source", str(source), "--index-root", str(index_root), "--activate",
+         "--quantizer", "sq8", "--batch-size", "100"],
+    )
+    assert converter.main() == 0
+    release = resolve_current_release(index_root)
+    manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["quantizer"] == "sq8"
+    assert manifest["rerank"]["factor"] == 4
+    assert "rerank_vectors.npy" in (release / "checksums.sha256").read_text(encoding="utf-8")
+    assert verify_release(release)["vector_count"] == 300
+
+    normalized = raw / np.linalg.norm(raw, axis=1, keepdims=True)
+    index = CompactIndex(release, lambda _query: raw[42].tolist())
+    try:
+        hits = index.as_retriever(similarity_top_k=3).retrieve("q")
+    finally:
+        index.close()
+    assert hits[0].node_id == "node-42"
+    assert hits[0].score == pytest.approx(float(normalized[42] @ normalized[42]), abs=1e-5)
+
+    np.save(release / "rerank_ids.npy", np.arange(10, dtype="int64"))
+    with pytest.raises(ValueError, match="rerank id layout"):
+        verify_release(release, verify_checksums=False)
+
+
+def test_delta_segments_are_searched_with_base_and_compacted(tmp_path, monkeypatch):
+    from services.compact_index import SegmentedCompactIndex, active_deltas
+    from services.compact_segments import SegmentChunk, compact_segments, write_delta_segment
+
+    release = _build_release(tmp_path, monkeypatch)
+    index_root = tmp_path / "index"
+    base_manifest = json.loads((release / "manifest.json").read_text(encoding="utf-8"))
+    delta = write_delta_segment(index_root, [
+        SegmentChunk("node-c", "/local/papers/c.pdf", "c.pdf", "gamma gel", [0.6, 0.8], "doc-c", 1),
+        SegmentChunk("node-b", "/local/papers/b.pdf", "b.pdf", "beta revised", [0.0, 1.0], "doc-b", 2),
+    ])
+    assert active_deltas(index_root, base_manifest) == [delta]
+
+    query = lambda _query: [0.0, 1.0]  # noqa: E731
+    merged = SegmentedCompactIndex(CompactIndex(release, query), [CompactIndex(delta, query)])
+    try:
+        hits = merged.as_retriever(similarity_top_k=3).retrieve("beta")
+    finally:
+        merged.close()
+    assert [hit.node_id for hit in hits] == ["node-b", "node-c", "node-a"]
+
+    compacted = compact_segments(index_root, "compacted-v2")
+    assert resolve_current_release(index_root) == compacted
+    stats = verify_release(compacted)
+    assert stats["vector_count"] == 3
+    assert stats["segment_seq"] == 1
+    assert stats["compacted_from"]["deltas"] == [delta.name]
+    assert not delta.exists()
+    assert active_deltas(index_root, stats) == []
+    assert compact_segments(index_root) is None
+
+    index = CompactIndex(compacted, query)
+    try:
+        hits = index.as_retriever(similarity_top_k=3).retrieve("beta")
+    finally:
+        index.close()
+    assert [hit.node_id for hit in hits] == ["node-b", "node-c", "node-a"]
+    assert hits[0].text == "beta revised"
+
+
+def test_mixed_tokenizer_keeps_cas_numbers_and_chinese_bigrams():
+    from services.lexical_index import match_expression, tokenize_mixed
+
+    assert tokenize_mixed("Reb M 甜菊糖苷 CAS 57817-89-7 of SPI") == [
+        "reb", "m", "甜菊", "菊糖", "糖苷", "cas", "57817-89-7", "spi",
+    ]
+    assert match_expression("SPI spi") == '"spi"'
+    assert match_expression("Reb M vs Reb D") == '"reb m" OR "vs" OR "reb d"'
+
+
+def test_lexical_hits_are_fused_with_dense_results_by_rrf(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from services.retrieval_service import RetrievalService
+
+    release = _build_release(tmp_path, monkeypatch)
+    assert json.loads((release / "manifest.json").read_text(encoding="utf-8"))["lexical_index"]
+    index = CompactIndex(release, lambda _query: [1.0, 0.0])
+    try:
+        assert index.has_lexical
+        service = RetrievalService(SimpleNamespace(index=index), query_processor=None)
+        assert service.has_lexical_index()
+        chunks = service.retrieve_chunks_multi_query(["emulsion"], top_k=2)
+    finally:
+        index.close()
+    assert [chunk.node_id for chunk in chunks] == ["node-b", "node-a"]
+    assert chunks[0].lexical_rank == 1
+    assert chunks[0].score == 0.0
+    assert chunks[1].lexical_rank is None
+    assert service.filter_chunks(chunks, threshold=0.3) == chunks
+    # 名次靠后的词法命中不再绕过相似度阈值
+    monkeypatch.setattr(config, "RAG_LEXICAL_BYPASS_RANK", 0)
+    assert service.filter_chunks(chunks, threshold=0.3) == chunks[1:]
+
+
+def test_lexical_hits_on_ivf_release_get_cosine_scores(tmp_path, monkeypatch):
+    import numpy as np
+
+    release = _build_release(tmp_path, monkeypatch)
+    approximate_from_flat(release / "vectors.faiss", "ivf_flat", nlist=1)
+    index = CompactIndex(release, lambda _query: [0.6, 0.8])
+    try:
+        scores = index.vector_scores(np.asarray([0.6, 0.8], dtype="float32"), [0, 1])
+    finally:
+        index.close()
+    assert scores.tolist() == pytest.approx([0.6, 0.8])
+
+
+def test_reference_assembly_uses_precomputed_document_features(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from evidence_ranker import EvidenceRanker
+    from services.context_builder import ContextBuilder
+    from services.metadata_service import MetadataService
+    from services.rag_types import stable_document_id
+
+    release = _build_release(tmp_path, monkeypatch)
+    stats = verify_release(release)
+    assert stats["document_features"]
+    index = CompactIndex(release, lambda _query: [1.0, 0.0])
+    try:
+        features = index.document_features([stable_document_id("/local/papers/a.pdf"), "missing"])
+        builder = ContextBuilder(MetadataService(SimpleNamespace(index=index)))
+        references = builder.build_references_raw([{
+            "file_path": "/local/papers/a.pdf", "filename": "a.pdf",
+            "max_score": 0.4, "sample_content": "alpha protein polysaccharide",
+        }])
+    finally:
+        index.close()
+    assert list(features) == [stable_document_id("/local/papers/a.pdf")]
+    assert references[0]["static_features"] == features[references[0]["document_id"]]["static_features"]
+
+    # 快照缺失或过期时，以线上目录为准
+    live = {"/local/papers/a.pdf": {"title": "Alpha revised", "year": "2024", "doi": ""}}
+    metadata_service = MetadataService(SimpleNamespace(index=SimpleNamespace()))
+    metadata_service.lookup_metadata_fast = live.get
+    for snapshot in (None, {"title": "Alpha draft", "doi": "10.1/a"}):
+        metadata_service.lookup_document_features = lambda ids, snapshot=snapshot: {
+            ids[0]: {"metadata": snapshot, "static_features": {}},
+        }
+        refreshed = ContextBuilder(metadata_service).build_references_raw([{
+            "file_path": "/local/papers/a.pdf", "filename": "a.pdf",
+            "max_score": 0.4, "sample_content": "alpha",
+        }])[0]
+        assert (refreshed["title"], refreshed["year"]) == ("Alpha revised", "2024")
+        assert refreshed["doi"] == ("10.1/a" if snapshot else "")
+
+    ranker = EvidenceRanker()
+    monkeypatch.setattr(ranker, "_classify_evidence_type", lambda _content: pytest.fail("scanned at query time"))
+    precomputed = ranker.rank_papers(references)[0]
+    expected = EvidenceRanker().rank_papers([{k: v for k, v in references[0].items() if k != "static_features"}])[0]
+    assert precomputed["total_score"] == expected["total_score"]
+    assert precomputed["evidence_type"] == expected["evidence_type"]
+
+
+def test_release_builder_streams_resumes_and_verifies(tmp_path):
+    import argparse
+
+    import numpy as np
+
+    from services.release_builder import STAGING_VECTORS_FILE, ReleaseBuilder
+
+    papers = tmp_path / "papers"
+    papers.mkdir()
+    words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    files = []
+    for position, word in enumerate(words):
+        path = papers / f"{word}.txt"
+        path.write_text(f"{word} protein study number {position}.", encoding="utf-8")
+        files.append(str(path))
+    files.append(str(papers / "missing.txt"))
+
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        if len(calls) == 2 and len(texts) == 2:
+            raise RuntimeError("embedding server went away")
+        return [[1.0 + words.index(text.split()[0]), 1.0] for text in texts]
+
+    release = tmp_path / "index" / "compact" / "releases" / "built-v1"
+    builder = ReleaseBuilder(release, embed, workers=2, embed_batch_size=2, queue_size=1, embed_signature="fake")
+    with pytest.raises(RuntimeError, match="went away"):
+        builder.run(files)
+    assert len(calls[0]) == 2
+    assert (release / STAGING_VECTORS_FILE).stat().st_size == 2 * 2 * 4
+
+    with pytest.raises(ValueError, match="embedding model changed"):
+        ReleaseBuilder(release, embed, embed_signature="other").run(files)
+
+    calls.clear()
+    stats = ReleaseBuilder(release, embed, workers=2, embed_batch_size=2, embed_signature="fake").run(files)
+    # 续建只嵌入剩余文件，已完成的两篇不再重复。
+    assert sum(len(batch) for batch in calls) == 3
+    assert stats["chunks"] == 5 and stats["files_done"] == 6
+    assert [item["file"] for item in stats["skipped_files"]] == [str(papers / "missing.txt")]
+
+    vector_count, dimension = builder.write_flat_index()
+    assert (vector_count, dimension) == (5, 2)
+    args = argparse.Namespace(
+        lexical=True, batch_size=100, metadata=tmp_path / "none.json", activate=True,
+        index_type="flat", quantizer="none",
+    )
+    converter.finish_release(release.parents[1], release, args, {
+        "dimension": dimension, "vector_count": vector_count, "vectors_seen": vector_count,
+        "orphan_vector_count": 0, "chunk_count": stats["chunks"], "source": str(papers),
+    })
+    builder.discard_staging()
+    assert resolve_current_release(tmp_path / "index") == release
+    assert verify_release(release)["documents_count"] == 5
+
+    index = CompactIndex(release, lambda _query: [5.0, 1.0])
+    try:
+        hits = index.as_retriever(similarity_top_k=1).retrieve("epsilon")
+    finally:
+        index.close()
+    assert hits[0].text.startswith("epsilon")
+    assert hits[0].metadata["file_name"] == "epsilon.txt"
+    assert np.isclose(hits[0].score, 1.0, atol=1e-5)
+
+
+def test_newer_segments_supersede_older_copies_and_lexical_ranks_are_fused(tmp_path, monkeypatch):
+    import numpy as np
+
+    from services.compact_index import SegmentedCompactIndex
+    from services.compact_segments import SegmentChunk, write_delta_segment
+
+    release = _build_release(tmp_path, monkeypatch)
+    delta = write_delta_segment(tmp_path / "index", [
+        SegmentChunk("node-b", "/local/papers/b.pdf", "b.pdf", "beta emulsion revised", [0.6, 0.8], "doc-b", 2),
+        SegmentChunk("node-c", "/local/papers/c.pdf", "c.pdf", "emulsion gel", [0.8, 0.6], "doc-c", 1),
+    ])
+    query = lambda _query: [0.0, 1.0]  # noqa: E731
+    merged = SegmentedCompactIndex(CompactIndex(release, query), [CompactIndex(delta, query)])
+    try:
+        # 旧段中的 node-b 得分更高（1.0 > 0.8），但已被增量段重写
+        hits = merged.as_retriever(similarity_top_k=3).retrieve("beta")
+        lexical = merged.lexical_hits(["alpha emulsion"], 10)[0]
+        nodes = merged.lexical_nodes(np.asarray([[0.0, 1.0]], dtype="float32"), [lexical])[0]
+    finally:
+        merged.close()
+    assert [(hit.node_id, hit.text) for hit in hits][:2] == [("node-b", "beta emulsion revised"), ("node-c", "emulsion gel")]
+    assert [segment.release for segment, _, _ in lexical] == [delta, release, delta]
+    assert nodes[1].node_id == "node-a"
+    assert {node.text for node in nodes} == {"alpha protein polysaccharide", "beta emulsion revised", "emulsion gel"}
+    assert [node.lexical_rank for node in nodes] == [1, 2, 3]
+
+
+def test_compact_rag_system_picks_up_a_delta_written_after_startup(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    import services.compact_index as compact_module
+    from persistent_storage import PersistentRAGSystem
+    from services.compact_segments import SegmentChunk, write_delta_segment
+
+    release = _build_release(tmp_path, monkeypatch)
+    embed_model = SimpleNamespace(get_query_embedding=lambda _query: [0.0, 1.0])
+    monkeypatch.setattr(compact_module, "Settings", SimpleNamespace(embed_model=embed_model))
+    monkeypatch.setattr(PersistentRAGSystem, "_configure_models", lambda self: setattr(self, "embedding_dim", 2))
+    system = compact_module.CompactRAGSystem(
+        str(tmp_path / "papers"), str(tmp_path / "index"), str(tmp_path / "metadata.json")
+    )
+    assert system.load_existing_index()
+    version = system.index_version()
+    assert [hit.node_id for hit in system.index.as_retriever(similarity_top_k=3).retrieve("q")] == ["node-b", "node-a"]
+
+    write_delta_segment(tmp_path / "index", [
+        SegmentChunk("node-c", "/local/papers/c.pdf", "c.pdf", "gamma gel", [0.0, 1.0], "doc-c", 1),
+    ])
+    monkeypatch.setattr(compact_module, "RELOAD_RECHECK_SECONDS", 3600.0)
+    assert system.index_version() == version
+    monkeypatch.setattr(compact_module, "RELOAD_RECHECK_SECONDS", 0.0)
+    hits = system.index.as_retriever(similarity_top_k=3).retrieve("q")
+    assert {hit.node_id for hit in hits[:2]} == {"node-b", "node-c"}
+    assert system.index_version() != version
+    assert resolve_current_release(tmp_path / "index") == release
+    system.index.close()
+    system._retired.close()
@@ -2,3 +2,43 @@ def test_rag_system_has_add_documents():
     from persistent_storage import rag_system
 
     assert hasattr(rag_system, "add_documents")
+
+
+def test_new_files_reach_the_served_index_and_mirror_a_stable_compact_delta(tmp_path, monkeypatch):
+    from llama_index.core import Document
+
+    import incremental_indexer as module
+
+    paper = tmp_path / "paper.txt"
+    paper.write_text("Rebaudioside M is a sweetener. " * 80, encoding="utf-8")
+    added, segments = [], []
+    monkeypatch.setattr(module.rag_system, "index", object())
+    monkeypatch.setattr(module.rag_system, "add_documents", lambda docs: added.append(docs) or True)
+    monkeypatch.setattr(module.rag_system, "embed_texts", lambda texts: [[1.0, 0.0] for _ in texts])
+    monkeypatch.setattr(module, "resolve_current_release", lambda root: tmp_path / "release")
+    monkeypatch.setattr(module, "write_delta_segment", lambda root, chunks, **kw: segments.append(chunks) or "0001-x")
+
+    class _Reader:
+        def __init__(self, input_files):
+            self.input_files = input_files
+
+        def load_data(self):
+            return [Document(text=paper.read_text(encoding="utf-8"), metadata={"file_path": str(paper)})]
+
+    monkeypatch.setattr(module, "SimpleDirectoryReader", _Reader)
+
+    def run():
+        indexer = module.IncrementalIndexer(
+            data_dir=str(tmp_path), tracking_file=str(tmp_path / "indexed.json"), index_root=str(tmp_path)
+        )
+        monkeypatch.setattr(indexer, "get_new_files", lambda: [str(paper)])
+        monkeypatch.setattr(indexer, "extract_metadata_for_new_files", lambda files: None)
+        assert indexer.add_new_documents() is True
+        return indexer
+
+    indexer = run()
+    assert len(added) == 1
+    assert module.normalize_for_storage(str(paper)) in indexer.indexed_files
+    run()
+    first, second = ([chunk.chunk_id for chunk in chunks] for chunks in segments)
+    assert first == second and len(set(first)) == len(first) > 1
@@ -1,4 +1,5 @@
 import json
+import os
 from pathlib import Path
 
 from metadata_storage import MetadataStorage
@@ -33,3 +34,45 @@ def test_load_metadata_from_backup(tmp_path: Path):
 
     storage = MetadataStorage(str(storage_path))
     assert storage.get_all_metadata() == backup_data
+
+
+def test_sqlite_backend_migrates_json_once_and_saves_in_place(tmp_path: Path):
+    storage_path = tmp_path / "metadata.json"
+    storage_path.write_text(json.dumps({"a.pdf": {"title": "A"}}), encoding="utf-8")
+
+    storage = MetadataStorage(str(storage_path), backend="sqlite")
+    assert storage.get_all_metadata()["a.pdf"]["title"] == "A"
+    assert storage.save_many({"b.pdf": {"title": "B"}, "c.pdf": {"title": "C"}}) == 2
+    storage.save_metadata("a.pdf", {"title": "A2"})
+    assert storage.has_metadata("/elsewhere/c.pdf")
+    storage.close()
+
+    # JSON 未改动，不会重新导入覆盖库中的新值
+    reopened = MetadataStorage(str(storage_path), backend="sqlite")
+    assert {path: meta["title"] for path, meta in reopened.get_all_metadata().items()} == {
+        "a.pdf": "A2", "b.pdf": "B", "c.pdf": "C",
+    }
+    assert json.loads(storage_path.read_text(encoding="utf-8")) == {"a.pdf": {"title": "A"}}
+    assert reopened.delete_metadata("b.pdf")
+    reopened.close()
+    assert set(MetadataStorage(str(storage_path), backend="sqlite").get_all_metadata()) == {"a.pdf", "c.pdf"}
+
+
+def test_catalog_loads_lazily_and_reloads_after_external_write(tmp_path: Path, monkeypatch):
+    import metadata_storage
+
+    storage_path = tmp_path / "metadata.json"
+    storage_path.write_text(json.dumps({"papers/a.pdf": {"title": "A", "filename": "a.pdf"}}), encoding="utf-8")
+    storage = MetadataStorage(str(storage_path), backend="json")
+    assert storage._cache is None
+    assert storage.find_metadata("/abs/papers/a.pdf")["title"] == "A"
+    version = storage.version
+
+    monkeypatch.setattr(metadata_storage, "CATALOG_RECHECK_SECONDS", 0.0)
+    storage_path.write_text(json.dumps({"papers/b.pdf": {"title": "B"}}), encoding="utf-8")
+    os.utime(storage_path, ns=(1, 1))
+    assert set(storage.get_all_metadata()) == {"papers/b.pdf"}
+    assert storage.version > version
+    assert metadata_storage.shared_metadata_storage(str(storage_path)) is metadata_storage.shared_metadata_storage(
+        str(storage_path)
+    )
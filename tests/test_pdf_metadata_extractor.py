@@ -13,3 +13,63 @@ def test_known_doi_journal_code_is_resolved_without_guessing_from_publisher_pref
     assert extractor._extract_journal_from_doi("10.1016/j.foodchem.2026.148598") == "Food Chemistry"
     assert extractor._extract_journal_from_doi("10.1016/j.unknown.2026.123456") is None
     assert extractor._extract_journal_from_doi("10.1039/d5fo00001a") is None
+
+
+def test_batch_extraction_caches_by_content_hash(tmp_path, monkeypatch):
+    from services import metadata_extraction
+
+    reads = []
+
+    def fake_read(self, pdf_path):
+        reads.append(pdf_path)
+        return {"title": "A sufficiently long paper title", "subject": "doi 10.1016/j.foodchem.2020.1"}, ""
+
+    monkeypatch.setattr(PDFMetadataExtractor, "read_pdf", fake_read)
+    first = tmp_path / "a.pdf"
+    first.write_bytes(b"%PDF same bytes")
+    cache = metadata_extraction.ExtractionCache(str(tmp_path / "cache.sqlite"))
+    progress = []
+
+    extracted = metadata_extraction.extract_metadata_batch([str(first)], cache=cache,
+                                                           progress=lambda *state: progress.append(state))
+    assert extracted[str(first)]["journal"] == "Food Chemistry"
+    assert progress[-1] == (1, 1, 0)
+
+    moved = tmp_path / "moved" / "Food Hydrocolloids renamed.pdf"
+    moved.parent.mkdir()
+    first.rename(moved)
+    again = metadata_extraction.extract_metadata_batch([str(moved)], cache=cache)
+    assert len(reads) == 1
+    assert again[str(moved)]["filename"] == moved.name
+    assert again[str(moved)]["title"] == "A sufficiently long paper title"
+    cache.close()
+
+
+def _fail_on_broken(pdf_path):
+    if "broken" in pdf_path:
+        raise ValueError("corrupt xref table")
+    return {"title": "A sufficiently long paper title"}
+
+
+def test_batch_extraction_skips_failing_files_and_caches_the_rest(tmp_path, monkeypatch):
+    from services import metadata_extraction
+
+    monkeypatch.setattr(metadata_extraction, "_extract_document", _fail_on_broken)
+    paths = []
+    for name in ("a.pdf", "broken.pdf", "b.pdf"):
+        path = tmp_path / name
+        path.write_bytes(f"%PDF {name}".encode())
+        paths.append(str(path))
+    cache = metadata_extraction.ExtractionCache(str(tmp_path / "cache.sqlite"))
+    for workers in (1, 2):
+        progress = []
+        extracted = metadata_extraction.extract_metadata_batch(
+            paths, workers=workers, progress=lambda *state: progress.append(state),
+            cache=cache if workers == 2 else None,
+        )
+        assert list(extracted) == [paths[0], paths[2]]
+        assert progress[-1] == (3, 3, 0)
+
+    digests = [metadata_extraction.file_sha256(path) for path in paths]
+    assert set(cache.get_many(digests)) == {digests[0], digests[2]}
+    cache.close()
@@ -2,8 +2,8 @@ from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import MagicMock
 
-from persistent_storage import PersistentRAGSystem
 from knowledge_paths import get_domain_paths
+from persistent_storage import PersistentRAGSystem
 
 
 def test_relative_storage_paths_are_anchored_to_project_root():
@@ -60,14 +60,110 @@ def test_document_batches_are_transformed_and_inserted_together(tmp_path, monkey
         SimpleNamespace(id_="doc-1", hash="hash-1"),
         SimpleNamespace(id_="doc-2", hash="hash-2"),
     ]
-    transform = MagicMock(return_value=["node-1", "node-2"])
+    nodes = [SimpleNamespace(embedding=[1.0, 0.0]), SimpleNamespace(embedding=[0.0, 1.0])]
+    transform = MagicMock(return_value=nodes)
     monkeypatch.setattr("llama_index.core.ingestion.run_transformations", transform)
 
     rag._insert_document_batch(documents)
 
     transform.assert_called_once_with(documents, ["splitter"], show_progress=False)
-    rag.index.insert_nodes.assert_called_once_with(["node-1", "node-2"])
+    rag.index.insert_nodes.assert_called_once_with(nodes)
     assert rag.index.docstore.set_document_hash.call_args_list == [
         (("doc-1", "hash-1"),),
         (("doc-2", "hash-2"),),
     ]
+
+
+def test_rebuild_embeds_only_text_missing_from_the_persistent_cache(tmp_path, monkeypatch):
+    import json
+
+    from llama_index.core.schema import MetadataMode, TextNode
+    from llama_index.core.storage.docstore.utils import doc_to_json
+
+    import persistent_storage
+    from services.embedding_cache import EmbeddingCache, model_fingerprint, seed_from_legacy_store
+
+    legacy = TextNode(id_="legacy-1", text="stevia rebaudioside", metadata={"file_name": "a.pdf"})
+    (tmp_path / "docstore.json").write_text(
+        json.dumps({"docstore/data": {"legacy-1": doc_to_json(legacy)}}), encoding="utf-8"
+    )
+    (tmp_path / "vector_store.json").write_text(
+        json.dumps({"embedding_dict": {"legacy-1": [0.5, 0.5]}}), encoding="utf-8"
+    )
+    cache = EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite"))
+    model = model_fingerprint(2)
+    assert seed_from_legacy_store(cache, tmp_path / "docstore.json", tmp_path / "vector_store.json", model) == 1
+
+    embedded = []
+
+    def embed_batch(texts):
+        embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(persistent_storage, "shared_embedding_cache", lambda: cache)
+    monkeypatch.setattr(persistent_storage.Settings, "_embed_model", SimpleNamespace(get_text_embedding_batch=embed_batch))
+    rag = PersistentRAGSystem(
+        data_dir=str(tmp_path / "papers"),
+        persist_dir=str(tmp_path / "index"),
+        metadata_path=str(tmp_path / "metadata.json"),
+    )
+    rag.models_configured, rag.embedding_mode, rag.embedding_dim = True, "real", 2
+    rag.index = MagicMock()
+
+    def rebuild(texts):
+        nodes = [TextNode(id_=f"n{i}", text=text, metadata={"file_name": "a.pdf"}) for i, text in enumerate(texts)]
+        monkeypatch.setattr("llama_index.core.ingestion.run_transformations", lambda *args, **kwargs: nodes)
+        rag._insert_document_batch([])
+        return nodes
+
+    nodes = rebuild(["stevia rebaudioside", "sucralose"])
+    assert embedded == [nodes[1].get_content(metadata_mode=MetadataMode.EMBED)]
+    assert nodes[0].embedding == [0.5, 0.5]
+    sucralose = nodes[1].embedding
+
+    embedded.clear()
+    nodes = rebuild(["stevia rebaudioside", "sucralose", "allulose"])
+    assert embedded == [nodes[2].get_content(metadata_mode=MetadataMode.EMBED)]
+    assert nodes[1].embedding == sucralose
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 2
+
+
+def test_query_embedding_cache_evicts_lru_and_expires(monkeypatch):
+    from persistent_storage import QueryEmbeddingCache
+
+    clock = [100.0]
+    monkeypatch.setattr("persistent_storage.time.monotonic", lambda: clock[0])
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=10)
+    cache.put("model", "a  query", [1.0, 0.0])
+    cache.put("model", "b", [0.0, 1.0])
+    assert cache.get("model", " a query ") is not None
+    cache.put("model", "c", [1.0, 1.0])
+    assert cache.get("model", "b") is None
+    assert cache.get("other-model", "a query") is None
+    clock[0] += 11
+    assert cache.get("model", "c") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+    assert stats["max_bytes"] == 2 * 2 * 4
+
+
+def test_embed_query_batch_encodes_only_uncached_variants(monkeypatch):
+    import persistent_storage
+
+    class Model:
+        def __init__(self):
+            self.batches = []
+
+        def get_query_embeddings(self, queries):
+            self.batches.append(list(queries))
+            return [[float(len(query)), 1.0] for query in queries]
+
+    model = Model()
+    monkeypatch.setattr(persistent_storage, "_SHARED_EMBEDDINGS", {("st", "bge", ""): (model, 2)})
+    monkeypatch.setattr(persistent_storage, "_QUERY_EMBEDDING_CACHE", persistent_storage.QueryEmbeddingCache(8, 60))
+
+    persistent_storage.embed_query_batch(model, ["alpha", "beta"])
+    vectors = persistent_storage.embed_query_batch(model, ["beta", "gamma!"])
+
+    assert model.batches == [["alpha", "beta"], ["gamma!"]]
+    assert [list(vector) for vector in vectors] == [[4.0, 1.0], [6.0, 1.0]]
@@ -0,0 +1,32 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import query_expander
+from query_expander import SweetnessQueryExpander, TermMatcher
+
+
+@pytest.mark.parametrize("backend", ["automaton", "fallback"])
+def test_term_matcher_is_longest_match_with_word_boundaries(monkeypatch, backend):
+    if backend == "fallback":
+        monkeypatch.setattr(query_expander, "ahocorasick", None)
+    matcher = TermMatcher({"甜味": "甜味", "甜味受体": "甜味受体", "sc": "SC", "sweetener": "甜味剂"})
+    assert matcher.match("甜味受体机制") == ["甜味受体"]
+    assert matcher.match("science of sweeteners") == ["甜味剂"]
+    assert matcher.match("sc and 甜味") == ["SC", "甜味"]
+
+
+def test_sweetness_vocabulary_file_extends_builtin_dictionaries(tmp_path):
+    vocabulary = tmp_path / "vocabulary.json"
+    vocabulary.write_text(json.dumps({"Allulose": ["psicose", "阿洛酮糖"], "Sucrose": []}), encoding="utf-8")
+    expander = SweetnessQueryExpander(vocabulary_path=str(vocabulary))
+
+    expanded = expander.expand_query("D-psicose 与蔗糖的甜度比较")
+    assert {"Allulose", "蔗糖", "甜度"} <= set(expanded["matched_concepts"])
+    assert "阿洛酮糖" in expanded["expanded_terms"]
+    # 内置词典中的映射优先于外部词表
+    assert expander.reverse_index["sucrose"] == "蔗糖"
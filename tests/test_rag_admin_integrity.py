@@ -70,3 +70,43 @@ def test_hybrid_adapter_opens_metadata_read_only(tmp_path):
     assert adapter.retriever.metadata_db.read_only is True
     with pytest.raises(RuntimeError, match="read-only"):
         adapter.retriever.metadata_db.clear_all()
+
+
+class _FixedEmbedding:
+    def __init__(self, vector):
+        self.vector = list(vector)
+
+    def get_query_embedding(self, query):
+        return self.vector
+
+
+def test_hybrid_adapter_serves_quantized_ann_index_with_overrides_and_rerank(tmp_path):
+    from sweetseek.ann_index import approximate_from_flat
+
+    root = tmp_path / "current"
+    root.mkdir()
+    rng = np.random.default_rng(5)
+    vectors = rng.standard_normal((400, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexFlatIP(8)
+    index.add(vectors)
+    faiss.write_index(index, str(root / "index.faiss"))
+    ids = [f"chunk-{i}" for i in range(400)]
+    (root / "index.ids.txt").write_text("\n".join(ids) + "\n", encoding="utf-8")
+    MetadataDB(str(root / "metadata.db")).insert_batch(
+        [{"doc_id": item, "content": item, "metadata": {}} for item in ids]
+    )
+    params = approximate_from_flat(
+        root / "index.faiss", "ivf_flat", quantizer="sq8", keep_ids=False, nlist=8, nprobe=1, recall_queries=50
+    )
+    assert params["recall_report"]["query_source"] == "held_out"
+    assert params["recall_report"]["queries"] == 50
+    write_json(root / "manifest.json", {"chunk_count": 400, "embedding_dimension": 8, **params})
+
+    adapter = HybridIndexAdapter(root, _FixedEmbedding(vectors[42]), nprobe=8)
+    assert adapter.search_params == {"nprobe": 8}
+    assert adapter.stats()["rerank"] is True
+    hits = adapter.as_retriever(similarity_top_k=3).retrieve("q")
+    assert hits[0].node_id == "chunk-42"
+    assert hits[0].score == pytest.approx(1.0, abs=1e-5)
+    assert verify_paths(root)["counts"]["faiss"] == 400
@@ -1,9 +1,15 @@
 from types import SimpleNamespace
 from unittest.mock import MagicMock
 
+import pytest
+
 from services.citation_validator import CitationValidator
+from services.metadata_service import MetadataService
+from services.query_processor import QueryProcessor
 from services.rag_types import stable_chunk_id, stable_document_id
 from services.retrieval_service import RetrievalService
+from services.signal_matcher import SignalMatcher
+from services.supplement_service import SupplementService
 
 
 def test_stable_identifiers_do_not_depend_on_python_hash_seed():
@@ -38,3 +44,320 @@ def test_citation_validator_distinguishes_model_and_auto_appended_citations():
 
     invalid = validator.diagnose("claim [ref_99]", "claim", references)
     assert invalid["invalid_model_citation_ids"] == ["ref_99"]
+
+
+def test_retrieval_uses_batched_retriever_when_available():
+    chunk_a = SimpleNamespace(text="a", score=0.4, metadata={"file_path": "a.pdf"}, node_id="a", node=None)
+    chunk_b = SimpleNamespace(text="b", score=0.8, metadata={"file_path": "b.pdf"}, node_id="b", node=None)
+    calls = []
+
+    class BatchRetriever:
+        def retrieve(self, query):
+            raise AssertionError("per-variant retrieval must not run")
+
+        def retrieve_many(self, queries):
+            calls.append(list(queries))
+            return [[chunk_a], [chunk_b, chunk_a]]
+
+    rag_system = SimpleNamespace(index=SimpleNamespace(as_retriever=lambda **_: BatchRetriever()))
+    service = RetrievalService(rag_system, MagicMock())
+    result = service.retrieve_chunks_multi_query(["one", "two"], 10)
+    assert calls == [["one", "two"]]
+    assert result == [chunk_b, chunk_a]
+
+
+def test_signal_matcher_matches_substring_scoring(monkeypatch):
+    from services import signal_matcher
+    from services.query_processor import QueryProcessor
+
+    processor = QueryProcessor(query_expander=None)
+    terms = ["soy", "soybean", "soy protein", "spi", "大豆", "大豆蛋白", "ean"]
+    aliases = {"大豆蛋白": ["大豆蛋白", "soy protein", "spi"], "quinoa": ["quinoa", "藜麦"]}
+    plain = {"terms": terms, "concept_aliases": aliases}
+    matchers = [SignalMatcher(terms, aliases)]
+    monkeypatch.setattr(signal_matcher, "ahocorasick", None)
+    matchers.append(SignalMatcher(terms, aliases))
+    for matcher in matchers:
+        compiled = {**plain, "matcher": matcher}
+        for text in ["soybean protein isolate (spi)", "大豆蛋白与藜麦", "soy protein gel", "quinoa", "", "beans"]:
+            assert processor.reference_overlap_score(text, compiled) == processor.reference_overlap_score(text, plain)
+
+
+def test_metadata_index_matches_full_scan_and_feeds_supplements():
+    metadata = {
+        "p/a.pdf": {"title": "Soy protein isolate gels", "journal": "Food Hydrocolloids", "year": "2019"},
+        "p/b.pdf": {"title": "大豆蛋白-果胶复合凝聚", "journal": "食品科学", "year": "2022"},
+        "p/c.pdf": {"title": "Whey emulsions", "filename": "c.pdf", "year": "2024"},
+        "p/d.pdf": {"title": "Proteins at interfaces", "journal": "Langmuir", "year": "2021"},
+    }
+    storage = SimpleNamespace(get_all_metadata=lambda: dict(metadata))
+    service = MetadataService(SimpleNamespace(metadata_storage=storage))
+    index = service.search_index()
+    assert service.search_index() is index
+
+    def text_of(path, meta):
+        return " ".join([str(meta.get("title", "")), str(meta.get("journal", ""))]).lower()
+
+    for needle in ["protein", "rotein is", "蛋白", "果胶复合", "hydro", "-", "zein"]:
+        expected = [i for i, (path, meta) in enumerate(index.records) if needle in text_of(path, meta)]
+        assert index.search([needle], text_of) == expected
+
+    signals = {"terms": ["protein", "大豆蛋白"], "concept_aliases": {"soy": ["soy", "大豆"]}}
+    references = SupplementService(service, QueryProcessor(query_expander=None)).supplement_references_to_floor(
+        [{"file_path": "p/a.pdf", "title": "Soy protein isolate gels"}], 4, "", signals=signals
+    )
+    # 强候选按 (概念命中, 词项重叠, 年份) 排序，弱候选按年份补足
+    assert [ref["file_path"] for ref in references] == ["p/a.pdf", "p/b.pdf", "p/d.pdf", "p/c.pdf"]
+    assert [ref["ref_id"] for ref in references] == ["ref_1", "ref_2", "ref_3", "ref_4"]
+
+    metadata["p/e.pdf"] = {"title": "Zein particles", "year": "2020", "last_modified": "2026-01-01"}
+    assert service.search_index() is not index
+
+
+def test_literature_search_prefix_boosts_and_cursor_pages():
+    metadata = {
+        f"p/{i}.pdf": {"title": f"Study {i} on emulsions", "journal": "Food Chem", "year": str(2000 + i)}
+        for i in range(7)
+    }
+    metadata["p/x.pdf"] = {"title": "Whey protein gels", "authors": ["Zhang"], "journal": "Emulsion Letters",
+                           "doi": "10.1/x", "year": "1999"}
+    storage = SimpleNamespace(get_all_metadata=lambda: dict(metadata))
+    engine = MetadataService(SimpleNamespace(metadata_storage=storage)).literature_search()
+
+    # 前缀匹配 "emuls"；标题命中的权重高于期刊命中
+    best = engine.search(["emuls"], sort="relevance", limit=1)
+    assert best["total"] == 8 and best["records"][0][0] != "p/x.pdf"
+    assert engine.search(["zhang"])["records"][0][0] == "p/x.pdf"
+
+    seen, cursor = [], None
+    while True:
+        page = engine.search(["emulsion"], sort="year", limit=3, cursor=cursor)
+        seen.extend(path for path, _ in page["records"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"p/{i}.pdf" for i in range(6, -1, -1)] + ["p/x.pdf"]
+    year_cursor = engine.search(["emulsion"], sort="year", limit=3)["next_cursor"]
+    with pytest.raises(ValueError):
+        engine.search(["emulsion"], sort="relevance", cursor=year_cursor)
+
+
+def test_literature_search_matches_single_letter_terms_as_phrases():
+    metadata = {
+        "p/da.pdf": {"title": "Reb D and Reb A sweetness in model beverages", "year": "2021"},
+        "p/m.pdf": {"title": "Sensory profile of Reb M", "year": "2019"},
+        "p/mogroside.pdf": {"title": "Reb A with mogroside blends", "year": "2020"},
+    }
+    storage = SimpleNamespace(get_all_metadata=lambda: dict(metadata))
+    engine = MetadataService(SimpleNamespace(metadata_storage=storage)).literature_search()
+
+    result = engine.search(["Reb M"], sort="relevance")
+    assert [path for path, _ in result["records"]] == ["p/m.pdf"]
+
+
+def test_answer_cache_replays_stream_until_the_index_version_changes(monkeypatch, tmp_path):
+    import json
+
+    from config import config
+    from services.answer_cache import AnswerCache, answer_scope
+    from services.chat_service import ChatService
+    from services.rag_types import RetrievalResult
+
+    monkeypatch.setattr(config, "ANSWER_CACHE_REPLAY_DELAY_MS", 0)
+    rag_system = MagicMock()
+    rag_system.index_version.return_value = "release-1"
+    llm_client = MagicMock()
+    llm_client.stream_chat.side_effect = lambda *args, **kwargs: iter([
+        SimpleNamespace(content="Stevia is sweet.", reasoning_content=None),
+    ])
+    service = ChatService(rag_system, MagicMock(), MagicMock(), llm_client, mode="encapsulation")
+    retrieval = RetrievalResult([SimpleNamespace(text="t", metadata={}, score=1.0)], [], {}, [],
+                                {"after_threshold": 1, "final_references": 0}, None, ["q"])
+    service.pipeline = MagicMock()
+    service.pipeline.retrieve.return_value = retrieval
+
+    def run(question):
+        events = [json.loads(event[len("data: "):]) for event in service.ask_stream(question, 0.3, 10)]
+        return events, "".join(event.get("content", "") for event in events if event["type"] == "answer")
+
+    first, answer = run("Is stevia sweet?")
+    second, replayed = run("  is STEVIA sweet？")
+    assert replayed == answer and answer.startswith("Stevia is sweet.")
+    assert service.pipeline.retrieve.call_count == 1 and llm_client.stream_chat.call_count == 1
+    types = [event["type"] for event in second]
+    assert types.index("references") < types.index("retrieval_stats") < types.index("answer_start") < types.index("done")
+    assert next(event for event in second if event["type"] == "retrieval_stats")["stats"]["answer_cache"] == "hit"
+
+    rag_system.index_version.return_value = "release-2"
+    run("Is stevia sweet?")
+    assert service.pipeline.retrieve.call_count == 2
+
+    cache = AnswerCache(str(tmp_path / "near.sqlite"), max_entries=2, similarity=0.95)
+    scope = answer_scope("main", "ask", "v1", "prompt-v1")
+    cache.put(scope, "a", {"answer": "A"}, [1.0, 0.0])
+    cache.put(scope, "b", {"answer": "B"}, [0.0, 1.0])
+    assert cache.get(scope, "B ?") == {"answer": "B"}
+    assert cache.get(scope, "unseen", [0.99, 0.05]) == {"answer": "A"}
+    cache.put(scope, "c", {"answer": "C"})
+    assert cache.get(scope, "b") is None and cache.stats()["entries"] == 2
+
+
+def test_retrieval_cache_skips_the_pipeline_until_the_release_changes():
+    from services.chat_service import ChatService
+    from services.rag_types import RetrievalResult
+    from services.retrieval_cache import retrieval_cache_stats
+
+    rag_system = MagicMock()
+    rag_system.index_version.return_value = "release-1"
+    service = ChatService(rag_system, None, MagicMock(), None, mode="proteoglycan")
+    service.pipeline = MagicMock()
+    service.pipeline.retrieve.side_effect = lambda *args, **kwargs: RetrievalResult(
+        [SimpleNamespace(text="t", metadata={"file_path": "a.pdf"}, score=0.9)], [], {},
+        [{"file_path": "a.pdf", "ref_id": 1}], {"final_references": 1}, None, ["q"],
+    )
+
+    first = service.retrieve_for_evaluation("What binds heparan sulfate?")
+    first["references"][0]["file_path"] = "mutated.pdf"
+    second = service.retrieve_for_evaluation("  What binds   heparan sulfate?")
+    assert service.pipeline.retrieve.call_count == 1
+    assert second["references"][0]["file_path"] == "a.pdf"
+    assert second["retrieval_stats"]["retrieval_cache"] == "hit"
+    service.retrieve_for_evaluation("What binds heparan sulfate?", similarity_threshold=0.5)
+    assert service.pipeline.retrieve.call_count == 2
+
+    rag_system.index_version.return_value = "release-2"
+    service.retrieve_for_evaluation("What binds heparan sulfate?")
+    stats = retrieval_cache_stats()["proteoglycan"]
+    assert service.pipeline.retrieve.call_count == 3
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["invalidations"]) == (1, 1, 3, 1)
+    assert stats["index_version"] == "release-2" and stats["bytes"] > 0
+
+
+def test_retrieval_cache_round_trips_compact_nodes_and_caps_bytes():
+    from services.compact_index import LazyChunkMetadata
+    from services.rag_types import RetrievalResult
+    from services.retrieval_cache import RetrievalCache
+    from sweetseek.hybrid_adapter import HybridNode, HybridNodeWithScore
+
+    def result(text):
+        metadata = LazyChunkMetadata("/p/a.pdf", "a.pdf", "doc-a", '{"year": 2020}', 2)
+        node = HybridNodeWithScore(HybridNode(text=text, metadata=metadata, node_id="n1"), 0.8)
+        return RetrievalResult([node], [node], {}, [], {}, None, ["q"])
+
+    cache = RetrievalCache(max_entries=10)
+    cache.put("v1", ("q", "q", 0.3, 10), result("short"))
+    cached = cache.get("v1", ("q", "q", 0.3, 10))
+    assert cached.retrieved_chunks[0].metadata == {
+        "file_path": "/p/a.pdf", "file_name": "a.pdf", "document_id": "doc-a", "page_label": "2", "year": 2020,
+    }
+
+    cache._entries[("bad", "bad", 0.3, 10)] = b"not a pickle"
+    cache._bytes += len(b"not a pickle")
+    assert cache.get("v1", ("bad", "bad", 0.3, 10)) is None
+    assert cache.stats()["errors"] == 1 and cache.stats()["entries"] == 1
+
+    capped = RetrievalCache(max_entries=10, max_bytes=3000)
+    for n in range(4):
+        capped.put("v1", (str(n), "", 0.3, 10), result("x" * 1000))
+    assert capped.stats()["entries"] == 2 and capped.stats()["bytes"] <= 3000
+    assert capped.get("v1", ("0", "", 0.3, 10)) is None
+    capped.put("v1", ("huge", "", 0.3, 10), result("x" * 5000))
+    assert capped.get("v1", ("huge", "", 0.3, 10)) is None and capped.stats()["entries"] == 2
+
+
+def test_stream_starts_the_llm_before_references_are_serialized(monkeypatch):
+    import threading
+    import time
+
+    import services.chat_service as chat_module
+    from services.chat_service import ChatService
+    from services.rag_types import RetrievalResult
+
+    llm_started = threading.Event()
+    upstream_closed = threading.Event()
+    serialized_after_start = []
+
+    def endless_stream(*args, **kwargs):
+        llm_started.set()
+        try:
+            while True:
+                time.sleep(0.01)
+                yield SimpleNamespace(content="token ", reasoning_content=None)
+        finally:
+            upstream_closed.set()
+
+    def slow_serialize(references, *args, **kwargs):
+        serialized_after_start.append(llm_started.wait(1))
+        return []
+
+    monkeypatch.setattr(chat_module, "serialize_encapsulation_references", slow_serialize)
+    llm_client = MagicMock()
+    llm_client.stream_chat.side_effect = endless_stream
+    service = ChatService(MagicMock(), None, MagicMock(), llm_client, mode="encapsulation")
+    service.pipeline = MagicMock()
+    service.pipeline.retrieve.return_value = RetrievalResult(
+        [SimpleNamespace(text="t", metadata={}, score=1.0)], [], {}, [],
+        {"after_threshold": 1, "final_references": 0}, None, ["q"],
+    )
+
+    events = service.ask_stream("Is stevia sweet?", 0.3, 10)
+    seen = []
+    for event in events:
+        seen.append(event)
+        if '"type": "answer"' in event:
+            break
+    events.close()
+    assert serialized_after_start == [True]
+    assert any('"type": "references"' in event for event in seen)
+    assert upstream_closed.wait(1)
+
+
+def test_context_packing_fills_the_token_budget_best_chunk_first():
+    from services.context_builder import ContextBuilder, clean_chunk_text, estimate_tokens
+
+    def chunk(text, score):
+        return SimpleNamespace(text=text, score=score)
+
+    cleaned, tokens = clean_chunk_text("1. Stevia [12] is   sweet [PubMed]\n2.  多糖 凝胶")
+    assert cleaned == "Stevia is sweet 多糖 凝胶" and tokens == estimate_tokens(cleaned)
+
+    long_text = "steviol glycoside " * 200
+    papers = {
+        "a.pdf": {"chunks": [chunk("minor detail about a", 0.2), chunk("key finding about a", 0.9)]},
+        "b.pdf": {"chunks": [chunk(long_text, 0.8), chunk("short finding about b", 0.5)]},
+        "c.pdf": {"chunks": [chunk("key finding about a", 0.7), chunk("finding about c", 0.6)]},
+    }
+    references = [{"ref_id": f"ref_{n}", "file_path": f"{name}.pdf"} for n, name in enumerate("abc", 1)]
+    builder = ContextBuilder(MagicMock())
+    context = builder.build_context(references, papers, 40)
+
+    # 超出预算的长块被跳过而不是终止装配；每篇文献先放最高分块，重复文本只保留一次
+    assert context.split("\n\n") == [
+        "[ref_1] key finding about a",
+        "[ref_2] short finding about b",
+        "[ref_3] finding about c",
+    ]
+    assert builder.build_context(references, papers, 43).split("\n\n") == [
+        "[ref_1] key finding about a",
+        "[ref_1] minor detail about a",
+        "[ref_2] short finding about b",
+        "[ref_3] finding about c",
+    ]
+    assert estimate_tokens(context) <= 40
+
+
+def test_legacy_context_window_maps_to_a_token_budget_with_a_warning(monkeypatch):
+    from config import DualRAGConfig, RAGConfig
+
+    for key in ("RAG_CONTEXT_TOKENS", "SWEET_RAG_CONTEXT_TOKENS", "DUAL_RAG_CONTEXT_TOKENS",
+                "SWEET_RAG_CONTEXT_WINDOW", "DUAL_RAG_CONTEXT_WINDOW"):
+        monkeypatch.delenv(key, raising=False)
+    monkeypatch.setenv("RAG_CONTEXT_WINDOW", "9000")
+    with pytest.warns(FutureWarning, match="RAG_CONTEXT_WINDOW"):
+        assert RAGConfig.from_env("SWEET").context_tokens == 2400
+    monkeypatch.setenv("DUAL_RAG_CONTEXT_WINDOW", "18000")
+    with pytest.warns(FutureWarning):
+        assert DualRAGConfig.from_env().context_tokens == 4800
+
+    monkeypatch.setenv("RAG_CONTEXT_TOKENS", "1000")
+    assert RAGConfig.from_env("SWEET").context_tokens == 1000